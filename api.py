@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 import logging
 import os
 import shutil
@@ -10,7 +11,8 @@ from configs.base_config import ALLOW_ORIGINS, VERSION, MAGIC_PDF_IMG_URL
 from domain.dto.base_dto import BaseResultModel
 from domain.dto.output.magic_pdf_parse_main_output import ImageData, MagicPdfParseMainOutput
 
-from services import pdf_service
+from services import pdf_service, job_service
+from mineru.backend.pipeline.model_warmup import get_preload_langs, warmup_models
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 import time
@@ -20,6 +22,7 @@ import base64
 import uvicorn
 from fastapi import  Body, FastAPI, File, Form, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
 from loguru import logger
@@ -90,6 +93,56 @@ def mount_app_routes(app: FastAPI, run_mode: str = None):
         
         return await pdf_service.magic_pdf_parse_main2(file=file,local_output_path=folder_path, lang_list=[lang])
 
+    # 调试pdf：根据保存的middle_json按需渲染，不再在每次解析时生成
+    @app.get("/magic_pdf/debug/{result_id}/{pdf_name}",description="获取版面/span调试pdf",tags=["magic_pdf"])
+    async def get_debug_pdf(
+        result_id: str,
+        pdf_name: str,
+        kind: str = Query('layout', description="layout 或 span")):
+
+        debug_pdf_path = await asyncio.to_thread(pdf_service.get_debug_pdf, result_id, pdf_name, kind)
+        if debug_pdf_path is None:
+            return BaseResultModel(code=404, msg="调试pdf不存在")
+        return FileResponse(debug_pdf_path, media_type="application/pdf", filename=os.path.basename(debug_pdf_path))
+
+    # 异步任务：提交后立即返回任务id，通过状态接口轮询进度
+    @app.post("/magic_pdf/jobs",description="提交pdf解析任务",tags=["magic_pdf_job"])
+    async def submit_job(
+        file:UploadFile=File(...),
+        parse_method: str = Form('auto'),
+        lang: str = Form('ch'),
+        backend: str = Form('vlm-sglang-engine'),
+        start_page_id: int = Form(0),
+        end_page_id: int = Form(None)):
+
+        return await job_service.submit_job(file, parse_method, lang_list=[lang], backend=backend,
+                                            start_page_id=start_page_id, end_page_id=end_page_id)
+
+    @app.get("/magic_pdf/jobs/{job_id}",description="查询任务状态和进度",tags=["magic_pdf_job"])
+    async def get_job_status(job_id: str):
+
+        return job_service.get_job_status(job_id)
+
+    @app.get("/magic_pdf/jobs/{job_id}/pages/{page_idx}",description="获取单页解析结果",tags=["magic_pdf_job"])
+    async def get_job_page(job_id: str, page_idx: int):
+
+        return job_service.get_job_page(job_id, page_idx)
+
+    @app.get("/magic_pdf/jobs/{job_id}/result",description="获取完整解析结果",tags=["magic_pdf_job"])
+    async def get_job_result(job_id: str):
+
+        return await job_service.get_job_result(job_id)
+
+    @app.get("/magic_pdf/jobs/{job_id}/debug",description="获取任务的版面/span调试pdf",tags=["magic_pdf_job"])
+    async def get_job_debug_pdf(
+        job_id: str,
+        kind: str = Query('layout', description="layout 或 span")):
+
+        debug_pdf_path = await asyncio.to_thread(job_service.get_job_debug_pdf, job_id, kind)
+        if debug_pdf_path is None:
+            return BaseResultModel(code=404, msg="调试pdf不存在")
+        return FileResponse(debug_pdf_path, media_type="application/pdf", filename=os.path.basename(debug_pdf_path))
+
 
 if __name__=="__main__":
     parser = argparse.ArgumentParser(prog='MinerUSideCar',
@@ -98,6 +151,8 @@ if __name__=="__main__":
     parser.add_argument("--port", type=int, default=8090)
     parser.add_argument("--ssl_keyfile", type=str)
     parser.add_argument("--ssl_certfile", type=str)
+    parser.add_argument("--preload_langs", type=str, default=None,
+                        help="逗号分隔的语言列表，启动时预加载并预热这些语言的pipeline模型，如 ch,en，默认读取MINERU_PRELOAD_LANGS")
 
     os.environ["MINERU_MODEL_SOURCE"] = "local"
 
@@ -106,4 +161,9 @@ if __name__=="__main__":
     args_dict = vars(args)
     app = create_app()
 
+    # 模型预热完成后才开始监听端口
+    preload_langs = get_preload_langs(args.preload_langs)
+    if preload_langs:
+        warmup_models(preload_langs)
+
     uvicorn.run(app, host=args.host, port=args.port)
\ No newline at end of file
@@ -19,4 +19,31 @@ VLLM相关默认配置
 '''
 VLLM_CONFIG = {
     "mem_fraction_static": 0.5
-}
\ No newline at end of file
+}
+
+'''
+异步任务相关配置
+max_workers: 同时执行的任务数，pipeline后端大于1时建议设置环境变量MINERU_BATCH_SCHEDULER_ENABLE=true
+max_queue_size: 排队任务数上限，超出后提交任务会被拒绝
+store: 任务存储方式，memory 或 sqlite
+retention_seconds: 已结束任务的保留时间(秒)，超时后删除任务记录、每页结果和输出目录
+cleanup_interval: 两次清理之间的最小间隔(秒)
+'''
+JOB_CONFIG = {
+    "max_workers": 1,
+    "max_queue_size": 100,
+    "store": "memory",
+    "sqlite_path": "temp_files/jobs.db",
+    "retention_seconds": 24 * 3600,
+    "cleanup_interval": 600
+}
+
+'''
+调试pdf相关配置
+retention_seconds: 未保存到本地的解析结果，其调试pdf及渲染所需的middle_json、原始pdf的保留时间(秒)，超时后清理
+cleanup_interval: 两次清理之间的最小间隔(秒)
+'''
+DEBUG_PDF_CONFIG = {
+    "retention_seconds": 24 * 3600,
+    "cleanup_interval": 600
+}
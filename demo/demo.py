@@ -14,6 +14,7 @@ from mineru.backend.vlm.vlm_analyze import doc_analyze as vlm_doc_analyze
 from mineru.backend.pipeline.pipeline_analyze import doc_analyze as pipeline_doc_analyze
 from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make as pipeline_union_make
 from mineru.backend.pipeline.model_json_to_middle_json import result_to_middle_json as pipeline_result_to_middle_json
+from mineru.backend.pipeline.model_json_to_middle_json import finalize_middle_json_list as pipeline_finalize_middle_json_list
 from mineru.backend.vlm.vlm_middle_json_mkcontent import union_make as vlm_union_make
 from mineru.utils.models_download_utils import auto_download_and_get_model_root_path
 
@@ -47,18 +48,25 @@ def do_parse(
 
         infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list = pipeline_doc_analyze(pdf_bytes_list, p_lang_list, parse_method=parse_method, formula_enable=formula_enable,table_enable=table_enable)
 
+        middle_json_list = []
         for idx, model_list in enumerate(infer_results):
+            pdf_file_name = pdf_file_names[idx]
+            local_image_dir, _ = prepare_env(output_dir, pdf_file_name, parse_method)
+            image_writer = FileBasedDataWriter(local_image_dir)
             model_json = copy.deepcopy(model_list)
+            middle_json = pipeline_result_to_middle_json(
+                model_list, all_image_lists[idx], all_pdf_docs[idx], image_writer,
+                lang_list[idx], ocr_enabled_list[idx], formula_enable, finalize=False, pdf_bytes=pdf_bytes_list[idx]
+            )
+            middle_json_list.append((model_json, middle_json))
+        # 所有文档的后置ocr合并推理
+        pipeline_finalize_middle_json_list([middle_json for _, middle_json in middle_json_list], lang_list)
+
+        for idx, (model_json, middle_json) in enumerate(middle_json_list):
             pdf_file_name = pdf_file_names[idx]
             local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
             image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
 
-            images_list = all_image_lists[idx]
-            pdf_doc = all_pdf_docs[idx]
-            _lang = lang_list[idx]
-            _ocr_enable = ocr_enabled_list[idx]
-            middle_json = pipeline_result_to_middle_json(model_list, images_list, pdf_doc, image_writer, _lang, _ocr_enable, formula_enable)
-
             pdf_info = middle_json["pdf_info"]
 
             pdf_bytes = pdf_bytes_list[idx]
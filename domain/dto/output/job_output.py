@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+
+from domain.dto.output.magic_pdf_parse_main_output import ImageData
+
+class JobSubmitOutput(BaseModel):
+    job_id: str
+
+class JobStatusOutput(BaseModel):
+    job_id: str
+    status: str # pending、running、succeeded、failed
+    file_name: str
+    total_pages: int
+    pages_done: int # 已完成推理的页数
+    pages_ready: List[int] # 可以获取结果的页码
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+class JobPageOutput(BaseModel):
+    page_idx: int
+    content_list: List[Dict[str, Any]]
+    images: List[ImageData]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import base64
 
 class ImageData(BaseModel):
@@ -13,6 +13,7 @@ class MagicPdfParseMainOutput(BaseModel):
     content_list: List[Dict[str, Any]]
     #md: str
     images: List[ImageData]
+    result_id: Optional[str] = None # 用于按需获取调试pdf
     
     
     
\ No newline at end of file
@@ -1,4 +1,5 @@
 import html
+import time
 
 import cv2
 from loguru import logger
@@ -20,6 +21,40 @@ MFR_BASE_BATCH_SIZE = 16
 OCR_DET_BASE_BATCH_SIZE = 16
 TABLE_ORI_CLS_BATCH_SIZE = 16
 TABLE_Wired_Wireless_CLS_BATCH_SIZE = 16
+TABLE_WIRED_BATCH_SIZE = 4
+OCR_DET_RESOLUTION_GROUP_STRIDE = 64
+
+
+def batch_text_det(text_detector, bgr_images, max_batch_size, desc, stride=OCR_DET_RESOLUTION_GROUP_STRIDE):
+    """
+    按分辨率分组批量做文本检测，组内图像以白色padding到统一尺寸后调用text_detector.batch_predict。
+    返回与输入顺序一致的dt_boxes列表，padding只在右侧和下方，检测框坐标无需换算。
+    """
+    resolution_groups = defaultdict(list)
+    for index, img in enumerate(bgr_images):
+        h, w = img.shape[:2]
+        group_key = (((h + stride) // stride) * stride, ((w + stride) // stride) * stride)
+        resolution_groups[group_key].append(index)
+
+    det_results = [None] * len(bgr_images)
+    for group_key, group_indices in tqdm(resolution_groups.items(), desc=desc):
+        max_h = max(bgr_images[index].shape[0] for index in group_indices)
+        max_w = max(bgr_images[index].shape[1] for index in group_indices)
+        target_h = ((max_h + stride - 1) // stride) * stride
+        target_w = ((max_w + stride - 1) // stride) * stride
+
+        batch_images = []
+        for index in group_indices:
+            img = bgr_images[index]
+            h, w = img.shape[:2]
+            padded_img = np.full((target_h, target_w, 3), 255, dtype=np.uint8)
+            padded_img[:h, :w] = img
+            batch_images.append(padded_img)
+
+        batch_results = text_detector.batch_predict(batch_images, min(len(batch_images), max_batch_size))
+        for index, (dt_boxes, elapse) in zip(group_indices, batch_results):
+            det_results[index] = dt_boxes
+    return det_results
 
 
 class BatchAnalyze:
@@ -136,7 +171,8 @@ class BatchAnalyze:
                     f"Table classification failed: {e}, using default model"
                 )
 
-            # OCR det 过程，顺序执行
+            # OCR det 过程，所有表格按分辨率分组批量检测
+            table_ocr_det_start = time.time()
             rec_img_lang_group = defaultdict(list)
             det_ocr_engine = atom_model_manager.get_atom_model(
                 atom_model_name=AtomicModel.OCR,
@@ -144,14 +180,32 @@ class BatchAnalyze:
                 det_db_unclip_ratio=1.6,
                 enable_merge_det_boxes=False,
             )
-            for index, table_res_dict in enumerate(
-                    tqdm(table_res_list_all_page, desc="Table-ocr det")
+            table_bgr_images = [
+                cv2.cvtColor(table_res_dict["table_img"], cv2.COLOR_RGB2BGR)
+                for table_res_dict in table_res_list_all_page
+            ]
+            if self.enable_ocr_det_batch:
+                table_dt_boxes_list = [
+                    sorted_boxes(dt_boxes) if dt_boxes is not None and len(dt_boxes) > 0 else []
+                    for dt_boxes in batch_text_det(
+                        det_ocr_engine.text_detector,
+                        table_bgr_images,
+                        self.batch_ratio * OCR_DET_BASE_BATCH_SIZE,
+                        desc="Table-ocr det",
+                    )
+                ]
+            else:
+                # 不支持batch det的环境下逐个表格检测，ocr(rec=False)返回的检测框已排序
+                table_dt_boxes_list = []
+                for bgr_image in tqdm(table_bgr_images, desc="Table-ocr det"):
+                    ocr_result = det_ocr_engine.ocr(bgr_image, rec=False)[0]
+                    table_dt_boxes_list.append(ocr_result if ocr_result is not None else [])
+            for index, (table_res_dict, bgr_image, dt_boxes) in enumerate(
+                    zip(table_res_list_all_page, table_bgr_images, table_dt_boxes_list)
             ):
-                bgr_image = cv2.cvtColor(table_res_dict["table_img"], cv2.COLOR_RGB2BGR)
-                ocr_result = det_ocr_engine.ocr(bgr_image, rec=False)[0]
-                # 构造需要 OCR 识别的图片字典，包括cropped_img, dt_box, table_id，并按照语言进行分组
-                for dt_box in ocr_result:
-                    rec_img_lang_group[_lang].append(
+                # 构造需要 OCR 识别的图片字典，包括cropped_img, dt_box, table_id，并按照表格自身的语言进行分组
+                for dt_box in dt_boxes:
+                    rec_img_lang_group[table_res_dict["lang"]].append(
                         {
                             "cropped_img": get_rotate_crop_image(
                                 bgr_image, np.asarray(dt_box, dtype=np.float32)
@@ -161,7 +215,10 @@ class BatchAnalyze:
                         }
                     )
 
+            table_ocr_det_cost = time.time() - table_ocr_det_start
+
             # OCR rec，按照语言分批处理
+            table_ocr_rec_start = time.time()
             for _lang, rec_img_list in rec_img_lang_group.items():
                 ocr_engine = atom_model_manager.get_atom_model(
                     atom_model_name=AtomicModel.OCR,
@@ -182,6 +239,13 @@ class BatchAnalyze:
                         table_res_list_all_page[img_dict["table_id"]]["ocr_result"] = [
                             [img_dict["dt_box"], html.escape(ocr_res[0]), ocr_res[1]]
                         ]
+            table_ocr_rec_cost = time.time() - table_ocr_rec_start
+            if table_res_list_all_page:
+                logger.info(
+                    f"table ocr timings: det {round(table_ocr_det_cost, 2)}s ({len(table_res_list_all_page)} tables), "
+                    f"rec {round(table_ocr_rec_cost, 2)}s "
+                    f"({sum(len(rec_img_list) for rec_img_list in rec_img_lang_group.values())} crops)"
+                )
 
             clean_vram(self.model.device, vram_threshold=8)
 
@@ -203,21 +267,16 @@ class BatchAnalyze:
                 del table_res_dict["table_res"]["cls_label"]
                 del table_res_dict["table_res"]["cls_score"]
             if wired_table_res_list:
-                for table_res_dict in tqdm(
-                        wired_table_res_list, desc="Table-wired Predict"
-                ):
-                    if not table_res_dict.get("ocr_result", None):
-                        continue
-
+                # 有线表格模型按语言绑定ocr实例，同一语言的表格批量识别
+                wired_table_lang_group = defaultdict(list)
+                for table_res_dict in wired_table_res_list:
+                    wired_table_lang_group[table_res_dict["lang"]].append(table_res_dict)
+                for _lang, lang_wired_table_res_list in wired_table_lang_group.items():
                     wired_table_model = atom_model_manager.get_atom_model(
                         atom_model_name=AtomicModel.WiredTable,
-                        lang=table_res_dict["lang"],
-                    )
-                    table_res_dict["table_res"]["html"] = wired_table_model.predict(
-                        table_res_dict["wired_table_img"],
-                        table_res_dict["ocr_result"],
-                        table_res_dict["table_res"].get("html", None)
+                        lang=_lang,
                     )
+                    wired_table_model.batch_predict(lang_wired_table_res_list, batch_size=TABLE_WIRED_BATCH_SIZE)
 
             # 表格格式清理
             for table_res_dict in table_res_list_all_page:
@@ -0,0 +1,146 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from loguru import logger
+
+
+class _BatchRequest:
+    __slots__ = ('images_with_extra_info', 'formula_enable', 'table_enable', 'future', 'arrival_time')
+
+    def __init__(self, images_with_extra_info, formula_enable, table_enable):
+        self.images_with_extra_info = images_with_extra_info
+        self.formula_enable = formula_enable
+        self.table_enable = table_enable
+        self.future = Future()
+        self.arrival_time = time.monotonic()
+
+    @property
+    def model_key(self):
+        return self.formula_enable, self.table_enable
+
+
+class BatchScheduler:
+    """
+    跨请求的连续批处理调度器。
+
+    并发请求提交的页面先进入等待队列，由调度线程合并成共享的batch统一执行layout/MFD/MFR/OCR推理，
+    再把结果按请求拆分返回。当等待的页面数达到max_batch_size，或最早的请求等待超过max_wait_ms时立即发车，
+    在吞吐接近离线批处理的同时保证单个请求的延迟上限。
+    页面推理都在调度线程中串行执行；各请求线程中的后置ocr和阅读顺序推理与页面推理共用模型实例，
+    由model_init.model_inference_lock保证同一时间只有一个线程调用模型。
+    analyze_func为实际执行推理的函数，默认为cached_batch_image_analyze。
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, analyze_func=None):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._analyze_func = analyze_func
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._thread = threading.Thread(target=self._run, name='mineru-batch-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, images_with_extra_info, formula_enable=True, table_enable=True) -> Future:
+        request = _BatchRequest(images_with_extra_info, formula_enable, table_enable)
+        if not images_with_extra_info:
+            request.future.set_result([])
+            return request.future
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future
+
+    def analyze(self, images_with_extra_info, formula_enable=True, table_enable=True):
+        """与batch_image_analyze参数和返回值一致，阻塞直到本请求的页面推理完成"""
+        return self.submit(images_with_extra_info, formula_enable, table_enable).result()
+
+    def _pending_pages(self, model_key):
+        return sum(
+            len(request.images_with_extra_info) for request in self._pending if request.model_key == model_key
+        )
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            # 以最早到达的请求为准，只合并模型配置相同的请求
+            head = self._pending[0]
+            model_key = head.model_key
+            while True:
+                remaining = head.arrival_time + self.max_wait - time.monotonic()
+                if remaining <= 0 or self._pending_pages(model_key) >= self.max_batch_size:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            page_count = 0
+            for request in list(self._pending):
+                if request.model_key != model_key:
+                    continue
+                request_pages = len(request.images_with_extra_info)
+                if batch and page_count + request_pages > self.max_batch_size:
+                    break
+                batch.append(request)
+                page_count += request_pages
+                self._pending.remove(request)
+            return model_key, batch, page_count
+
+    def _run(self):
+        analyze_func = self._analyze_func
+        if analyze_func is None:
+            from .pipeline_analyze import cached_batch_image_analyze
+            analyze_func = cached_batch_image_analyze
+
+        while True:
+            (formula_enable, table_enable), batch, page_count = self._next_batch()
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            logger.info(f'batch scheduler: {len(batch)} requests, {page_count} pages in one batch')
+            images_with_extra_info = []
+            for request in batch:
+                images_with_extra_info.extend(request.images_with_extra_info)
+            try:
+                results = analyze_func(images_with_extra_info, formula_enable, table_enable)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                request_pages = len(request.images_with_extra_info)
+                request.future.set_result(results[offset:offset + request_pages])
+                offset += request_pages
+
+
+_batch_scheduler = None
+_batch_scheduler_lock = threading.Lock()
+
+
+def batch_scheduler_enabled():
+    return os.getenv('MINERU_BATCH_SCHEDULER_ENABLE', 'false').lower() == 'true'
+
+
+def get_batch_scheduler():
+    """
+    获取全局调度器，通过环境变量MINERU_BATCH_SCHEDULER_ENABLE=true启用，未启用时返回None。
+    最大batch页数复用MINERU_MIN_BATCH_INFERENCE_SIZE，默认值为384；
+    最长等待时间通过MINERU_BATCH_SCHEDULER_MAX_WAIT_MS设置，默认值为50。
+    """
+    global _batch_scheduler
+    if not batch_scheduler_enabled():
+        return None
+    with _batch_scheduler_lock:
+        if _batch_scheduler is None:
+            _batch_scheduler = BatchScheduler(
+                max_batch_size=int(os.environ.get('MINERU_MIN_BATCH_INFERENCE_SIZE', 384)),
+                max_wait_ms=float(os.environ.get('MINERU_BATCH_SCHEDULER_MAX_WAIT_MS', 50)),
+            )
+        return _batch_scheduler
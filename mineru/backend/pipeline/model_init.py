@@ -1,21 +1,16 @@
 import os
+import threading
 
-import torch
 from loguru import logger
 
 from .model_list import AtomicModel
-from ...model.layout.doclayoutyolo import DocLayoutYOLOModel
-from ...model.mfd.yolo_v8 import YOLOv8MFDModel
-from ...model.mfr.unimernet.Unimernet import UnimernetModel
-from ...model.ocr.paddleocr2pytorch.pytorch_paddle import PytorchPaddleOCR
-from ...model.ori_cls.paddle_ori_cls import PaddleOrientationClsModel
-from ...model.table.cls.paddle_table_cls import PaddleTableClsModel
-# from ...model.table.rec.RapidTable import RapidTableModel
-from ...model.table.rec.slanet_plus.main import RapidTableModel
-from ...model.table.rec.unet_table.main import UnetTableModel
 from ...utils.enum_class import ModelPath
 from ...utils.models_download_utils import auto_download_and_get_model_root_path
 
+# 模型实例在进程内共享，流水线推理线程、调度线程和各请求的后处理线程（后置ocr、阅读顺序）都会使用，
+# 模型不是线程安全的，调用模型推理时需要持有该锁
+model_inference_lock = threading.RLock()
+
 
 def img_orientation_cls_model_init():
     atom_model_manager = AtomModelSingleton()
@@ -26,11 +21,13 @@ def img_orientation_cls_model_init():
         lang="ch_lite",
         enable_merge_det_boxes=False
     )
+    from ...model.ori_cls.paddle_ori_cls import PaddleOrientationClsModel
     cls_model = PaddleOrientationClsModel(ocr_engine)
     return cls_model
 
 
 def table_cls_model_init():
+    from ...model.table.cls.paddle_table_cls import PaddleTableClsModel
     return PaddleTableClsModel()
 
 
@@ -43,6 +40,7 @@ def wired_table_model_init(lang=None):
         lang=lang,
         enable_merge_det_boxes=False
     )
+    from ...model.table.rec.unet_table.main import UnetTableModel
     table_model = UnetTableModel(ocr_engine)
     return table_model
 
@@ -56,11 +54,15 @@ def wireless_table_model_init(lang=None):
         lang=lang,
         enable_merge_det_boxes=False
     )
+    # from ...model.table.rec.RapidTable import RapidTableModel
+    from ...model.table.rec.slanet_plus.main import RapidTableModel
     table_model = RapidTableModel(ocr_engine)
     return table_model
 
 
 def mfd_model_init(weight, device='cpu'):
+    import torch
+    from ...model.mfd.yolo_v8 import YOLOv8MFDModel
     if str(device).startswith('npu'):
         device = torch.device(device)
     mfd_model = YOLOv8MFDModel(weight, device)
@@ -68,11 +70,14 @@ def mfd_model_init(weight, device='cpu'):
 
 
 def mfr_model_init(weight_dir, device='cpu'):
+    from ...model.mfr.unimernet.Unimernet import UnimernetModel
     mfr_model = UnimernetModel(weight_dir, device)
     return mfr_model
 
 
 def doclayout_yolo_model_init(weight, device='cpu'):
+    import torch
+    from ...model.layout.doclayoutyolo import DocLayoutYOLOModel
     if str(device).startswith('npu'):
         device = torch.device(device)
     model = DocLayoutYOLOModel(weight, device)
@@ -83,6 +88,7 @@ def ocr_model_init(det_db_box_thresh=0.3,
                    det_db_unclip_ratio=1.8,
                    enable_merge_det_boxes=True
                    ):
+    from ...model.ocr.paddleocr2pytorch.pytorch_paddle import PytorchPaddleOCR
     if lang is not None and lang != '':
         model = PytorchPaddleOCR(
             det_db_box_thresh=det_db_box_thresh,
@@ -104,6 +110,8 @@ def ocr_model_init(det_db_box_thresh=0.3,
 class AtomModelSingleton:
     _instance = None
     _models = {}
+    # 流水线模式下推理线程和后处理线程可能同时请求模型，加锁避免重复初始化
+    _lock = threading.RLock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -130,8 +138,9 @@ class AtomModelSingleton:
         else:
             key = atom_model_name
 
-        if key not in self._models:
-            self._models[key] = atom_model_init(model_name=atom_model_name, **kwargs)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = atom_model_init(model_name=atom_model_name, **kwargs)
         return self._models[key]
 
 def atom_model_init(model_name: str, **kwargs):
@@ -1,22 +1,30 @@
 # Copyright (c) Opendatalab. All rights reserved.
+import atexit
+import math
+import multiprocessing
 import os
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
+import pypdfium2 as pdfium
 from loguru import logger
-from tqdm import tqdm
 
+from mineru.data.data_reader_writer import MemoryDataWriter
 from mineru.utils.config_reader import get_device, get_llm_aided_config, get_formula_enable
-from mineru.backend.pipeline.model_init import AtomModelSingleton
+from mineru.backend.pipeline.model_init import AtomModelSingleton, model_inference_lock
+from mineru.backend.pipeline.model_server import get_model_server_client
 from mineru.backend.pipeline.para_split import para_split
 from mineru.utils.block_pre_proc import prepare_block_bboxes, process_groups
-from mineru.utils.block_sort import sort_blocks_by_bbox
+from mineru.utils.block_sort import batch_sort_blocks_by_bbox
 from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio
 from mineru.utils.cut_image import cut_image_and_table
 from mineru.utils.enum_class import ContentType
-from mineru.utils.llm_aided import llm_aided_title
 from mineru.utils.model_utils import clean_memory
 from mineru.backend.pipeline.pipeline_magic_model import MagicModel
 from mineru.utils.ocr_utils import OcrConfidence
+from mineru.utils.pdf_image_tools import pdfium_lock
 from mineru.utils.span_block_fix import fill_spans_in_blocks, fix_discarded_block, fix_block_spans
 from mineru.utils.span_pre_proc import remove_outside_spans, remove_overlaps_low_confidence_spans, \
     remove_overlaps_min_spans, txt_spans_extract
@@ -25,12 +33,14 @@ from mineru.version import __version__
 from mineru.utils.hash_utils import bytes_md5
 
 
-def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer, page_index, ocr_enable=False, formula_enabled=True):
+def prepare_page_info(page_model_info, image_dict, page, image_writer, page_index, ocr_enable=False, formula_enabled=True):
+    """完成阅读顺序排序之前的页面处理，排序由sort_prepared_pages跨页批量执行"""
     scale = image_dict["scale"]
     page_pil_img = image_dict["img_pil"]
     # page_img_md5 = str_md5(image_dict["img_base64"])
     page_img_md5 = bytes_md5(page_pil_img.tobytes())
-    page_w, page_h = map(int, page.get_size())
+    with pdfium_lock:
+        page_w, page_h = map(int, page.get_size())
     magic_model = MagicModel(page_model_info, scale)
 
     """从magic_model对象中获取后面会用到的区块信息"""
@@ -147,9 +157,18 @@ def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer
     )
     fix_discarded_blocks = fix_discarded_block(discarded_block_with_spans)
 
+    prepared_page = {
+        'page_index': page_index,
+        'page_w': page_w,
+        'page_h': page_h,
+        'blocks': None,
+        'footnote_blocks': footnote_blocks,
+        'discarded_blocks': fix_discarded_blocks,
+    }
+
     """如果当前页面没有有效的bbox则跳过"""
     if len(all_bboxes) == 0:
-        return None
+        return prepared_page
 
     """对image/table/interline_equation截图"""
     for span in spans:
@@ -164,30 +183,199 @@ def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer
     """对block进行fix操作"""
     fix_blocks = fix_block_spans(block_with_spans)
 
-    """对block进行排序"""
-    sorted_blocks = sort_blocks_by_bbox(fix_blocks, page_w, page_h, footnote_blocks)
+    prepared_page['blocks'] = fix_blocks
 
-    """构造page_info"""
-    page_info = make_page_info_dict(sorted_blocks, page_index, page_w, page_h, fix_discarded_blocks)
+    return prepared_page
 
-    return page_info
 
+# 每个middle_json进程至少分配的页数，页数太少时多进程的启动和传输开销大于收益
+MIN_PAGES_PER_MIDDLE_JSON_WORKER = 8
 
-def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=None, ocr_enable=False, formula_enabled=True):
-    middle_json = {"pdf_info": [], "_backend":"pipeline", "_version_name": __version__}
-    formula_enabled = get_formula_enable(formula_enabled)
-    for page_index, page_model_info in tqdm(enumerate(model_list), total=len(model_list), desc="Processing pages"):
+_middle_json_executors = {}
+_middle_json_executors_lock = threading.Lock()
+
+
+def get_middle_json_workers():
+    """页面middle_json构造的进程数，可通过环境变量MINERU_MIDDLE_JSON_WORKERS设置，默认为1，即在当前进程中串行处理"""
+    workers = os.getenv('MINERU_MIDDLE_JSON_WORKERS')
+    if workers is not None:
+        return max(1, int(workers))
+    return 1
+
+
+def _get_middle_json_executor(workers):
+    # pdfium句柄不能跨进程传递，使用spawn方式的进程池，每个进程根据pdf_bytes重新打开pdf
+    with _middle_json_executors_lock:
+        if workers not in _middle_json_executors:
+            _middle_json_executors[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _middle_json_executors[workers]
+
+
+def _drop_middle_json_executor(workers, executor):
+    with _middle_json_executors_lock:
+        if _middle_json_executors.get(workers) is executor:
+            del _middle_json_executors[workers]
+    executor.shutdown(wait=False)
+
+
+@atexit.register
+def _shutdown_middle_json_executors():
+    with _middle_json_executors_lock:
+        executors = list(_middle_json_executors.values())
+        _middle_json_executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _prepare_pages_worker(pdf_bytes, page_tasks, write_images, ocr_enable, formula_enabled):
+    """
+    进程池中执行的页面处理，page_tasks为[(page_index, page_model_info, scale), ...]。
+    页面图像不经进程间传递，由子进程按主进程渲染时的scale重新渲染，渲染结果与主进程一致，截图路径中的md5也一致；
+    截图先写入内存，连同prepared_page一起返回给主进程写入image_writer
+    """
+    image_writer = MemoryDataWriter() if write_images else None
+    with pdfium_lock:
+        pdf_doc = pdfium.PdfDocument(pdf_bytes)
+    try:
+        prepared_pages = [
+            _prepare_page(pdf_doc, page_index, page_model_info, {"scale": scale}, image_writer, ocr_enable, formula_enabled)
+            for page_index, page_model_info, scale in page_tasks
+        ]
+        return prepared_pages, image_writer.files if write_images else {}
+    finally:
+        with pdfium_lock:
+            pdf_doc.close()
+
+
+def _render_page_image(page, scale):
+    bitmap = page.render(scale=scale)
+    try:
+        return bitmap.to_pil()
+    finally:
+        bitmap.close()
+
+
+def _prepare_page(pdf_doc, page_index, page_model_info, image_dict, image_writer, ocr_enable, formula_enabled):
+    # 只在打开、关闭页面和prepare_page_info内部的pdfium调用处持锁，其余处理可以与渲染线程并行
+    with pdfium_lock:
         page = pdf_doc[page_index]
-        image_dict = images_list[page_index]
-        page_info = page_model_info_to_page_info(
-            page_model_info, image_dict, page, image_writer, page_index, ocr_enable=ocr_enable, formula_enabled=formula_enabled
+        if "img_pil" not in image_dict:
+            image_dict = {"scale": image_dict["scale"], "img_pil": _render_page_image(page, image_dict["scale"])}
+    try:
+        return prepare_page_info(
+            page_model_info, image_dict, page, image_writer, page_index,
+            ocr_enable=ocr_enable, formula_enabled=formula_enabled
         )
-        if page_info is None:
-            page_w, page_h = map(int, page.get_size())
-            page_info = make_page_info_dict([], page_index, page_w, page_h, [])
-        middle_json["pdf_info"].append(page_info)
+    finally:
+        with pdfium_lock:
+            page.close()
+
+
+def _prepare_pages_serial(doc_tasks, formula_enabled):
+    prepared_pages = []
+    for pdf_bytes, pdf_doc, image_writer, ocr_enable, page_tasks in doc_tasks:
+        for page_index, page_model_info, image_dict in page_tasks:
+            prepared_pages.append(_prepare_page(
+                pdf_doc, page_index, page_model_info, image_dict, image_writer, ocr_enable, formula_enabled
+            ))
+    return prepared_pages
+
+
+def prepare_pages(doc_tasks, formula_enabled=True, workers=None):
+    """
+    批量完成多个文档页面的排序前处理，返回的prepared_page列表与输入页面顺序一致。
+    doc_tasks中每项为(pdf_bytes, pdf_doc, image_writer, ocr_enable, page_tasks)，
+    page_tasks为[(page_index, page_model_info, image_dict), ...]。
+    页数足够多时按文档切成连续的页码块交给多进程并行处理，各进程根据pdf_bytes重新打开pdf并重新渲染页面图像；
+    阅读顺序排序和后置ocr依赖模型，不在子进程中执行，仍由sort_prepared_pages和finalize_middle_json_list在主进程批量完成。
+    """
+    doc_tasks = [doc_task for doc_task in doc_tasks if len(doc_task[4]) > 0]
+    if workers is None:
+        workers = get_middle_json_workers()
+    total_pages = sum(len(doc_task[4]) for doc_task in doc_tasks)
+    task_workers = min(workers, total_pages // MIN_PAGES_PER_MIDDLE_JSON_WORKER)
+    if task_workers <= 1 or any(doc_task[0] is None for doc_task in doc_tasks):
+        return _prepare_pages_serial(doc_tasks, formula_enabled)
+
+    # 块数多于进程数以平衡不同页面的处理耗时
+    chunk_size = math.ceil(total_pages / (task_workers * 2))
+    chunk_size = max(chunk_size, MIN_PAGES_PER_MIDDLE_JSON_WORKER // 2)
+
+    prepared_pages = []
+    executor = _get_middle_json_executor(workers)
+    try:
+        futures = []
+        for pdf_bytes, _, image_writer, ocr_enable, page_tasks in doc_tasks:
+            for i in range(0, len(page_tasks), chunk_size):
+                # 只传递子进程需要的scale，不传递整页图像
+                worker_page_tasks = [
+                    (page_index, page_model_info, image_dict["scale"])
+                    for page_index, page_model_info, image_dict in page_tasks[i:i + chunk_size]
+                ]
+                future = executor.submit(
+                    _prepare_pages_worker, pdf_bytes, worker_page_tasks,
+                    image_writer is not None, ocr_enable, formula_enabled
+                )
+                futures.append((future, image_writer))
+        for future, image_writer in futures:
+            chunk_prepared_pages, image_files = future.result()
+            for path, data in image_files.items():
+                image_writer.write(path, data)
+            prepared_pages.extend(chunk_prepared_pages)
+    except BrokenProcessPool as e:
+        # 子进程崩溃通常是pdfium提取该文档文本时出错，不在当前进程中重试，避免拖垮整个服务
+        _drop_middle_json_executor(workers, executor)
+        raise RuntimeError(f"middle json process crashed while processing this document: {e}") from e
+    return prepared_pages
+
+
+def sort_prepared_pages(prepared_pages):
+    """对多页的block批量做阅读顺序排序并构造page_info，layoutreader按batch跨页推理"""
+    valid_pages = [prepared_page for prepared_page in prepared_pages if prepared_page['blocks'] is not None]
+    """对block进行排序"""
+    sorted_blocks_list = batch_sort_blocks_by_bbox([
+        (prepared_page['blocks'], prepared_page['page_w'], prepared_page['page_h'], prepared_page['footnote_blocks'])
+        for prepared_page in valid_pages
+    ])
+    sorted_blocks_iter = iter(sorted_blocks_list)
 
-    """后置ocr处理"""
+    """构造page_info"""
+    page_info_list = []
+    for prepared_page in prepared_pages:
+        if prepared_page['blocks'] is None:
+            page_info = make_page_info_dict([], prepared_page['page_index'], prepared_page['page_w'], prepared_page['page_h'], [])
+        else:
+            page_info = make_page_info_dict(
+                next(sorted_blocks_iter), prepared_page['page_index'], prepared_page['page_w'], prepared_page['page_h'],
+                prepared_page['discarded_blocks']
+            )
+        page_info_list.append(page_info)
+    return page_info_list
+
+
+def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer, page_index, ocr_enable=False, formula_enabled=True):
+    prepared_page = prepare_page_info(
+        page_model_info, image_dict, page, image_writer, page_index, ocr_enable=ocr_enable, formula_enabled=formula_enabled
+    )
+    return sort_prepared_pages([prepared_page])[0]
+
+
+def init_middle_json():
+    return {"pdf_info": [], "_backend":"pipeline", "_version_name": __version__}
+
+
+def append_page_to_middle_json(middle_json, page_model_info, image_dict, page, image_writer, page_index, ocr_enable=False, formula_enabled=True):
+    page_info = page_model_info_to_page_info(
+        page_model_info, image_dict, page, image_writer, page_index, ocr_enable=ocr_enable, formula_enabled=formula_enabled
+    )
+    middle_json["pdf_info"].append(page_info)
+
+
+def collect_post_ocr_spans(middle_json):
+    """收集需要后置ocr的span，返回span列表和对应的裁剪图像列表，span中的np_img会被移除"""
     need_ocr_list = []
     img_crop_list = []
     text_block_list = []
@@ -208,14 +396,37 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
                     need_ocr_list.append(span)
                     img_crop_list.append(span['np_img'])
                     span.pop('np_img')
-    if len(img_crop_list) > 0:
-        atom_model_manager = AtomModelSingleton()
-        ocr_model = atom_model_manager.get_atom_model(
-            atom_model_name='ocr',
-            det_db_box_thresh=0.3,
-            lang=lang
-        )
-        ocr_res_list = ocr_model.ocr(img_crop_list, det=False, tqdm_enable=True)[0]
+    return need_ocr_list, img_crop_list
+
+
+def batch_post_ocr(middle_json_list, lang_list):
+    """
+    多个文档的后置ocr合并处理，所有文档的待识别span按语言分组，每种语言只调用一次文本识别，
+    识别器内部按宽高比排序后分批推理，小文档不再各自以很小的batch调用识别模型。
+    """
+    lang_groups = {}
+    for middle_json, lang in zip(middle_json_list, lang_list):
+        need_ocr_list, img_crop_list = collect_post_ocr_spans(middle_json)
+        if len(img_crop_list) == 0:
+            continue
+        group_spans, group_crops = lang_groups.setdefault(lang, ([], []))
+        group_spans.extend(need_ocr_list)
+        group_crops.extend(img_crop_list)
+
+    model_client = get_model_server_client()
+    atom_model_manager = AtomModelSingleton()
+    for lang, (need_ocr_list, img_crop_list) in lang_groups.items():
+        if model_client is not None:
+            ocr_res_list = model_client.ocr_rec(img_crop_list, lang)
+        else:
+            # 与页面推理使用同一个ocr实例，需要与其他线程的模型推理互斥
+            with model_inference_lock:
+                ocr_model = atom_model_manager.get_atom_model(
+                    atom_model_name='ocr',
+                    det_db_box_thresh=0.3,
+                    lang=lang
+                )
+                ocr_res_list = ocr_model.ocr(img_crop_list, det=False, tqdm_enable=True)[0]
         assert len(ocr_res_list) == len(
             need_ocr_list), f'ocr_res_list: {len(ocr_res_list)}, need_ocr_list: {len(need_ocr_list)}'
         for index, span in enumerate(need_ocr_list):
@@ -227,6 +438,20 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
                 span['content'] = ''
                 span['score'] = 0.0
 
+
+def finalize_middle_json_list(middle_json_list, lang_list):
+    """多个文档一起完成后处理，后置ocr跨文档合并推理，分段、跨页表格合并等仍按文档分别处理"""
+    batch_post_ocr(middle_json_list, lang_list)
+    for middle_json in middle_json_list:
+        finalize_middle_json(middle_json, post_ocr=False)
+    return middle_json_list
+
+
+def finalize_middle_json(middle_json, lang=None, post_ocr=True):
+    """后置ocr处理"""
+    if post_ocr:
+        batch_post_ocr([middle_json], [lang])
+
     """分段"""
     para_split(middle_json["pdf_info"])
 
@@ -241,10 +466,35 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
         title_aided_config = llm_aided_config.get('title_aided', None)
         if title_aided_config is not None:
             if title_aided_config.get('enable', False):
+                # openai客户端只在启用llm优化时导入
+                from mineru.utils.llm_aided import llm_aided_title
                 llm_aided_title_start_time = time.time()
                 llm_aided_title(middle_json["pdf_info"], title_aided_config)
                 logger.info(f'llm aided title time: {round(time.time() - llm_aided_title_start_time, 2)}')
 
+    return middle_json
+
+
+def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=None, ocr_enable=False, formula_enabled=True, finalize=True, pdf_bytes=None):
+    """
+    finalize为False时不做后置ocr、分段等后处理，由调用方收集多个文档的结果后统一调用finalize_middle_json_list，
+    使后置ocr跨文档合并推理。
+    传入pdf_bytes时，页面处理可以按MINERU_MIDDLE_JSON_WORKERS分给多进程并行执行。
+    """
+    middle_json = init_middle_json()
+    formula_enabled = get_formula_enable(formula_enabled)
+    page_tasks = [
+        (page_index, page_model_info, images_list[page_index])
+        for page_index, page_model_info in enumerate(model_list)
+    ]
+    prepared_pages = prepare_pages(
+        [(pdf_bytes, pdf_doc, image_writer, ocr_enable, page_tasks)], formula_enabled=formula_enabled
+    )
+    middle_json["pdf_info"].extend(sort_prepared_pages(prepared_pages))
+
+    if finalize:
+        finalize_middle_json(middle_json, lang)
+
     """清理内存"""
     pdf_doc.close()
     if os.getenv('MINERU_DONOT_CLEAN_MEM') is None and len(model_list) >= 10:
@@ -0,0 +1,226 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import secrets
+import stat
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from loguru import logger
+
+from .batch_scheduler import BatchScheduler
+from .model_init import model_inference_lock
+
+
+MODEL_SERVER_ADDRESS_ENV = 'MINERU_MODEL_SERVER_ADDRESS'
+MODEL_SERVER_AUTHKEY_ENV = 'MINERU_MODEL_SERVER_AUTHKEY'
+
+
+def get_model_server_runtime_dir():
+    """
+    模型服务的socket和密钥文件所在目录，优先使用$XDG_RUNTIME_DIR/mineru，否则使用临时目录下的mineru-<uid>。
+    目录权限为0700，已存在的目录不属于当前用户或其他用户可访问时拒绝使用，避免被其他本地用户抢先创建。
+    """
+    runtime_dir = os.getenv('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        runtime_dir = os.path.join(runtime_dir, 'mineru')
+    else:
+        runtime_dir = os.path.join(tempfile.gettempdir(), f'mineru-{os.getuid()}')
+    os.makedirs(runtime_dir, mode=0o700, exist_ok=True)
+    dir_stat = os.lstat(runtime_dir)
+    if not stat.S_ISDIR(dir_stat.st_mode) or dir_stat.st_uid != os.getuid() or dir_stat.st_mode & 0o077:
+        raise PermissionError(f'model server runtime dir {runtime_dir} must be a directory owned by the current user with mode 0700')
+    return runtime_dir
+
+
+def get_default_model_server_address():
+    return os.path.join(get_model_server_runtime_dir(), 'model-server.sock')
+
+
+def _get_authkey_path():
+    return os.path.join(get_model_server_runtime_dir(), 'model-server.key')
+
+
+def get_model_server_authkey(create=False):
+    """
+    模型服务连接认证使用的密钥，优先读取环境变量MINERU_MODEL_SERVER_AUTHKEY，
+    否则读取运行目录下的密钥文件，create为True时（服务端）文件不存在则生成随机密钥。
+    """
+    authkey = os.getenv(MODEL_SERVER_AUTHKEY_ENV)
+    if authkey:
+        return authkey.encode('utf-8')
+    authkey_path = _get_authkey_path()
+    if create and not os.path.exists(authkey_path):
+        try:
+            fd = os.open(authkey_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+    try:
+        with open(authkey_path, 'r') as f:
+            return f.read().strip().encode('utf-8')
+    except FileNotFoundError:
+        raise RuntimeError(
+            f'model server authkey not found, set {MODEL_SERVER_AUTHKEY_ENV} or start mineru-model-server first'
+        ) from None
+
+
+class ModelServer:
+    """
+    本地模型服务进程，独占layout/MFD/MFR/OCR/表格/layoutreader等模型，通过Unix socket为多个web worker提供推理。
+    worker数增加时模型只在本进程中加载一份，内存不随worker数增长。
+    页面推理请求经BatchScheduler跨worker合并成batch，后置ocr和阅读顺序请求与页面推理互斥执行，模型不会被并发访问。
+    """
+
+    def __init__(self, address, max_batch_size=None, max_wait_ms=None, authkey=None):
+        self.address = address
+        self._authkey = authkey
+        self._model_lock = model_inference_lock
+        self._scheduler = BatchScheduler(
+            max_batch_size=max_batch_size or int(os.environ.get('MINERU_MIN_BATCH_INFERENCE_SIZE', 384)),
+            max_wait_ms=max_wait_ms or float(os.environ.get('MINERU_BATCH_SCHEDULER_MAX_WAIT_MS', 50)),
+            analyze_func=self._analyze,
+        )
+        self._handlers = {
+            'analyze': self._scheduler.analyze,
+            'ocr_rec': self.ocr_rec,
+            'predict_orders': self.predict_orders,
+        }
+
+    def _analyze(self, images_with_extra_info, formula_enable, table_enable):
+        from .pipeline_analyze import cached_batch_image_analyze
+
+        with self._model_lock:
+            return cached_batch_image_analyze(images_with_extra_info, formula_enable, table_enable)
+
+    def ocr_rec(self, img_crop_list, lang=None):
+        from .model_init import AtomModelSingleton
+
+        with self._model_lock:
+            ocr_model = AtomModelSingleton().get_atom_model(
+                atom_model_name='ocr',
+                det_db_box_thresh=0.3,
+                lang=lang
+            )
+            return ocr_model.ocr(img_crop_list, det=False, tqdm_enable=True)[0]
+
+    def predict_orders(self, boxes_list):
+        from mineru.utils.block_sort import predict_orders
+
+        with self._model_lock:
+            return predict_orders(boxes_list)
+
+    def _handle_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = ('ok', self._handlers[method](*args))
+                except Exception as e:
+                    logger.exception(e)
+                    response = ('error', f'{type(e).__name__}: {e}')
+                try:
+                    conn.send(response)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        # 服务进程自身不能再作为客户端转发请求
+        os.environ.pop(MODEL_SERVER_ADDRESS_ENV, None)
+        authkey = self._authkey or get_model_server_authkey(create=True)
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        # 请求以pickle传输，socket创建时就只允许当前用户访问，连接还需要通过authkey认证
+        old_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family='AF_UNIX', authkey=authkey)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.address, 0o600)
+        logger.info(f'model server is listening on {self.address}')
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    logger.warning(f'reject model server connection: {e}')
+                    continue
+                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+
+class ModelServerClient:
+    """模型服务客户端，接口与本地推理函数一致，每个线程持有独立的连接"""
+
+    def __init__(self, address, authkey=None):
+        self.address = address
+        self._authkey = authkey
+        self._local = threading.local()
+
+    def _get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self._authkey is None:
+                self._authkey = get_model_server_authkey()
+            conn = Client(self.address, family='AF_UNIX', authkey=self._authkey)
+            self._local.conn = conn
+        return conn
+
+    def _call(self, method, *args):
+        # 模型服务重启后旧连接失效，重新连接后重试一次
+        for retry in range(2):
+            conn = self._get_connection()
+            try:
+                conn.send((method, args))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                self._local.conn = None
+                conn.close()
+                if retry > 0:
+                    raise
+                logger.warning(f'model server connection lost, reconnecting to {self.address}')
+        if status != 'ok':
+            raise RuntimeError(f'model server {method} failed: {result}')
+        return result
+
+    def analyze(self, images_with_extra_info, formula_enable=True, table_enable=True):
+        """与batch_image_analyze参数和返回值一致"""
+        if not images_with_extra_info:
+            return []
+        return self._call('analyze', images_with_extra_info, formula_enable, table_enable)
+
+    def ocr_rec(self, img_crop_list, lang=None):
+        """只做文本识别，返回[(text, score), ...]"""
+        return self._call('ocr_rec', img_crop_list, lang)
+
+    def predict_orders(self, boxes_list):
+        """与block_sort.predict_orders参数和返回值一致"""
+        return self._call('predict_orders', boxes_list)
+
+
+_model_server_client = None
+_model_server_client_lock = threading.Lock()
+
+
+def get_model_server_client():
+    """
+    获取模型服务客户端，通过环境变量MINERU_MODEL_SERVER_ADDRESS指定模型服务的Unix socket路径启用，未设置时返回None。
+    启用后页面推理、后置ocr和阅读顺序推理都交给模型服务进程执行，当前进程不加载模型。
+    连接认证密钥取自MINERU_MODEL_SERVER_AUTHKEY，未设置时读取服务端在运行目录下生成的密钥文件。
+    """
+    global _model_server_client
+    address = os.getenv(MODEL_SERVER_ADDRESS_ENV)
+    if not address:
+        return None
+    with _model_server_client_lock:
+        if _model_server_client is None or _model_server_client.address != address:
+            _model_server_client = ModelServerClient(address)
+        return _model_server_client
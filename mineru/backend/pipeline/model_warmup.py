@@ -0,0 +1,141 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from loguru import logger
+from PIL import Image, ImageDraw
+
+from .model_list import AtomicModel
+
+
+def get_preload_langs(preload_langs=None):
+    """
+    解析需要预加载的语言列表，参数为逗号分隔的字符串或列表，未传入时读取环境变量MINERU_PRELOAD_LANGS。
+    返回None表示不预加载。
+    """
+    if preload_langs is None:
+        preload_langs = os.getenv('MINERU_PRELOAD_LANGS')
+    if not preload_langs:
+        return None
+    if isinstance(preload_langs, str):
+        preload_langs = preload_langs.split(',')
+    return [lang.strip() for lang in preload_langs if lang.strip()]
+
+
+def _make_dummy_page(width=816, height=1056):
+    """生成带文字和表格线的空白页面，使检测类模型在预热时走到后续的识别分支"""
+    page_img = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(page_img)
+    for row in range(6):
+        draw.text((80, 80 + row * 40), f'MinerU warm up line {row} 0123456789', fill='black')
+    table_box = (80, 400, width - 80, 640)
+    draw.rectangle(table_box, outline='black', width=2)
+    for y in range(table_box[1], table_box[3], 60):
+        draw.line((table_box[0], y, table_box[2], y), fill='black', width=2)
+    for x in range(table_box[0], table_box[2], 160):
+        draw.line((x, table_box[1], x, table_box[3]), fill='black', width=2)
+    return page_img
+
+
+def _dummy_ocr_result(np_img):
+    height, width = np_img.shape[:2]
+    return [[[[0, 0], [width // 2, 0], [width // 2, height // 2], [0, height // 2]], 'warm up', 0.99]]
+
+
+def _warmup_step(step_timings, name, func):
+    start = time.time()
+    try:
+        func()
+    except Exception as e:
+        # 预热输入是构造的，个别模型的前向失败不影响服务启动，真实请求时会再次暴露问题
+        logger.warning(f'warm up {name} failed: {e}')
+    step_timings[name] = round(time.time() - start, 2)
+
+
+def warmup_models(lang_list=None, formula_enable=True, table_enable=True):
+    """
+    预加载pipeline后端的模型并用构造的页面各做一次前向推理，消除服务首个请求的模型加载和首次推理开销。
+    覆盖layout/MFD/MFR整页模型、各语言的ocr实例(整页ocr、后置ocr、表格ocr)、表格分类和方向分类模型、
+    有线/无线表格模型以及layoutreader阅读顺序模型。
+    配置了模型服务时当前进程不加载模型，直接跳过，预热应在模型服务进程中执行。
+    返回各步骤耗时。
+    """
+    from .model_server import get_model_server_client
+
+    if get_model_server_client() is not None:
+        logger.info('model server is configured, skip warming up models in this process')
+        return {}
+
+    import torch
+
+    from .model_init import AtomModelSingleton
+    from .pipeline_analyze import ModelSingleton, batch_image_analyze
+    from mineru.utils.block_sort import predict_orders
+
+    lang_list = lang_list or ['ch']
+    warmup_start = time.time()
+    logger.info(f'warming up models, langs: {lang_list}, formula: {formula_enable}, table: {table_enable}')
+
+    page_img = _make_dummy_page()
+    np_img = np.asarray(page_img)
+    table_img = np_img[400:640, 80:736]
+    line_img = np_img[75:110, 75:500]
+    atom_model_manager = AtomModelSingleton()
+    step_timings = {}
+
+    # 整页推理，加载layout/MFD/MFR和默认ocr，同时覆盖ocr模式和txt模式两条路径
+    _warmup_step(step_timings, 'page analyze', lambda: batch_image_analyze(
+        [(page_img, ocr_enable, lang) for lang in lang_list for ocr_enable in (True, False)],
+        formula_enable, table_enable
+    ))
+    pipeline_model = ModelSingleton().get_model(lang=None, formula_enable=formula_enable, table_enable=table_enable)
+
+    if formula_enable:
+        fake_mfd_res = SimpleNamespace(boxes=SimpleNamespace(
+            xyxy=torch.tensor([[75.0, 75.0, 500.0, 110.0]]), conf=torch.tensor([0.9]), cls=torch.tensor([0.0])
+        ))
+        _warmup_step(step_timings, 'mfr', lambda: pipeline_model.mfr_model.batch_predict([fake_mfd_res], [np_img]))
+
+    for lang in lang_list:
+        # 整页ocr和后置ocr使用的ocr实例
+        ocr_model = atom_model_manager.get_atom_model(atom_model_name=AtomicModel.OCR, det_db_box_thresh=0.3, lang=lang)
+        _warmup_step(step_timings, f'ocr det+rec [{lang}]', lambda: ocr_model.ocr(np_img))
+        _warmup_step(step_timings, f'ocr rec [{lang}]', lambda: ocr_model.ocr([line_img], det=False))
+
+        if table_enable:
+            # 表格ocr使用的ocr实例和对应语言的有线表格模型
+            table_ocr_model = atom_model_manager.get_atom_model(
+                atom_model_name=AtomicModel.OCR,
+                det_db_box_thresh=0.5,
+                det_db_unclip_ratio=1.6,
+                lang=lang,
+                enable_merge_det_boxes=False,
+            )
+            _warmup_step(step_timings, f'table ocr [{lang}]', lambda: table_ocr_model.ocr(table_img))
+            wired_table_model = atom_model_manager.get_atom_model(atom_model_name=AtomicModel.WiredTable, lang=lang)
+            _warmup_step(step_timings, f'wired table [{lang}]', lambda: wired_table_model.predict(
+                table_img, _dummy_ocr_result(table_img), ''
+            ))
+
+    if table_enable:
+        table_cls_model = atom_model_manager.get_atom_model(atom_model_name=AtomicModel.TableCls)
+        _warmup_step(step_timings, 'table cls', lambda: table_cls_model.predict(table_img))
+        img_orientation_cls_model = atom_model_manager.get_atom_model(atom_model_name=AtomicModel.ImgOrientationCls)
+        _warmup_step(step_timings, 'img orientation cls', lambda: img_orientation_cls_model.predict(table_img))
+        wireless_table_model = atom_model_manager.get_atom_model(atom_model_name=AtomicModel.WirelessTable)
+        _warmup_step(step_timings, 'wireless table', lambda: wireless_table_model.predict(
+            table_img, _dummy_ocr_result(table_img)
+        ))
+
+    # layoutreader阅读顺序模型，line框为0~1000的归一化坐标
+    _warmup_step(step_timings, 'layoutreader', lambda: predict_orders([
+        [[100, 100 + i * 30, 900, 120 + i * 30] for i in range(8)]
+    ]))
+
+    logger.info(
+        f'models warmed up in {round(time.time() - warmup_start, 2)}s: '
+        + ', '.join(f'{name} {cost}s' for name, cost in step_timings.items())
+    )
+    return step_timings
@@ -1,20 +1,31 @@
+import copy
 import os
+import queue
+import threading
 import time
+from itertools import groupby
 from typing import List, Tuple
+
+import pypdfium2 as pdfium
 from PIL import Image
 from loguru import logger
 
-from .model_init import MineruPipelineModel
-from mineru.utils.config_reader import get_device
+from .batch_scheduler import get_batch_scheduler
+from .model_server import get_model_server_client
+from .model_init import MineruPipelineModel, model_inference_lock
+from mineru.utils.config_reader import get_device, get_formula_enable
 from ...utils.enum_class import ImageType
 from ...utils.pdf_classify import classify
-from ...utils.pdf_image_tools import load_images_from_pdf
+from ...utils.pdf_image_tools import load_images_from_pdf, render_pdf_pages, pdfium_lock
 from ...utils.model_utils import get_vram, clean_memory
+from ...utils.result_cache import get_page_cache, get_page_model_fingerprint, make_page_cache_key
 
 
 os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'  # 让mps可以fallback
 os.environ['NO_ALBUMENTATIONS_UPDATE'] = '1'  # 禁止albumentations检查更新
 
+_STAGE_END = object()  # 流水线阶段结束标记
+
 class ModelSingleton:
     _instance = None
     _models = {}
@@ -118,6 +129,7 @@ def doc_analyze(
     ]
 
     # 执行批处理
+    analyze = get_analyze_func()
     results = []
     processed_images_count = 0
     for index, batch_image in enumerate(batch_images):
@@ -126,7 +138,7 @@ def doc_analyze(
             f'Batch {index + 1}/{len(batch_images)}: '
             f'{processed_images_count} pages/{len(images_with_extra_info)} pages'
         )
-        batch_results = batch_image_analyze(batch_image, formula_enable, table_enable)
+        batch_results = analyze(batch_image, formula_enable, table_enable)
         results.extend(batch_results)
 
     # 构建返回结果
@@ -147,6 +159,309 @@ def doc_analyze(
     return infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list
 
 
+def doc_analyze_streaming(
+        pdf_bytes_list,
+        image_writer_list,
+        lang_list,
+        on_doc_ready,
+        parse_method: str = 'auto',
+        formula_enable=True,
+        table_enable=True,
+        on_page_ready=None,
+):
+    """
+    流式分析模式：页面按MINERU_MIN_BATCH_INFERENCE_SIZE大小的窗口懒渲染，每个窗口推理后立即转换为middle_json页信息，
+    并释放该窗口的页面图像，峰值内存只与窗口大小和队列深度相关，与文档页数无关。
+    窗口可以跨越文档边界，批处理的页面组合与doc_analyze一致。
+
+    渲染、模型推理、middle_json构造分为三个阶段，通过有界队列串联成流水线：
+    第N个窗口推理时，第N+1个窗口在渲染或第N-1个窗口在做后处理。
+    队列深度可通过环境变量MINERU_PIPELINE_STAGE_QUEUE_SIZE设置，默认值为1。
+    渲染前需要先取得窗口配额，同时存在页面图像的窗口（渲染中、排队中、推理中、后处理中）
+    最多为 队列深度+1 个，默认峰值约为2个窗口的页面图像。
+
+    每个文档的全部页面处理完成后调用 on_doc_ready(pdf_idx, model_list, middle_json, ocr_enable)，
+    同一窗口内完成的多个文档合并做后置ocr，之后按文档顺序依次回调。
+    传入on_page_ready时每页完成后调用 on_page_ready(pdf_idx, page_idx)，用于上报进度。
+    返回各阶段的累计耗时，用于定位流水线瓶颈。
+    """
+    from .model_json_to_middle_json import init_middle_json, prepare_pages, sort_prepared_pages, \
+        finalize_middle_json_list
+
+    min_batch_inference_size = int(os.environ.get('MINERU_MIN_BATCH_INFERENCE_SIZE', 384))
+    stage_queue_size = int(os.environ.get('MINERU_PIPELINE_STAGE_QUEUE_SIZE', 1))
+    p_formula_enable = get_formula_enable(formula_enable)
+
+    stage_timings = {'render': 0.0, 'infer': 0.0, 'middle_json': 0.0}
+    render_queue = queue.Queue(maxsize=stage_queue_size)
+    middle_json_queue = queue.Queue(maxsize=stage_queue_size)
+    # 各阶段合计持有页面图像的窗口数上限，后处理阶段处理完一个窗口后才允许渲染新的窗口
+    window_slots = threading.Semaphore(stage_queue_size + 1)
+    stop_event = threading.Event()
+    stage_errors = []
+    # 已打开但尚未完成的文档，流水线异常或提前停止时在退出前统一关闭
+    open_docs = {}
+
+    def put_item(q, item):
+        while not stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def acquire_window_slot():
+        while not stop_event.is_set():
+            if window_slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def get_item(q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if stop_event.is_set():
+                    return _STAGE_END
+
+    def iter_pages():
+        for pdf_idx, pdf_bytes in enumerate(pdf_bytes_list):
+            with pdfium_lock:
+                # 确定OCR设置
+                _ocr_enable = False
+                if parse_method == 'auto':
+                    if classify(pdf_bytes) == 'ocr':
+                        _ocr_enable = True
+                elif parse_method == 'ocr':
+                    _ocr_enable = True
+
+                pdf_doc = pdfium.PdfDocument(pdf_bytes)
+                open_docs[pdf_idx] = pdf_doc
+                page_count = len(pdf_doc)
+            doc_state = {
+                'pdf_idx': pdf_idx,
+                'pdf_bytes': pdf_bytes,
+                'pdf_doc': pdf_doc,
+                'page_count': page_count,
+                'lang': lang_list[pdf_idx],
+                'ocr_enable': _ocr_enable,
+                'model_list': [],
+                'middle_json': init_middle_json(),
+            }
+            if page_count == 0:
+                # 空文档不参与渲染和推理，由后处理阶段直接完成
+                yield doc_state, None
+                continue
+            for page_idx in range(page_count):
+                yield doc_state, page_idx
+
+    def render_stage():
+        try:
+            page_iter = iter_pages()
+            while True:
+                window_pages = []
+                for doc_state, page_idx in page_iter:
+                    window_pages.append((doc_state, page_idx))
+                    if len(window_pages) >= min_batch_inference_size:
+                        break
+                if not window_pages:
+                    break
+                if not acquire_window_slot():
+                    return
+
+                # 按文档分段懒渲染
+                render_start = time.time()
+                window = []
+                for _, group in groupby(window_pages, key=lambda item: item[0]['pdf_idx']):
+                    group = list(group)
+                    doc_state = group[0][0]
+                    page_indices = [page_idx for _, page_idx in group if page_idx is not None]
+                    if not page_indices:
+                        window.append((doc_state, None, None))
+                        continue
+                    image_dicts = render_pdf_pages(doc_state['pdf_bytes'], page_indices, image_type=ImageType.PIL)
+                    for page_idx, image_dict in zip(page_indices, image_dicts):
+                        window.append((doc_state, page_idx, image_dict))
+                stage_timings['render'] += time.time() - render_start
+
+                if not put_item(render_queue, window):
+                    return
+        except Exception as e:
+            stage_errors.append(e)
+            stop_event.set()
+        finally:
+            put_item(render_queue, _STAGE_END)
+
+    def finish_docs(doc_states):
+        # 同一窗口内完成的文档一起做后处理，后置ocr按语言跨文档合并推理
+        finalize_middle_json_list(
+            [doc_state['middle_json'] for doc_state in doc_states],
+            [doc_state['lang'] for doc_state in doc_states],
+        )
+        for doc_state in doc_states:
+            with pdfium_lock:
+                open_docs.pop(doc_state['pdf_idx'], None)
+                doc_state['pdf_doc'].close()
+            on_doc_ready(doc_state['pdf_idx'], doc_state['model_list'], doc_state['middle_json'], doc_state['ocr_enable'])
+
+    def middle_json_stage():
+        try:
+            while True:
+                item = get_item(middle_json_queue)
+                if item is _STAGE_END:
+                    break
+                window, batch_results = item
+
+                middle_json_start = time.time()
+                result_iter = iter(batch_results)
+                doc_tasks = []
+                for doc_state, page_idx, image_dict in window:
+                    if page_idx is None:
+                        continue
+                    pil_img = image_dict['img_pil']
+                    page_info_dict = {'page_no': page_idx, 'width': pil_img.width, 'height': pil_img.height}
+                    page_dict = {'layout_dets': next(result_iter), 'page_info': page_info_dict}
+                    # middle_json构造过程会修改模型结果，model_list保留一份原始副本用于输出
+                    doc_state['model_list'].append(copy.deepcopy(page_dict))
+                    if not doc_tasks or doc_tasks[-1][0] is not doc_state:
+                        doc_tasks.append((doc_state, []))
+                    doc_tasks[-1][1].append((page_idx, page_dict, image_dict))
+                # 窗口内各文档的页面处理，MINERU_MIDDLE_JSON_WORKERS大于1时分给多进程并行执行
+                prepared_pages = prepare_pages([
+                    (
+                        doc_state['pdf_bytes'], doc_state['pdf_doc'], image_writer_list[doc_state['pdf_idx']],
+                        doc_state['ocr_enable'], page_tasks
+                    )
+                    for doc_state, page_tasks in doc_tasks
+                ], formula_enabled=p_formula_enable)
+
+                # 整个窗口的页面一起做阅读顺序排序，layoutreader跨页批量推理
+                page_info_iter = iter(sort_prepared_pages(prepared_pages))
+                finished_docs = []
+                for doc_state, page_idx, image_dict in window:
+                    if page_idx is None:
+                        finished_docs.append(doc_state)
+                        continue
+                    doc_state['middle_json']['pdf_info'].append(next(page_info_iter))
+                    if on_page_ready is not None:
+                        on_page_ready(doc_state['pdf_idx'], page_idx)
+                    if page_idx == doc_state['page_count'] - 1:
+                        finished_docs.append(doc_state)
+                if finished_docs:
+                    finish_docs(finished_docs)
+                stage_timings['middle_json'] += time.time() - middle_json_start
+
+                # 释放当前窗口的页面图像，并归还窗口配额
+                del window, batch_results, item
+                window_slots.release()
+        except Exception as e:
+            stage_errors.append(e)
+            stop_event.set()
+
+    render_thread = threading.Thread(target=render_stage, name='mineru-render', daemon=True)
+    middle_json_thread = threading.Thread(target=middle_json_stage, name='mineru-middle-json', daemon=True)
+    render_thread.start()
+    middle_json_thread.start()
+
+    # 模型推理阶段在调用线程中执行
+    analyze = get_analyze_func()
+    try:
+        processed_images_count = 0
+        window_index = 0
+        while True:
+            window = get_item(render_queue)
+            if window is _STAGE_END:
+                break
+
+            images_with_extra_info = [
+                (image_dict['img_pil'], doc_state['ocr_enable'], doc_state['lang'])
+                for doc_state, page_idx, image_dict in window if page_idx is not None
+            ]
+            window_index += 1
+            processed_images_count += len(images_with_extra_info)
+            logger.info(f'Window {window_index}: {processed_images_count} pages rendered and analyzed')
+
+            infer_start = time.time()
+            batch_results = []
+            if images_with_extra_info:
+                batch_results = analyze(images_with_extra_info, formula_enable, table_enable)
+            stage_timings['infer'] += time.time() - infer_start
+
+            del images_with_extra_info
+            if not put_item(middle_json_queue, (window, batch_results)):
+                break
+            del window, batch_results
+    except BaseException:
+        stop_event.set()
+        raise
+    finally:
+        put_item(middle_json_queue, _STAGE_END)
+        render_thread.join()
+        middle_json_thread.join()
+        with pdfium_lock:
+            for pdf_doc in open_docs.values():
+                pdf_doc.close()
+            open_docs.clear()
+
+    if stage_errors:
+        raise stage_errors[0]
+
+    logger.info(
+        f"pipeline stage timings: render {round(stage_timings['render'], 2)}s, "
+        f"infer {round(stage_timings['infer'], 2)}s, "
+        f"middle_json {round(stage_timings['middle_json'], 2)}s"
+    )
+    return stage_timings
+
+
+def get_analyze_func():
+    """
+    返回页面推理函数：配置了模型服务时由模型服务进程推理，启用调度器时与其他并发请求的页面合并推理，
+    否则在当前进程中直接推理。
+    """
+    model_client = get_model_server_client()
+    if model_client is not None:
+        return model_client.analyze
+    batch_scheduler = get_batch_scheduler()
+    if batch_scheduler is not None:
+        return batch_scheduler.analyze
+    return cached_batch_image_analyze
+
+
+def cached_batch_image_analyze(
+        images_with_extra_info: List[Tuple[Image.Image, bool, str]],
+        formula_enable=True,
+        table_enable=True):
+    """
+    带页面级缓存的batch_image_analyze，只对缓存中没有的页面执行推理。
+    缓存通过环境变量MINERU_PAGE_CACHE_DIR启用，key由页面位图hash和模型/配置指纹组成，
+    同一文档以不同页码范围重复解析时，已经推理过的页面可以直接复用。
+    """
+    page_cache = get_page_cache()
+    if page_cache is None:
+        return batch_image_analyze(images_with_extra_info, formula_enable, table_enable)
+
+    model_fingerprint = get_page_model_fingerprint(formula_enable, table_enable)
+    page_keys = [
+        make_page_cache_key(pil_img, ocr_enable, lang, model_fingerprint)
+        for pil_img, ocr_enable, lang in images_with_extra_info
+    ]
+    results = [page_cache.get(page_key) for page_key in page_keys]
+    miss_indices = [idx for idx, result in enumerate(results) if result is None]
+    logger.info(f'page cache: {len(results) - len(miss_indices)}/{len(results)} pages hit')
+
+    if miss_indices:
+        miss_results = batch_image_analyze(
+            [images_with_extra_info[idx] for idx in miss_indices], formula_enable, table_enable
+        )
+        for idx, result in zip(miss_indices, miss_results):
+            page_cache.put(page_keys[idx], result)
+            results[idx] = result
+
+    return results
+
+
 def batch_image_analyze(
         images_with_extra_info: List[Tuple[Image.Image, bool, str]],
         formula_enable=True,
@@ -198,8 +513,9 @@ def batch_image_analyze(
     else:
         enable_ocr_det_batch = True
 
-    batch_model = BatchAnalyze(model_manager, batch_ratio, formula_enable, table_enable, enable_ocr_det_batch)
-    results = batch_model(images_with_extra_info)
+    with model_inference_lock:
+        batch_model = BatchAnalyze(model_manager, batch_ratio, formula_enable, table_enable, enable_ocr_det_batch)
+        results = batch_model(images_with_extra_info)
 
     clean_memory(get_device())
 
@@ -1,20 +1,20 @@
 # Copyright (c) Opendatalab. All rights reserved.
+import asyncio
 import io
 import json
 import os
-import copy
+import time
 from pathlib import Path
 
 import pypdfium2 as pdfium
 from loguru import logger
 
-from mineru.data.data_reader_writer import FileBasedDataWriter
+from mineru.backend.pipeline.batch_scheduler import batch_scheduler_enabled
+from mineru.data.data_reader_writer import FileBasedDataWriter, MemoryDataWriter
 from mineru.utils.draw_bbox import draw_layout_bbox, draw_span_bbox, draw_line_sort_bbox
 from mineru.utils.enum_class import MakeMode
 from mineru.utils.pdf_image_tools import images_bytes_to_pdf_bytes
-from mineru.backend.vlm.vlm_middle_json_mkcontent import union_make as vlm_union_make
-from mineru.backend.vlm.vlm_analyze import doc_analyze as vlm_doc_analyze
-from mineru.backend.vlm.vlm_analyze import aio_doc_analyze as aio_vlm_doc_analyze
+from mineru.utils.result_cache import get_result_cache, make_result_cache_key, log_result_cache_stats
 
 pdf_suffixes = [".pdf"]
 image_suffixes = [".png", ".jpeg", ".jpg", ".webp", ".gif"]
@@ -25,12 +25,17 @@ def read_fn(path):
         path = Path(path)
     with open(str(path), "rb") as input_file:
         file_bytes = input_file.read()
-        if path.suffix in image_suffixes:
-            return images_bytes_to_pdf_bytes(file_bytes)
-        elif path.suffix in pdf_suffixes:
-            return file_bytes
-        else:
-            raise Exception(f"Unknown file suffix: {path.suffix}")
+    return file_bytes_to_pdf_bytes(file_bytes, path.suffix)
+
+
+def file_bytes_to_pdf_bytes(file_bytes, file_suffix):
+    """将上传等场景下已读入内存的文件内容转换为pdf bytes，图片会被转换为单页pdf"""
+    if file_suffix in image_suffixes:
+        return images_bytes_to_pdf_bytes(file_bytes)
+    elif file_suffix in pdf_suffixes:
+        return file_bytes
+    else:
+        raise Exception(f"Unknown file suffix: {file_suffix}")
 
 
 def prepare_env(output_dir, pdf_file_name, parse_method):
@@ -41,6 +46,16 @@ def prepare_env(output_dir, pdf_file_name, parse_method):
     return local_image_dir, local_md_dir
 
 
+def _prepare_writers(output_dir, pdf_file_name, parse_method):
+    """output_dir为None时不落盘，所有输出写入内存"""
+    if output_dir is None:
+        local_md_dir = os.path.join(pdf_file_name, parse_method)
+        local_image_dir = os.path.join(local_md_dir, "images")
+        return local_image_dir, local_md_dir, MemoryDataWriter(), MemoryDataWriter()
+    local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
+    return local_image_dir, local_md_dir, FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+
+
 def convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id=0, end_page_id=None):
 
     # 从字节数据加载PDF
@@ -100,16 +115,23 @@ def _process_output(
         f_make_md_mode,
         middle_json,
         model_output=None,
-        is_pipeline=True
+        is_pipeline=True,
+        cache_key=None,
+        image_writer=None,
+        results=None,
 ):
     f_draw_line_sort_bbox = False
-    from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make as pipeline_union_make
+    # 后端模块按需导入，只使用pipeline后端时不加载vlm相关依赖
+    if is_pipeline:
+        from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make as make_func
+    else:
+        from mineru.backend.vlm.vlm_middle_json_mkcontent import union_make as make_func
     """处理输出文件"""
     if f_draw_layout_bbox:
-        draw_layout_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_layout.pdf")
+        draw_layout_bbox(pdf_info, pdf_bytes, md_writer, f"{pdf_file_name}_layout.pdf")
 
     if f_draw_span_bbox:
-        draw_span_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_span.pdf")
+        draw_span_bbox(pdf_info, pdf_bytes, md_writer, f"{pdf_file_name}_span.pdf")
 
     if f_dump_orig_pdf:
         md_writer.write(
@@ -118,21 +140,22 @@ def _process_output(
         )
 
     if f_draw_line_sort_bbox:
-        draw_line_sort_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_line_sort.pdf")
+        draw_line_sort_bbox(pdf_info, pdf_bytes, md_writer, f"{pdf_file_name}_line_sort.pdf")
 
     image_dir = str(os.path.basename(local_image_dir))
+    result = {"middle_json": middle_json, "model_output": model_output}
 
     if f_dump_md:
-        make_func = pipeline_union_make if is_pipeline else vlm_union_make
         md_content_str = make_func(pdf_info, f_make_md_mode, image_dir)
+        result["md_content"] = md_content_str
         md_writer.write_string(
             f"{pdf_file_name}.md",
             md_content_str,
         )
 
     if f_dump_content_list:
-        make_func = pipeline_union_make if is_pipeline else vlm_union_make
         content_list = make_func(pdf_info, MakeMode.CONTENT_LIST, image_dir)
+        result["content_list"] = content_list
         md_writer.write_string(
             f"{pdf_file_name}_content_list.json",
             json.dumps(content_list, ensure_ascii=False, indent=4),
@@ -157,7 +180,96 @@ def _process_output(
                 output_text,
             )
 
-    logger.info(f"local output dir is {local_md_dir}")
+    if cache_key is not None:
+        _store_result_cache(cache_key, middle_json, model_output, local_image_dir, image_writer)
+
+    if isinstance(md_writer, MemoryDataWriter):
+        # 内存输出：图片和版面/span调试pdf等文件直接随结果返回
+        result["images"] = image_writer.files if image_writer is not None else {}
+        result["pdf_bytes"] = pdf_bytes
+        result["files"] = md_writer.files
+        if results is not None:
+            results[pdf_file_name] = result
+        logger.info(f"{pdf_file_name} output kept in memory")
+    else:
+        logger.info(f"local output dir is {local_md_dir}")
+
+
+def _store_result_cache(cache_key, middle_json, model_output, local_image_dir, image_writer=None):
+    """将解析结果和提取出的图片写入结果缓存"""
+    result_cache = get_result_cache()
+    if result_cache is None:
+        return
+    if isinstance(image_writer, MemoryDataWriter):
+        images = dict(image_writer.files)
+    else:
+        images = {}
+        for image_name in os.listdir(local_image_dir):
+            image_path = os.path.join(local_image_dir, image_name)
+            if os.path.isfile(image_path):
+                with open(image_path, "rb") as f:
+                    images[image_name] = f.read()
+    try:
+        result_cache.put(cache_key, middle_json, model_output, images)
+    except Exception as e:
+        logger.warning(f"Failed to store result cache: {e}")
+
+
+def _restore_cached_results(
+        result_cache,
+        cache_keys,
+        output_dir,
+        pdf_file_names,
+        pdf_bytes_list,
+        p_lang_list,
+        backend,
+        parse_method,
+        f_draw_layout_bbox,
+        f_draw_span_bbox,
+        f_dump_md,
+        f_dump_middle_json,
+        f_dump_model_output,
+        f_dump_orig_pdf,
+        f_dump_content_list,
+        f_make_md_mode,
+        results=None,
+):
+    """命中结果缓存的文档直接输出，返回未命中的文档列表"""
+    is_pipeline = backend == "pipeline"
+    if not is_pipeline:
+        parse_method = "vlm"
+        f_draw_span_bbox = False
+
+    restore_start = time.time()
+    miss_indices = []
+    for idx, cache_key in enumerate(cache_keys):
+        cached_result = result_cache.get(cache_key)
+        if cached_result is None:
+            miss_indices.append(idx)
+            continue
+
+        pdf_file_name = pdf_file_names[idx]
+        local_image_dir, local_md_dir, image_writer, md_writer = _prepare_writers(output_dir, pdf_file_name, parse_method)
+        for image_name, image_bytes in cached_result["images"].items():
+            image_writer.write(image_name, image_bytes)
+
+        middle_json = cached_result["middle_json"]
+        _process_output(
+            middle_json["pdf_info"], pdf_bytes_list[idx], pdf_file_name, local_md_dir, local_image_dir,
+            md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
+            f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
+            f_make_md_mode, middle_json, cached_result["model_output"], is_pipeline=is_pipeline,
+            image_writer=image_writer, results=results,
+        )
+
+    log_result_cache_stats(result_cache, restore_start, len(cache_keys) - len(miss_indices), len(cache_keys))
+
+    return (
+        [pdf_file_names[idx] for idx in miss_indices],
+        [pdf_bytes_list[idx] for idx in miss_indices],
+        [p_lang_list[idx] for idx in miss_indices],
+        [cache_keys[idx] for idx in miss_indices],
+    )
 
 
 def _process_pipeline(
@@ -176,33 +288,23 @@ def _process_pipeline(
         f_dump_orig_pdf,
         f_dump_content_list,
         f_make_md_mode,
+        cache_keys=None,
+        progress_callback=None,
+        results=None,
 ):
     """处理pipeline后端逻辑"""
-    from mineru.backend.pipeline.model_json_to_middle_json import result_to_middle_json as pipeline_result_to_middle_json
-    from mineru.backend.pipeline.pipeline_analyze import doc_analyze as pipeline_doc_analyze
+    from mineru.backend.pipeline.pipeline_analyze import doc_analyze_streaming as pipeline_doc_analyze_streaming
 
-    infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list = (
-        pipeline_doc_analyze(
-            pdf_bytes_list, p_lang_list, parse_method=parse_method,
-            formula_enable=p_formula_enable, table_enable=p_table_enable
-        )
-    )
+    image_writer_list = []
+    md_env_list = []
+    for pdf_file_name in pdf_file_names:
+        local_image_dir, local_md_dir, image_writer, md_writer = _prepare_writers(output_dir, pdf_file_name, parse_method)
+        image_writer_list.append(image_writer)
+        md_env_list.append((local_image_dir, local_md_dir, md_writer))
 
-    for idx, model_list in enumerate(infer_results):
-        model_json = copy.deepcopy(model_list)
+    def on_doc_ready(idx, model_list, middle_json, ocr_enable):
         pdf_file_name = pdf_file_names[idx]
-        local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
-        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
-
-        images_list = all_image_lists[idx]
-        pdf_doc = all_pdf_docs[idx]
-        _lang = lang_list[idx]
-        _ocr_enable = ocr_enabled_list[idx]
-
-        middle_json = pipeline_result_to_middle_json(
-            model_list, images_list, pdf_doc, image_writer,
-            _lang, _ocr_enable, p_formula_enable
-        )
+        local_image_dir, local_md_dir, md_writer = md_env_list[idx]
 
         pdf_info = middle_json["pdf_info"]
         pdf_bytes = pdf_bytes_list[idx]
@@ -211,9 +313,21 @@ def _process_pipeline(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, model_json, is_pipeline=True
+            f_make_md_mode, middle_json, model_list, is_pipeline=True,
+            cache_key=cache_keys[idx] if cache_keys is not None else None,
+            image_writer=image_writer_list[idx], results=results,
         )
 
+    def on_page_ready(idx, page_idx):
+        progress_callback(pdf_file_names[idx], page_idx)
+
+    # 流式处理：按窗口渲染、推理并构造middle_json，每个文档完成后立即输出
+    pipeline_doc_analyze_streaming(
+        pdf_bytes_list, image_writer_list, p_lang_list, on_doc_ready,
+        parse_method=parse_method, formula_enable=p_formula_enable, table_enable=p_table_enable,
+        on_page_ready=on_page_ready if progress_callback is not None else None,
+    )
+
 
 async def _async_process_vlm(
         output_dir,
@@ -229,9 +343,14 @@ async def _async_process_vlm(
         f_dump_content_list,
         f_make_md_mode,
         server_url=None,
+        cache_keys=None,
+        progress_callback=None,
+        results=None,
         **kwargs,
 ):
     """异步处理VLM后端逻辑"""
+    from mineru.backend.vlm.vlm_analyze import aio_doc_analyze as aio_vlm_doc_analyze
+
     parse_method = "vlm"
     f_draw_span_bbox = False
     if not backend.endswith("client"):
@@ -239,20 +358,24 @@ async def _async_process_vlm(
 
     for idx, pdf_bytes in enumerate(pdf_bytes_list):
         pdf_file_name = pdf_file_names[idx]
-        local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
-        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+        local_image_dir, local_md_dir, image_writer, md_writer = _prepare_writers(output_dir, pdf_file_name, parse_method)
 
         middle_json, infer_result = await aio_vlm_doc_analyze(
             pdf_bytes, image_writer=image_writer, backend=backend, server_url=server_url, **kwargs,
         )
 
         pdf_info = middle_json["pdf_info"]
+        if progress_callback is not None:
+            for page_info in pdf_info:
+                progress_callback(pdf_file_name, page_info["page_idx"])
 
         _process_output(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, infer_result, is_pipeline=False
+            f_make_md_mode, middle_json, infer_result, is_pipeline=False,
+            cache_key=cache_keys[idx] if cache_keys is not None else None,
+            image_writer=image_writer, results=results,
         )
 
 
@@ -270,9 +393,14 @@ def _process_vlm(
         f_dump_content_list,
         f_make_md_mode,
         server_url=None,
+        cache_keys=None,
+        progress_callback=None,
+        results=None,
         **kwargs,
 ):
     """同步处理VLM后端逻辑"""
+    from mineru.backend.vlm.vlm_analyze import doc_analyze as vlm_doc_analyze
+
     parse_method = "vlm"
     f_draw_span_bbox = False
     if not backend.endswith("client"):
@@ -280,20 +408,24 @@ def _process_vlm(
 
     for idx, pdf_bytes in enumerate(pdf_bytes_list):
         pdf_file_name = pdf_file_names[idx]
-        local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
-        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+        local_image_dir, local_md_dir, image_writer, md_writer = _prepare_writers(output_dir, pdf_file_name, parse_method)
 
         middle_json, infer_result = vlm_doc_analyze(
             pdf_bytes, image_writer=image_writer, backend=backend, server_url=server_url, **kwargs,
         )
 
         pdf_info = middle_json["pdf_info"]
+        if progress_callback is not None:
+            for page_info in pdf_info:
+                progress_callback(pdf_file_name, page_info["page_idx"])
 
         _process_output(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, infer_result, is_pipeline=False
+            f_make_md_mode, middle_json, infer_result, is_pipeline=False,
+            cache_key=cache_keys[idx] if cache_keys is not None else None,
+            image_writer=image_writer, results=results,
         )
 
 
@@ -317,17 +449,42 @@ def do_parse(
         f_make_md_mode=MakeMode.MM_MD,
         start_page_id=0,
         end_page_id=None,
+        progress_callback=None,
         **kwargs,
 ):
+    # output_dir为None时结果不落盘，以 {pdf_file_name: 结果} 的形式返回
+    results = {} if output_dir is None else None
+
+    result_cache = get_result_cache()
+    cache_keys = None
+    if result_cache is not None:
+        cache_keys = [
+            make_result_cache_key(
+                pdf_bytes, backend, parse_method, p_lang_list[idx], formula_enable, table_enable,
+                start_page_id, end_page_id, server_url=server_url, **kwargs
+            )
+            for idx, pdf_bytes in enumerate(pdf_bytes_list)
+        ]
+
     # 预处理PDF字节数据
     pdf_bytes_list = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
 
+    if result_cache is not None:
+        pdf_file_names, pdf_bytes_list, p_lang_list, cache_keys = _restore_cached_results(
+            result_cache, cache_keys, output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
+            backend, parse_method, f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode, results
+        )
+        if len(pdf_file_names) == 0:
+            return results
+
     if backend == "pipeline":
         _process_pipeline(
             output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
             parse_method, formula_enable, table_enable,
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+            cache_keys, progress_callback, results
         )
     else:
         if backend.startswith("vlm-"):
@@ -340,9 +497,11 @@ def do_parse(
             output_dir, pdf_file_names, pdf_bytes_list, backend,
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
             f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
-            server_url, **kwargs,
+            server_url, cache_keys=cache_keys, progress_callback=progress_callback, results=results, **kwargs,
         )
 
+    return results
+
 
 async def aio_do_parse(
         output_dir,
@@ -364,19 +523,49 @@ async def aio_do_parse(
         f_make_md_mode=MakeMode.MM_MD,
         start_page_id=0,
         end_page_id=None,
+        progress_callback=None,
         **kwargs,
 ):
+    # output_dir为None时结果不落盘，以 {pdf_file_name: 结果} 的形式返回
+    results = {} if output_dir is None else None
+
+    result_cache = get_result_cache()
+    cache_keys = None
+    if result_cache is not None:
+        cache_keys = [
+            make_result_cache_key(
+                pdf_bytes, backend, parse_method, p_lang_list[idx], formula_enable, table_enable,
+                start_page_id, end_page_id, server_url=server_url, **kwargs
+            )
+            for idx, pdf_bytes in enumerate(pdf_bytes_list)
+        ]
+
     # 预处理PDF字节数据
     pdf_bytes_list = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
 
+    if result_cache is not None:
+        pdf_file_names, pdf_bytes_list, p_lang_list, cache_keys = _restore_cached_results(
+            result_cache, cache_keys, output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
+            backend, parse_method, f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode, results
+        )
+        if len(pdf_file_names) == 0:
+            return results
+
     if backend == "pipeline":
-        # pipeline模式暂不支持异步，使用同步处理方式
-        _process_pipeline(
+        pipeline_args = (
             output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
             parse_method, formula_enable, table_enable,
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+            cache_keys, progress_callback, results
         )
+        if batch_scheduler_enabled():
+            # 调度器在单独的线程中串行执行推理，各请求放到线程池中处理，使并发请求的页面可以合并成batch
+            await asyncio.to_thread(_process_pipeline, *pipeline_args)
+        else:
+            # pipeline模式暂不支持异步，使用同步处理方式
+            _process_pipeline(*pipeline_args)
     else:
         if backend.startswith("vlm-"):
             backend = backend[4:]
@@ -388,9 +577,11 @@ async def aio_do_parse(
             output_dir, pdf_file_names, pdf_bytes_list, backend,
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
             f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
-            server_url, **kwargs,
+            server_url, cache_keys=cache_keys, progress_callback=progress_callback, results=results, **kwargs,
         )
 
+    return results
+
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import uuid
 import os
 import re
+import signal
 import tempfile
 import asyncio
 import uvicorn
@@ -16,8 +17,10 @@ from typing import List, Optional
 from loguru import logger
 from base64 import b64encode
 
+from mineru.backend.pipeline.model_warmup import get_preload_langs, warmup_models
 from mineru.cli.common import aio_do_parse, read_fn, pdf_suffixes, image_suffixes
 from mineru.utils.cli_parser import arg_parse
+from mineru.utils.config_reader import reload_config
 from mineru.version import __version__
 
 app = FastAPI()
@@ -256,7 +259,12 @@ async def parse_pdf(
 @click.option('--host', default='127.0.0.1', help='Server host (default: 127.0.0.1)')
 @click.option('--port', default=8000, type=int, help='Server port (default: 8000)')
 @click.option('--reload', is_flag=True, help='Enable auto-reload (development mode)')
-def main(ctx, host, port, reload, **kwargs):
+@click.option(
+    '--preload-langs',
+    default=None,
+    help='Comma separated languages to preload and warm up pipeline models for before accepting requests, e.g. ch,en (default: $MINERU_PRELOAD_LANGS, no preload if unset)',
+)
+def main(ctx, host, port, reload, preload_langs, **kwargs):
 
     kwargs.update(arg_parse(ctx))
 
@@ -271,6 +279,15 @@ def main(ctx, host, port, reload, **kwargs):
     print(f"- Swagger UI: http://{host}:{port}/docs")
     print(f"- ReDoc: http://{host}:{port}/redoc")
 
+    # mineru.json修改后会在mtime检查时自动生效，也可以发送SIGHUP立即重新读取
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload_config())
+
+    # 模型预热完成后才开始监听端口，服务可访问即代表模型已就绪
+    preload_langs = get_preload_langs(preload_langs)
+    if preload_langs and not reload:
+        warmup_models(preload_langs)
+
     uvicorn.run(
         "mineru.cli.fast_api:app",
         host=host,
@@ -0,0 +1,38 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+
+import click
+
+from mineru.backend.pipeline.model_server import ModelServer, MODEL_SERVER_ADDRESS_ENV, get_default_model_server_address
+from mineru.backend.pipeline.model_warmup import get_preload_langs, warmup_models
+
+
+@click.command()
+@click.option(
+    '--address',
+    default=lambda: os.getenv(MODEL_SERVER_ADDRESS_ENV) or get_default_model_server_address(),
+    help='Unix socket path the model server listens on (default: $MINERU_MODEL_SERVER_ADDRESS or '
+         'model-server.sock in $XDG_RUNTIME_DIR/mineru, falling back to a per-user 0700 directory under the temp dir)',
+)
+@click.option('--max-batch-size', type=int, default=None, help='Max pages merged into one inference batch (default: $MINERU_MIN_BATCH_INFERENCE_SIZE or 384)')
+@click.option('--max-wait-ms', type=float, default=None, help='Max time a request waits for a batch to fill (default: $MINERU_BATCH_SCHEDULER_MAX_WAIT_MS or 50)')
+@click.option(
+    '--preload-langs',
+    default=None,
+    help='Comma separated languages to preload and warm up models for before listening, e.g. ch,en (default: $MINERU_PRELOAD_LANGS, no preload if unset)',
+)
+def main(address, max_batch_size, max_wait_ms, preload_langs):
+    """启动本地模型服务，web worker设置 MINERU_MODEL_SERVER_ADDRESS 为相同的socket路径后共享本进程加载的模型"""
+    print(f"Start MinerU model server: {address}")
+    print(f"Set {MODEL_SERVER_ADDRESS_ENV}={address} for the api/gradio workers to use it")
+    server = ModelServer(address, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    # 服务进程自身不作为客户端，预热前先移除地址环境变量，预热完成后socket才会创建
+    os.environ.pop(MODEL_SERVER_ADDRESS_ENV, None)
+    preload_langs = get_preload_langs(preload_langs)
+    if preload_langs:
+        warmup_models(preload_langs)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
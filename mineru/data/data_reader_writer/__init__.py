@@ -1,8 +1,23 @@
 from .base import DataReader, DataWriter
 from .dummy import DummyDataWriter
 from .filebase import FileBasedDataReader, FileBasedDataWriter
-from .multi_bucket_s3 import MultiBucketS3DataReader, MultiBucketS3DataWriter
-from .s3 import S3DataReader, S3DataWriter
+from .memory import MemoryDataWriter
+
+# s3相关的类依赖boto3，导入开销较大，首次访问时再导入
+_LAZY_IMPORTS = {
+    "MultiBucketS3DataReader": ".multi_bucket_s3",
+    "MultiBucketS3DataWriter": ".multi_bucket_s3",
+    "S3DataReader": ".s3",
+    "S3DataWriter": ".s3",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "DataReader",
@@ -14,4 +29,5 @@ __all__ = [
     "MultiBucketS3DataReader",
     "MultiBucketS3DataWriter",
     "DummyDataWriter",
+    "MemoryDataWriter",
 ]
@@ -0,0 +1,33 @@
+from .base import DataReader, DataWriter
+
+
+class MemoryDataWriter(DataWriter, DataReader):
+    def __init__(self) -> None:
+        """Keep the written files in memory instead of writing them to
+        disk."""
+        self.files = {}
+
+    def write(self, path: str, data: bytes) -> None:
+        """Keep data in memory under path.
+
+        Args:
+            path (str): the path of file, used as the key of files
+            data (bytes): the data want to write
+        """
+        self.files[path] = data
+
+    def read_at(self, path: str, offset: int = 0, limit: int = -1) -> bytes:
+        """Read the data written under path at offset and limit.
+
+        Args:
+            path (str): the path of file
+            offset (int, optional): the number of bytes skipped. Defaults to 0.
+            limit (int, optional): the length of bytes want to read. Defaults to -1.
+
+        Returns:
+            bytes: the content of file
+        """
+        data = self.files[path]
+        if limit == -1:
+            return data[offset:]
+        return data[offset:offset + limit]
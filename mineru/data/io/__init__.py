@@ -1,6 +1,20 @@
 
 from .base import IOReader, IOWriter
-from .http import HttpReader, HttpWriter
-from .s3 import S3Reader, S3Writer
 
-__all__ = ['IOReader', 'IOWriter', 'HttpReader', 'HttpWriter', 'S3Reader', 'S3Writer']
\ No newline at end of file
+# http和s3的实现分别依赖requests和boto3，首次访问时再导入
+_LAZY_IMPORTS = {
+    'HttpReader': '.http',
+    'HttpWriter': '.http',
+    'S3Reader': '.s3',
+    'S3Writer': '.s3',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['IOReader', 'IOWriter', 'HttpReader', 'HttpWriter', 'S3Reader', 'S3Writer']
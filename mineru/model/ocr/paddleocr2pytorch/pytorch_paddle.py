@@ -90,6 +90,8 @@ class PytorchPaddleOCR(TextSystem):
         kwargs['rec_model_path'] = rec_model_path
         kwargs['rec_char_dict_path'] = os.path.join(root_dir, 'pytorchocr', 'utils', 'resources', 'dict', dict_file)
         kwargs['rec_batch_num'] = 8
+        # 大于0时rec按像素预算动态组batch，rec_batch_num不再生效
+        kwargs['rec_batch_pixels'] = int(os.getenv('MINERU_OCR_REC_BATCH_PIXELS', 0))
 
         kwargs['device'] = device
 
@@ -6,12 +6,33 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import cv2
 import torch
 from shapely.geometry import Polygon
 import pyclipper
 
+_postprocess_executor = None
+_postprocess_executor_lock = threading.Lock()
+
+
+def get_db_postprocess_workers():
+    """batch内各图像轮廓转检测框的线程数，findContours等OpenCV调用会释放GIL"""
+    return int(os.getenv('MINERU_OCR_DET_POSTPROCESS_WORKERS', min(os.cpu_count() or 1, 4)))
+
+
+def _get_postprocess_executor():
+    global _postprocess_executor
+    with _postprocess_executor_lock:
+        if _postprocess_executor is None:
+            _postprocess_executor = ThreadPoolExecutor(max_workers=get_db_postprocess_workers())
+        return _postprocess_executor
+
 
 class DBPostProcess(object):
     """
@@ -45,10 +66,13 @@ class DBPostProcess(object):
                 whose values are binarized as {0, 1}
         '''
 
-        bitmap = _bitmap
+        return self._boxes_from_bitmap(pred, (_bitmap * 255).astype(np.uint8), dest_width, dest_height)
+
+    def _boxes_from_bitmap(self, pred, bitmap, dest_width, dest_height):
+        """bitmap为取值{0, 255}的uint8单张二值图"""
         height, width = bitmap.shape
 
-        outs = cv2.findContours((bitmap * 255).astype(np.uint8), cv2.RETR_LIST,
+        outs = cv2.findContours(bitmap, cv2.RETR_LIST,
                                 cv2.CHAIN_APPROX_SIMPLE)
         if len(outs) == 3:
             img, contours, _ = outs[0], outs[1], outs[2]
@@ -124,10 +148,11 @@ class DBPostProcess(object):
         '''
         h, w = bitmap.shape[:2]
         box = _box.copy()
-        xmin = np.clip(np.floor(box[:, 0].min()).astype(np.int if 'int' in np.__dict__ else np.int32), 0, w - 1)
-        xmax = np.clip(np.ceil(box[:, 0].max()).astype(np.int if 'int' in np.__dict__ else np.int32), 0, w - 1)
-        ymin = np.clip(np.floor(box[:, 1].min()).astype(np.int if 'int' in np.__dict__ else np.int32), 0, h - 1)
-        ymax = np.clip(np.ceil(box[:, 1].max()).astype(np.int if 'int' in np.__dict__ else np.int32), 0, h - 1)
+        # 标量裁剪用python内置运算，避免每个box多次调用np.clip的开销
+        xmin = min(max(math.floor(box[:, 0].min()), 0), w - 1)
+        xmax = min(max(math.ceil(box[:, 0].max()), 0), w - 1)
+        ymin = min(max(math.floor(box[:, 1].min()), 0), h - 1)
+        ymax = min(max(math.ceil(box[:, 1].max()), 0), h - 1)
 
         mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
         box[:, 0] = box[:, 0] - xmin
@@ -156,24 +181,39 @@ class DBPostProcess(object):
         cv2.fillPoly(mask, contour.reshape(1, -1, 2).astype(np.int32), 1)
         return cv2.mean(bitmap[ymin:ymax + 1, xmin:xmax + 1], mask)[0]
 
+    def dilate_batch(self, segmentation):
+        '''
+        dilate_batch: 在整个batch的二值图上做膨胀，结果与逐张cv2.dilate一致(锚点为kernel中心，边界外视为0)
+        '''
+        kernel_h, kernel_w = self.dilation_kernel.shape
+        anchor_y, anchor_x = kernel_h // 2, kernel_w // 2
+        height, width = segmentation.shape[1:]
+        dilated = np.zeros_like(segmentation)
+        for ky, kx in zip(*np.nonzero(self.dilation_kernel)):
+            # dst(y, x) |= src(y + dy, x + dx)
+            dy, dx = ky - anchor_y, kx - anchor_x
+            dilated[:, max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)] |= \
+                segmentation[:, max(dy, 0):height - max(-dy, 0), max(dx, 0):width - max(-dx, 0)]
+        return dilated
+
     def __call__(self, outs_dict, shape_list):
         pred = outs_dict['maps']
         if isinstance(pred, torch.Tensor):
             pred = pred.cpu().numpy()
         pred = pred[:, 0, :, :]
+        # 二值化和膨胀在整个batch上一次完成
         segmentation = pred > self.thresh
+        if self.dilation_kernel is not None:
+            segmentation = self.dilate_batch(segmentation)
+        bitmaps = segmentation.view(np.uint8) * np.uint8(255)
 
-        boxes_batch = []
-        for batch_index in range(pred.shape[0]):
+        def boxes_from_batch_index(batch_index):
             src_h, src_w, ratio_h, ratio_w = shape_list[batch_index]
-            if self.dilation_kernel is not None:
-                mask = cv2.dilate(
-                    np.array(segmentation[batch_index]).astype(np.uint8),
-                    self.dilation_kernel)
-            else:
-                mask = segmentation[batch_index]
-            boxes, scores = self.boxes_from_bitmap(pred[batch_index], mask,
-                                                   src_w, src_h)
-
-            boxes_batch.append({'points': boxes})
-        return boxes_batch
\ No newline at end of file
+            boxes, scores = self._boxes_from_bitmap(pred[batch_index], bitmaps[batch_index],
+                                                    src_w, src_h)
+            return {'points': boxes}
+
+        # 各图像的轮廓提取和转检测框相互独立，batch内有多张图像时分发到线程池
+        if pred.shape[0] > 1 and get_db_postprocess_workers() > 1:
+            return list(_get_postprocess_executor().map(boxes_from_batch_index, range(pred.shape[0])))
+        return [boxes_from_batch_index(batch_index) for batch_index in range(pred.shape[0])]
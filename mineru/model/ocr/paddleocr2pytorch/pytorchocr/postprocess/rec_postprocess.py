@@ -48,6 +48,8 @@ class BaseRecLabelDecode(object):
         for i, char in enumerate(dict_character):
             self.dict[char] = i
         self.character = dict_character
+        # 字符表的数组形式，批量解码时直接用索引数组查表
+        self.character_array = np.array(dict_character, dtype=object)
 
     def pred_reverse(self, pred):
         pred_re = []
@@ -185,12 +187,15 @@ class CTCLabelDecode(BaseRecLabelDecode):
             preds = preds.numpy()
         preds_idx = preds.argmax(axis=2)
         preds_prob = preds.max(axis=2)
-        text = self.decode(
-            preds_idx,
-            preds_prob,
-            is_remove_duplicate=True,
-            return_word_box=return_word_box,
-        )
+        if not return_word_box:
+            text = self.greedy_decode(preds_idx, preds_prob)
+        else:
+            text = self.decode(
+                preds_idx,
+                preds_prob,
+                is_remove_duplicate=True,
+                return_word_box=return_word_box,
+            )
         if return_word_box:
             for rec_idx, rec in enumerate(text):
                 wh_ratio = kwargs["wh_ratio_list"][rec_idx]
@@ -202,6 +207,29 @@ class CTCLabelDecode(BaseRecLabelDecode):
         label = self.decode(label)
         return text, label
 
+    def greedy_decode(self, preds_idx, preds_prob):
+        """
+        批量的CTC贪心解码，去重、去blank和字符查表在整个batch上以数组运算完成，
+        结果与decode(preds_idx, preds_prob, is_remove_duplicate=True)逐字节一致。
+        """
+        keep = np.ones(preds_idx.shape, dtype=bool)
+        keep[:, 1:] = preds_idx[:, 1:] != preds_idx[:, :-1]
+        keep &= ~np.isin(preds_idx, self.get_ignored_tokens())
+        ends = np.cumsum(keep.sum(axis=1)).tolist()
+        chars = self.character_array[preds_idx[keep]].tolist()
+        # 按行压缩后的置信度是连续数组，逐行求均值与原逐行的np.mean(conf_list)累加顺序相同
+        probs = preds_prob[keep]
+        result_list = []
+        beg = 0
+        for end in ends:
+            if end > beg:
+                result_list.append((''.join(chars[beg:end]), np.mean(probs[beg:end])))
+            else:
+                # 与np.mean([])的结果一致，空结果的nan分数由调用方处理
+                result_list.append(('', np.float64(np.nan)))
+            beg = end
+        return result_list
+
     def add_special_char(self, dict_character):
         dict_character = ['blank'] + dict_character
         return dict_character
@@ -2,6 +2,7 @@ from PIL import Image
 import cv2
 import numpy as np
 import math
+import threading
 import time
 import torch
 from tqdm import tqdm
@@ -12,11 +13,18 @@ from ...pytorchocr.postprocess import build_post_process
 
 
 class TextRecognizer(BaseOCRV20):
+    # 这些算法使用各自的预处理或额外输入，只走固定rec_batch_num的batch路径
+    BUDGET_BATCH_UNSUPPORTED_ALGORITHMS = ('SAR', 'SVTR', 'SRN', 'CAN', 'NRTR', 'ViTSTR', 'RFL')
+
     def __init__(self, args, **kwargs):
         self.device = args.device
         self.rec_image_shape = [int(v) for v in args.rec_image_shape.split(",")]
         self.character_type = args.rec_char_type
         self.rec_batch_num = args.rec_batch_num
+        # 大于0时按像素预算(batch数 x 补齐后宽度 x 高度)动态组batch，仅对默认的CTC类算法生效
+        self.rec_batch_pixels = getattr(args, 'rec_batch_pixels', 0)
+        self._rec_buffer = None
+        self._rec_buffer_lock = threading.Lock()
         self.rec_algorithm = args.rec_algorithm
         self.max_text_length = args.max_text_length
         postprocess_params = {
@@ -288,6 +296,99 @@ class TextRecognizer(BaseOCRV20):
 
         return img
 
+    def _rec_padded_width(self, wh_ratio):
+        """与resize_norm_img默认分支一致，计算batch内最大宽高比为wh_ratio时补齐后的宽度"""
+        imgC, imgH, imgW = self.rec_image_shape
+        max_wh_ratio = max(wh_ratio, imgW / imgH)
+        padded_w = int((imgH * max_wh_ratio))
+        return max(min(padded_w, self.limited_max_width), self.limited_min_width)
+
+    def _form_budget_batches(self, sorted_wh_ratios):
+        """
+        在按宽高比升序排列的crop上按像素预算切分batch，返回[(beg, end, padded_w), ...]。
+        batch的补齐宽度由最后一个crop决定，窄crop多的batch容纳更多crop，宽crop的batch则更小；
+        单个crop超出预算时独占一个batch。
+        """
+        imgH = self.rec_image_shape[1]
+        batches = []
+        beg = 0
+        padded_w = 0
+        for i, wh_ratio in enumerate(sorted_wh_ratios):
+            cur_padded_w = self._rec_padded_width(wh_ratio)
+            if i > beg and (i - beg + 1) * cur_padded_w * imgH > self.rec_batch_pixels:
+                batches.append((beg, i, padded_w))
+                beg = i
+            padded_w = cur_padded_w
+        if beg < len(sorted_wh_ratios):
+            batches.append((beg, len(sorted_wh_ratios), padded_w))
+        return batches
+
+    def _get_rec_buffer(self, numel):
+        """获取可复用的输入buffer，cuda设备上使用锁页内存，使host到device的拷贝可以异步进行"""
+        if self._rec_buffer is None or self._rec_buffer.numel() < numel:
+            pin_memory = str(self.device).startswith('cuda') and torch.cuda.is_available()
+            self._rec_buffer = torch.empty(numel, dtype=torch.float32, pin_memory=pin_memory)
+        return self._rec_buffer
+
+    def norm_img_batch_into(self, img_batch, padded_w, out):
+        """
+        将一个batch的crop缩放后直接写入预分配的out(N, C, H, padded_w)，归一化在整个batch上一次完成，
+        结果与逐张调用resize_norm_img后拼接一致。
+        """
+        imgC, imgH, imgW = self.rec_image_shape
+        staging = np.empty((len(img_batch), imgH, padded_w, imgC), dtype=np.uint8)
+        resized_w_list = []
+        for i, img in enumerate(img_batch):
+            assert imgC == img.shape[2]
+            h, w = img.shape[:2]
+            ratio_imgH = max(math.ceil(imgH * (w / float(h))), self.limited_min_width)
+            resized_w = padded_w if ratio_imgH > padded_w else int(ratio_imgH)
+            staging[i, :, :resized_w] = cv2.resize(img, (resized_w, imgH))
+            resized_w_list.append(resized_w)
+        np.divide(staging.transpose((0, 3, 1, 2)), 255, out=out, dtype=np.float32)
+        out -= 0.5
+        out /= 0.5
+        for i, resized_w in enumerate(resized_w_list):
+            out[i, :, :, resized_w:] = 0
+        return out
+
+    def _budget_batch_call(self, img_list, indices, sorted_wh_ratios, tqdm_enable, tqdm_desc):
+        imgC, imgH, imgW = self.rec_image_shape
+        rec_res = [['', 0.0]] * len(img_list)
+        batches = self._form_budget_batches(sorted_wh_ratios)
+        max_numel = max((end - beg) * imgC * imgH * padded_w for beg, end, padded_w in batches)
+        elapse = 0
+        # 输入buffer在多次调用间复用，同一实例被多个线程调用时串行执行
+        with self._rec_buffer_lock, tqdm(total=len(img_list), desc=tqdm_desc, disable=not tqdm_enable) as pbar:
+            buffer = self._get_rec_buffer(max_numel)
+            buffer_np = buffer.numpy()
+            for beg, end, padded_w in batches:
+                batch_shape = (end - beg, imgC, imgH, padded_w)
+                numel = int(np.prod(batch_shape))
+                self.norm_img_batch_into(
+                    [img_list[indices[ino]] for ino in range(beg, end)],
+                    padded_w,
+                    buffer_np[:numel].reshape(batch_shape),
+                )
+
+                starttime = time.time()
+                with torch.no_grad():
+                    # 前向结果拷回cpu时会同步，下一个batch写入buffer前异步拷贝已经完成
+                    inp = buffer[:numel].view(batch_shape).to(self.device, non_blocking=buffer.is_pinned())
+                    prob_out = self.net(inp)
+
+                if isinstance(prob_out, list):
+                    preds = [v.cpu().numpy() for v in prob_out]
+                else:
+                    preds = prob_out.cpu().numpy()
+
+                rec_result = self.postprocess_op(preds)
+                for rno in range(len(rec_result)):
+                    rec_res[indices[beg + rno]] = rec_result[rno]
+                elapse += time.time() - starttime
+                pbar.update(end - beg)
+        return rec_res, elapse
+
     def __call__(self, img_list, tqdm_enable=False, tqdm_desc="OCR-rec Predict"):
         img_num = len(img_list)
         # Calculate the aspect ratio of all text bars
@@ -297,6 +398,11 @@ class TextRecognizer(BaseOCRV20):
         # Sorting can speed up the recognition process
         indices = np.argsort(np.array(width_list))
 
+        if self.rec_batch_pixels > 0 and img_num > 0 and self.rec_algorithm not in self.BUDGET_BATCH_UNSUPPORTED_ALGORITHMS:
+            sorted_wh_ratios = [width_list[i] for i in indices]
+            rec_res, elapse = self._budget_batch_call(img_list, indices, sorted_wh_ratios, tqdm_enable, tqdm_desc)
+            return self._fix_nan_scores(rec_res), elapse
+
         # rec_res = []
         rec_res = [['', 0.0]] * img_num
         batch_num = self.rec_batch_num
@@ -358,7 +464,6 @@ class TextRecognizer(BaseOCRV20):
                         norm_img = norm_img[np.newaxis, :]
                         norm_img_batch.append(norm_img)
                 norm_img_batch = np.concatenate(norm_img_batch)
-                norm_img_batch = norm_img_batch.copy()
 
                 if self.rec_algorithm == "SRN":
                     starttime = time.time()
@@ -437,10 +542,13 @@ class TextRecognizer(BaseOCRV20):
                 index += 1
                 pbar.update(current_batch_size)
 
+        return self._fix_nan_scores(rec_res), elapse
+
+    @staticmethod
+    def _fix_nan_scores(rec_res):
         # Fix NaN values in recognition results
         for i in range(len(rec_res)):
             text, score = rec_res[i]
             if isinstance(score, float) and math.isnan(score):
                 rec_res[i] = (text, 0.0)
-
-        return rec_res, elapse
+        return rec_res
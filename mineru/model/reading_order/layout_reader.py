@@ -74,6 +74,14 @@ def boxes2inputs(boxes: List[List[int]]) -> Dict[str, torch.Tensor]:
     }
 
 
+def batch_boxes2inputs(boxes_list: List[List[List[int]]]) -> Dict[str, torch.Tensor]:
+    """multiple pages in one padded batch, padding is done by DataCollator"""
+    features = [{"source_boxes": boxes, "target_index": [0] * len(boxes)} for boxes in boxes_list]
+    inputs = DataCollator()(features)
+    inputs.pop("labels")
+    return inputs
+
+
 def prepare_inputs(
     inputs: Dict[str, torch.Tensor], model: LayoutLMv3ForTokenClassification
 ) -> Dict[str, torch.Tensor]:
@@ -17,11 +17,14 @@ def projection_by_bboxes(boxes: np.array, axis: int) -> np.ndarray:
     """
     assert axis in [0, 1]
     length = np.max(boxes[:, axis::2])
-    res = np.zeros(length, dtype=int)
-    # TODO: how to remove for loop?
-    for start, end in boxes[:, axis::2]:
-        res[start:end] += 1
-    return res
+    starts = boxes[:, axis]
+    ends = boxes[:, axis + 2]
+    valid = ends > starts
+    # 差分数组：区间起点+1，终点-1，前缀和即为每个像素上的box数量
+    diff = np.zeros(length + 1, dtype=int)
+    np.add.at(diff, starts[valid], 1)
+    np.add.at(diff, ends[valid], -1)
+    return np.cumsum(diff[:length])
 
 
 # from: https://dothinking.github.io/2021-06-19-%E9%80%92%E5%BD%92%E6%8A%95%E5%BD%B1%E5%88%86%E5%89%B2%E7%AE%97%E6%B3%95/#:~:text=%E9%80%92%E5%BD%92%E6%8A%95%E5%BD%B1%E5%88%86%E5%89%B2%EF%BC%88Recursive%20XY,%EF%BC%8C%E5%8F%AF%E4%BB%A5%E5%88%92%E5%88%86%E6%AE%B5%E8%90%BD%E3%80%81%E8%A1%8C%E3%80%82
@@ -68,13 +71,14 @@ def split_projection_profile(arr_values: np.array, min_value: float, min_gap: fl
     return arr_start, arr_end
 
 
-def recursive_xy_cut(boxes: np.ndarray, indices: List[int], res: List[int]):
+def recursive_xy_cut(boxes: np.ndarray, indices: List[int], res: List[int], leaves: List[np.ndarray] = None):
     """
 
     Args:
         boxes: (N, 4)
         indices: 递归过程中始终表示 box 在原始数据中的索引
         res: 保存输出结果
+        leaves: 不为None时保存x方向无法再切分的每组box的索引，用于判断切分结果是否可靠
 
     """
     # 向 y 轴投影
@@ -113,6 +117,8 @@ def recursive_xy_cut(boxes: np.ndarray, indices: List[int], res: List[int]):
         if len(arr_x0) == 1:
             # x 方向无法切分
             res.extend(x_sorted_indices_chunk)
+            if leaves is not None:
+                leaves.append(x_sorted_indices_chunk)
             continue
 
         # x 方向上能分开，继续递归调用
@@ -121,10 +127,34 @@ def recursive_xy_cut(boxes: np.ndarray, indices: List[int], res: List[int]):
                 x_sorted_boxes_chunk[:, 0] < c1
             )
             recursive_xy_cut(
-                x_sorted_boxes_chunk[_indices], x_sorted_indices_chunk[_indices], res
+                x_sorted_boxes_chunk[_indices], x_sorted_indices_chunk[_indices], res, leaves
             )
 
 
+def xy_cut_is_ambiguous(boxes: np.ndarray, res: List[int], leaves: List[np.ndarray]) -> bool:
+    """
+    判断recursive_xy_cut的结果是否不可靠：
+    1. 有box没有被切分到任何区域中
+    2. 无法再切分的组里有上下排列(y方向不重叠)的box，组内按x坐标排序得到的顺序不可信
+
+    Args:
+        boxes: (N, 4)
+        res: recursive_xy_cut的输出
+        leaves: recursive_xy_cut收集的无法再切分的组
+
+    """
+    if len(res) != len(boxes):
+        return True
+    for leaf in leaves:
+        if len(leaf) < 2:
+            continue
+        leaf_boxes = boxes[leaf]
+        # 组内box在y方向没有共同的重叠区间，说明存在上下排列的box
+        if leaf_boxes[:, 1].max() >= leaf_boxes[:, 3].min():
+            return True
+    return False
+
+
 def points_to_bbox(points):
     assert len(points) == 8
 
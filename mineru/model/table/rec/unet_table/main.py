@@ -5,12 +5,13 @@ import time
 import traceback
 from dataclasses import dataclass, asdict
 
-from typing import List, Optional, Union, Dict, Any
+from typing import List, Optional, Union, Dict, Any, Tuple
 import numpy as np
 import cv2
 from PIL import Image
 from loguru import logger
 from bs4 import BeautifulSoup
+from tqdm import tqdm
 
 from .table_structure_unet import TSRUnet
 
@@ -55,6 +56,90 @@ class WiredTableRecognition:
         **kwargs,
     ) -> WiredTableOutput:
         s = time.perf_counter()
+        img = self.load_img(img)
+        polygons, rotated_polygons = self.table_structure(img, **kwargs)
+        table_state = self.match_cells(img, polygons, rotated_polygons, ocr_result, s, **kwargs)
+        if "output" in table_state:
+            return table_state["output"]
+        try:
+            # 如果有识别框没有ocr结果，直接进行rec补充
+            table_state["cell_box_det_map"] = self.fill_blank_rec(
+                img, table_state["polygons"], table_state["cell_box_det_map"]
+            )
+        except Exception:
+            logging.warning(traceback.format_exc())
+            return WiredTableOutput("", None, None, 0.0)
+        return self.build_output(table_state, s)
+
+    def batch_predict(
+        self,
+        img_list: List[InputType],
+        ocr_result_list: List[Optional[List[Union[List[List[float]], str, str]]]],
+        batch_size: int = 4,
+        **kwargs,
+    ) -> List[WiredTableOutput]:
+        """
+        批量识别有线表格，表格线分割按batch推理，所有表格空单元格的ocr补充识别合并为一次调用
+        """
+        s = time.perf_counter()
+        img_list = [self.load_img(img) for img in img_list]
+        # 按宽高比排序，预处理后尺寸相近的表格进入同一个batch，减少padding
+        order = sorted(range(len(img_list)), key=lambda i: img_list[i].shape[0] / img_list[i].shape[1])
+        structures = [None] * len(img_list)
+        for index in tqdm(range(0, len(order), batch_size), desc="Table-wired Predict"):
+            batch_indices = order[index:index + batch_size]
+            batch_structures = self.table_structure.batch_process(
+                [img_list[i] for i in batch_indices], **kwargs
+            )
+            for i, structure in zip(batch_indices, batch_structures):
+                structures[i] = structure
+
+        table_states = [
+            self.match_cells(img, polygons, rotated_polygons, ocr_result, s, **kwargs)
+            for img, (polygons, rotated_polygons), ocr_result in zip(img_list, structures, ocr_result_list)
+        ]
+
+        pooled_crop_list = []
+        pending_states = []
+        for table_state in table_states:
+            if "output" in table_state:
+                continue
+            img_crop_list, img_crop_info_list = self.collect_blank_crops(
+                table_state["img"], table_state["polygons"], table_state["cell_box_det_map"]
+            )
+            table_state["crop_range"] = (len(pooled_crop_list), len(pooled_crop_list) + len(img_crop_list))
+            table_state["img_crop_info_list"] = img_crop_info_list
+            pooled_crop_list.extend(img_crop_list)
+            pending_states.append(table_state)
+
+        if pooled_crop_list:
+            ocr_res_list = self.rec_blank_crops(pooled_crop_list)
+            if ocr_res_list is not None:
+                for table_state in pending_states:
+                    beg, end = table_state["crop_range"]
+                    if beg < end:
+                        table_state["cell_box_det_map"] = self.apply_blank_rec(
+                            table_state["polygons"],
+                            table_state["cell_box_det_map"],
+                            table_state["img_crop_info_list"],
+                            ocr_res_list[beg:end],
+                        )
+
+        return [self.build_output(table_state, s) for table_state in table_states]
+
+    def match_cells(
+        self,
+        img: np.ndarray,
+        polygons: Optional[np.ndarray],
+        rotated_polygons: Optional[np.ndarray],
+        ocr_result: Optional[List[Union[List[List[float]], str, str]]],
+        s: float,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        恢复表格的逻辑结构，并将ocr结果匹配到单元格。
+        不需要继续处理时返回的dict中带有最终结果output，否则返回空单元格补充识别和生成html所需的中间结果
+        """
         need_ocr = True
         col_threshold = 15
         row_threshold = 10
@@ -62,11 +147,9 @@ class WiredTableRecognition:
             need_ocr = kwargs.get("need_ocr", True)
             col_threshold = kwargs.get("col_threshold", 15)
             row_threshold = kwargs.get("row_threshold", 10)
-        img = self.load_img(img)
-        polygons, rotated_polygons = self.table_structure(img, **kwargs)
         if polygons is None:
             # logging.warning("polygons is None.")
-            return WiredTableOutput("", None, None, 0.0)
+            return {"output": WiredTableOutput("", None, None, 0.0)}
 
         try:
             table_res, logi_points = self.table_recover(
@@ -81,15 +164,31 @@ class WiredTableRecognition:
                 sorted_polygons, idx_list = sorted_ocr_boxes(
                     [box_4_2_poly_to_box_4_1(box) for box in polygons]
                 )
-                return WiredTableOutput(
+                return {"output": WiredTableOutput(
                     "",
                     sorted_polygons,
                     logi_points[idx_list],
                     time.perf_counter() - s,
-                )
+                )}
             cell_box_det_map, not_match_orc_boxes = match_ocr_cell(ocr_result, polygons)
-            # 如果有识别框没有ocr结果，直接进行rec补充
-            cell_box_det_map = self.fill_blank_rec(img, polygons, cell_box_det_map)
+        except Exception:
+            logging.warning(traceback.format_exc())
+            return {"output": WiredTableOutput("", None, None, 0.0)}
+        return {
+            "img": img,
+            "polygons": polygons,
+            "logi_points": logi_points,
+            "cell_box_det_map": cell_box_det_map,
+        }
+
+    def build_output(self, table_state: Dict[str, Any], s: float) -> WiredTableOutput:
+        """由单元格匹配和空单元格补充识别后的中间结果生成html"""
+        if "output" in table_state:
+            return table_state["output"]
+        cell_box_det_map = table_state["cell_box_det_map"]
+        polygons = table_state["polygons"]
+        logi_points = table_state["logi_points"]
+        try:
             # 转换为中间格式，修正识别框坐标,将物理识别框，逻辑识别框，ocr识别框整合为dict，方便后续处理
             t_rec_ocr_list = self.transform_res(cell_box_det_map, polygons, logi_points)
             # 将每个单元格中的ocr识别结果排序和同行合并，输出的html能完整保留文字的换行格式
@@ -171,6 +270,22 @@ class WiredTableRecognition:
         cell_box_map: Dict[int, List[str]],
     ) -> Dict[int, List[Any]]:
         """找到poly对应为空的框，尝试将直接将poly框直接送到识别中"""
+        img_crop_list, img_crop_info_list = self.collect_blank_crops(img, sorted_polygons, cell_box_map)
+        if len(img_crop_list) > 0:
+            # 进行ocr识别
+            ocr_res_list = self.rec_blank_crops(img_crop_list)
+            if ocr_res_list is None:
+                return cell_box_map
+            cell_box_map = self.apply_blank_rec(sorted_polygons, cell_box_map, img_crop_info_list, ocr_res_list)
+        return cell_box_map
+
+    def collect_blank_crops(
+        self,
+        img: np.ndarray,
+        sorted_polygons: np.ndarray,
+        cell_box_map: Dict[int, List[str]],
+    ) -> Tuple[List[np.ndarray], List[List[Any]]]:
+        """截取poly对应为空的框，返回截图列表和对应的[poly序号, poly]列表"""
         bgr_img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
         img_crop_info_list = []
         img_crop_list = []
@@ -193,38 +308,46 @@ class WiredTableRecognition:
             img_crop = bgr_img[int(y1):int(y2), int(x1):int(x2)]
             img_crop_list.append(img_crop)
             img_crop_info_list.append([i, box])
-
-        if len(img_crop_list) > 0:
-            # 进行ocr识别
-            ocr_result = self.ocr_engine.ocr(img_crop_list, det=False)
-            # ocr_result = [[]]
-            # for crop_img in img_crop_list:
-            #     tmp_ocr_result = self.ocr_engine.ocr(crop_img)
-            #     if tmp_ocr_result[0] and len(tmp_ocr_result[0]) > 0 and isinstance(tmp_ocr_result[0], list) and len(tmp_ocr_result[0][0]) == 2:
-            #         ocr_result[0].append(tmp_ocr_result[0][0][1])
-            #     else:
-            #         ocr_result[0].append(("", 0.0))
-
-            if not ocr_result or not isinstance(ocr_result, list) or len(ocr_result) == 0:
-                logger.warning("OCR engine returned no results or invalid result for image crops.")
-                return cell_box_map
-            ocr_res_list = ocr_result[0]
-            if not isinstance(ocr_res_list, list) or len(ocr_res_list) != len(img_crop_list):
-                logger.warning("OCR result list length does not match image crop list length.")
-                return cell_box_map
-            for j, ocr_res in enumerate(ocr_res_list):
-                img_crop_info_list[j].append(ocr_res)
-
-            for i, box, ocr_res in img_crop_info_list:
-                # 处理ocr结果
-                ocr_text, ocr_score = ocr_res
-                # logger.debug(f"OCR result for box {i}: {ocr_text} with score {ocr_score}")
-                if ocr_score < 0.6 or ocr_text in ['1','口','■','（204号', '（20', '（2', '（2号', '（20号', '号', '（204']:
-                    # logger.warning(f"Low confidence OCR result for box {i}: {ocr_text} with score {ocr_score}")
-                    box = sorted_polygons[i]
-                    cell_box_map[i] = [[box, "", 0.1]]
-                    continue
-                cell_box_map[i] = [[box, ocr_text, ocr_score]]
+        return img_crop_list, img_crop_info_list
+
+    def rec_blank_crops(self, img_crop_list: List[np.ndarray]) -> Optional[List[Any]]:
+        """对空单元格截图做一次ocr识别，结果无效时返回None"""
+        ocr_result = self.ocr_engine.ocr(img_crop_list, det=False)
+        # ocr_result = [[]]
+        # for crop_img in img_crop_list:
+        #     tmp_ocr_result = self.ocr_engine.ocr(crop_img)
+        #     if tmp_ocr_result[0] and len(tmp_ocr_result[0]) > 0 and isinstance(tmp_ocr_result[0], list) and len(tmp_ocr_result[0][0]) == 2:
+        #         ocr_result[0].append(tmp_ocr_result[0][0][1])
+        #     else:
+        #         ocr_result[0].append(("", 0.0))
+
+        if not ocr_result or not isinstance(ocr_result, list) or len(ocr_result) == 0:
+            logger.warning("OCR engine returned no results or invalid result for image crops.")
+            return None
+        ocr_res_list = ocr_result[0]
+        if not isinstance(ocr_res_list, list) or len(ocr_res_list) != len(img_crop_list):
+            logger.warning("OCR result list length does not match image crop list length.")
+            return None
+        return ocr_res_list
+
+    def apply_blank_rec(
+        self,
+        sorted_polygons: np.ndarray,
+        cell_box_map: Dict[int, List[str]],
+        img_crop_info_list: List[List[Any]],
+        ocr_res_list: List[Any],
+    ) -> Dict[int, List[Any]]:
+        """将空单元格截图的识别结果回填到cell_box_map"""
+        for (i, box), ocr_res in zip(img_crop_info_list, ocr_res_list):
+            # 处理ocr结果
+            ocr_text, ocr_score = ocr_res
+            # logger.debug(f"OCR result for box {i}: {ocr_text} with score {ocr_score}")
+            if ocr_score < 0.6 or ocr_text in ['1','口','■','（204号', '（20', '（2', '（2号', '（20号', '号', '（204']:
+                # logger.warning(f"Low confidence OCR result for box {i}: {ocr_text} with score {ocr_score}")
+                box = sorted_polygons[i]
+                cell_box_map[i] = [[box, "", 0.1]]
+                continue
+            cell_box_map[i] = [[box, ocr_text, ocr_score]]
 
         return cell_box_map
 
@@ -272,70 +395,107 @@ class UnetTableModel:
 
         try:
             wired_table_results = self.wired_table_model(np_img, ocr_result)
-
-            # viser = VisTable()
-            # save_html_path = f"outputs/output.html"
-            # save_drawed_path = f"outputs/output_table_vis.jpg"
-            # save_logic_path = (
-            #     f"outputs/output_table_vis_logic.jpg"
-            # )
-            # vis_imged = viser(
-            #     np_img, wired_table_results, save_html_path, save_drawed_path, save_logic_path
-            # )
-
-            wired_html_code = wired_table_results.pred_html
-            wired_len = count_table_cells_physical(wired_html_code)
-            wireless_len = count_table_cells_physical(wireless_html_code)
-            # 计算两种模型检测的单元格数量差异
-            gap_of_len = wireless_len - wired_len
-            # logger.debug(f"wired table cell bboxes: {wired_len}, wireless table cell bboxes: {wireless_len}")
-
-            # 使用OCR结果计算两种模型填入的文字数量
-            wireless_text_count = 0
-            wired_text_count = 0
-            for ocr_res in ocr_result:
-                if ocr_res[1] in wireless_html_code:
-                    wireless_text_count += 1
-                if ocr_res[1] in wired_html_code:
-                    wired_text_count += 1
-            # logger.debug(f"wireless table ocr text count: {wireless_text_count}, wired table ocr text count: {wired_text_count}")
-
-            # 使用HTML解析器计算空单元格数量
-            wireless_soup = BeautifulSoup(wireless_html_code, 'html.parser') if wireless_html_code else BeautifulSoup("", 'html.parser')
-            wired_soup = BeautifulSoup(wired_html_code, 'html.parser') if wired_html_code else BeautifulSoup("", 'html.parser')
-            # 计算空单元格数量(没有文本内容或只有空白字符)
-            wireless_blank_count = sum(1 for cell in wireless_soup.find_all(['td', 'th']) if not cell.text.strip())
-            wired_blank_count = sum(1 for cell in wired_soup.find_all(['td', 'th']) if not cell.text.strip())
-            # logger.debug(f"wireless table blank cell count: {wireless_blank_count}, wired table blank cell count: {wired_blank_count}")
-
-            # 计算非空单元格数量
-            wireless_non_blank_count = wireless_len - wireless_blank_count
-            wired_non_blank_count = wired_len - wired_blank_count
-            # 无线表非空格数量大于有线表非空格数量时，才考虑切换
-            switch_flag = False
-            if wireless_non_blank_count > wired_non_blank_count:
-                # 假设非空表格是接近正方表，使用非空单元格数量开平方作为表格规模的估计
-                wired_table_scale = round(wired_non_blank_count ** 0.5)
-                # logger.debug(f"wireless non-blank cell count: {wireless_non_blank_count}, wired non-blank cell count: {wired_non_blank_count}, wired table scale: {wired_table_scale}")
-                # 如果无线表非空格的数量比有线表多一列或以上，需要切换到无线表
-                wired_scale_plus_2_cols = wired_non_blank_count + (wired_table_scale * 2)
-                wired_scale_squared_plus_2_rows = wired_table_scale * (wired_table_scale + 2)
-                if (wireless_non_blank_count + 3) >= max(wired_scale_plus_2_cols, wired_scale_squared_plus_2_rows):
-                    switch_flag = True
-
-            # 判断是否使用无线表格模型的结果
-            if (
-                switch_flag
-                or (0 <= gap_of_len <= 5 and wired_len <= round(wireless_len * 0.75))  # 两者相差不大但有线模型结果较少
-                or (gap_of_len == 0 and wired_len <= 4)  # 单元格数量完全相等且总量小于等于4
-                or (wired_text_count <= wireless_text_count * 0.6 and  wireless_text_count >=10) # 有线模型填入的文字明显少于无线模型
-            ):
-                # logger.debug("fall back to wireless table model")
-                html_code = wireless_html_code
-            else:
-                html_code = wired_html_code
-
-            return html_code
+            return self.select_html(wired_table_results, ocr_result, wireless_html_code)
         except Exception as e:
             logger.warning(e)
             return wireless_html_code
+
+    def batch_predict(self, table_res_list: List[Dict], batch_size: int = 4) -> None:
+        """对传入的字典列表进行批量预测，结果写入table_res['html']，无返回值"""
+        not_none_table_res_list = []
+        for table_res in table_res_list:
+            if table_res.get("ocr_result", None):
+                not_none_table_res_list.append(table_res)
+        if not not_none_table_res_list:
+            return
+
+        np_imgs = [np.asarray(table_res["wired_table_img"]) for table_res in not_none_table_res_list]
+        try:
+            wired_table_results = self.wired_table_model.batch_predict(
+                np_imgs,
+                [table_res["ocr_result"] for table_res in not_none_table_res_list],
+                batch_size=batch_size,
+            )
+        except Exception as e:
+            # 批量识别失败时逐个表格重新识别，单个表格失败时使用无线表格结果
+            logger.warning(f"wired table batch predict failed: {e}, fall back to one by one")
+            for np_img, table_res in zip(np_imgs, not_none_table_res_list):
+                table_res["table_res"]["html"] = self.predict(
+                    np_img, table_res["ocr_result"], table_res["table_res"].get("html", None)
+                )
+            return
+
+        for wired_table_result, table_res in zip(wired_table_results, not_none_table_res_list):
+            wireless_html_code = table_res["table_res"].get("html", None)
+            try:
+                html_code = self.select_html(wired_table_result, table_res["ocr_result"], wireless_html_code)
+            except Exception as e:
+                logger.warning(e)
+                html_code = wireless_html_code
+            table_res["table_res"]["html"] = html_code
+
+    def select_html(self, wired_table_results, ocr_result, wireless_html_code):
+        """比较有线表格和无线表格模型的结果，选择其中更可信的html"""
+        # viser = VisTable()
+        # save_html_path = f"outputs/output.html"
+        # save_drawed_path = f"outputs/output_table_vis.jpg"
+        # save_logic_path = (
+        #     f"outputs/output_table_vis_logic.jpg"
+        # )
+        # vis_imged = viser(
+        #     np_img, wired_table_results, save_html_path, save_drawed_path, save_logic_path
+        # )
+
+        wired_html_code = wired_table_results.pred_html
+        wired_len = count_table_cells_physical(wired_html_code)
+        wireless_len = count_table_cells_physical(wireless_html_code)
+        # 计算两种模型检测的单元格数量差异
+        gap_of_len = wireless_len - wired_len
+        # logger.debug(f"wired table cell bboxes: {wired_len}, wireless table cell bboxes: {wireless_len}")
+
+        # 使用OCR结果计算两种模型填入的文字数量
+        wireless_text_count = 0
+        wired_text_count = 0
+        for ocr_res in ocr_result:
+            if ocr_res[1] in wireless_html_code:
+                wireless_text_count += 1
+            if ocr_res[1] in wired_html_code:
+                wired_text_count += 1
+        # logger.debug(f"wireless table ocr text count: {wireless_text_count}, wired table ocr text count: {wired_text_count}")
+
+        # 使用HTML解析器计算空单元格数量
+        wireless_soup = BeautifulSoup(wireless_html_code, 'html.parser') if wireless_html_code else BeautifulSoup("", 'html.parser')
+        wired_soup = BeautifulSoup(wired_html_code, 'html.parser') if wired_html_code else BeautifulSoup("", 'html.parser')
+        # 计算空单元格数量(没有文本内容或只有空白字符)
+        wireless_blank_count = sum(1 for cell in wireless_soup.find_all(['td', 'th']) if not cell.text.strip())
+        wired_blank_count = sum(1 for cell in wired_soup.find_all(['td', 'th']) if not cell.text.strip())
+        # logger.debug(f"wireless table blank cell count: {wireless_blank_count}, wired table blank cell count: {wired_blank_count}")
+
+        # 计算非空单元格数量
+        wireless_non_blank_count = wireless_len - wireless_blank_count
+        wired_non_blank_count = wired_len - wired_blank_count
+        # 无线表非空格数量大于有线表非空格数量时，才考虑切换
+        switch_flag = False
+        if wireless_non_blank_count > wired_non_blank_count:
+            # 假设非空表格是接近正方表，使用非空单元格数量开平方作为表格规模的估计
+            wired_table_scale = round(wired_non_blank_count ** 0.5)
+            # logger.debug(f"wireless non-blank cell count: {wireless_non_blank_count}, wired non-blank cell count: {wired_non_blank_count}, wired table scale: {wired_table_scale}")
+            # 如果无线表非空格的数量比有线表多一列或以上，需要切换到无线表
+            wired_scale_plus_2_cols = wired_non_blank_count + (wired_table_scale * 2)
+            wired_scale_squared_plus_2_rows = wired_table_scale * (wired_table_scale + 2)
+            if (wireless_non_blank_count + 3) >= max(wired_scale_plus_2_cols, wired_scale_squared_plus_2_rows):
+                switch_flag = True
+
+        # 判断是否使用无线表格模型的结果
+        if (
+            switch_flag
+            or (0 <= gap_of_len <= 5 and wired_len <= round(wireless_len * 0.75))  # 两者相差不大但有线模型结果较少
+            or (gap_of_len == 0 and wired_len <= 4)  # 单元格数量完全相等且总量小于等于4
+            or (wired_text_count <= wireless_text_count * 0.6 and  wireless_text_count >=10) # 有线模型填入的文字明显少于无线模型
+        ):
+            # logger.debug("fall back to wireless table model")
+            html_code = wireless_html_code
+        else:
+            html_code = wired_html_code
+
+        return html_code
@@ -1,11 +1,13 @@
 import copy
 import math
-from typing import Optional, Dict, Any, Tuple
+import re
+from typing import Optional, Dict, Any, List, Tuple
 
 import cv2
 import numpy as np
+from loguru import logger
 from skimage import measure
-from .utils import OrtInferSession, resize_img
+from .utils import OrtInferSession, ONNXRuntimeError, resize_img
 from .utils_table_line_rec import (
     get_table_line,
     final_adjust_lines,
@@ -18,6 +20,9 @@ from.utils_table_recover import (
     box_4_2_poly_to_box_4_1,
 )
 
+# onnxruntime在输入维度与模型固定维度不符时的报错，index: 0 表示batch维
+BATCH_DIM_MISMATCH_PATTERN = re.compile(r"invalid dimensions for input.*?index: 0 Got: \d+ Expected: \d+", re.S)
+
 
 class TSRUnet:
     def __init__(self, config: Dict):
@@ -29,12 +34,62 @@ class TSRUnet:
         self.inp_width = 1024
 
         self.session = OrtInferSession(config)
+        # 模型导出时batch维固定为1的情况下，首次batch推理报batch维不匹配后改为逐张推理
+        self.batch_infer_enable = True
 
     def __call__(
         self, img: np.ndarray, **kwargs
     ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
         img_info = self.preprocess(img)
         pred = self.infer(img_info)
+        return self.polygons_from_pred(img, pred, **kwargs)
+
+    def batch_process(
+        self, img_list: List[np.ndarray], **kwargs
+    ) -> List[Tuple[Optional[np.ndarray], Optional[np.ndarray]]]:
+        """
+        批量处理图像列表，预处理后的图像padding到batch内的最大尺寸后一次推理
+        Returns:
+            结果列表，每个元素与__call__的返回值相同，为 (polygons, rotated_polygons)
+        """
+        inputs = [self.preprocess(img)["img"][0] for img in img_list]
+        preds = self.batch_infer(inputs)
+        return [
+            self.polygons_from_pred(img, pred, **kwargs)
+            for img, pred in zip(img_list, preds)
+        ]
+
+    def batch_infer(self, inputs: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        inputs为preprocess输出的(C, H, W)图像，padding区域填充归一化后的白色，避免在图像边缘产生额外的表格线，
+        推理后按各自的尺寸裁剪出线分割结果
+        """
+        if len(inputs) > 1 and self.batch_infer_enable:
+            max_h = max(inp.shape[1] for inp in inputs)
+            max_w = max(inp.shape[2] for inp in inputs)
+            pad_value = (255 - self.mean) / self.std
+            batch = np.empty((len(inputs), 3, max_h, max_w), dtype=np.float32)
+            batch[:] = pad_value.reshape(1, 3, 1, 1)
+            for i, inp in enumerate(inputs):
+                batch[i, :, :inp.shape[1], :inp.shape[2]] = inp
+            try:
+                result = self.session([batch])[0]
+                return [
+                    result[i][0][:inp.shape[1], :inp.shape[2]].astype(np.uint8)
+                    for i, inp in enumerate(inputs)
+                ]
+            except ONNXRuntimeError as e:
+                if BATCH_DIM_MISMATCH_PATTERN.search(str(e)):
+                    logger.warning("wired table model does not support batch inference, fall back to one by one")
+                    self.batch_infer_enable = False
+                else:
+                    # 其他错误(如显存/内存不足)只对当前batch逐张重试，后续仍尝试batch推理
+                    logger.warning(f"wired table batch inference failed, retry one by one for this batch: {e}")
+        return [self.infer({"img": inp[None, :]}) for inp in inputs]
+
+    def polygons_from_pred(
+        self, img: np.ndarray, pred: np.ndarray, **kwargs
+    ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
         polygons, rotated_polygons = self.postprocess(img, pred, **kwargs)
         if polygons.size == 0:
             return None, None
@@ -2,26 +2,100 @@
 import copy
 import os
 import statistics
+import time
 import warnings
 from typing import List
-import torch
+import numpy as np
 from loguru import logger
 
-from mineru.utils.config_reader import get_device
+from mineru.model.reading_order.xycut import recursive_xy_cut, xy_cut_is_ambiguous
+from mineru.utils.config_reader import get_device, get_reading_order_mode
 from mineru.utils.enum_class import BlockType, ModelPath
 from mineru.utils.models_download_utils import auto_download_and_get_model_root_path
 
 
 def sort_blocks_by_bbox(blocks, page_w, page_h, footnote_blocks):
+    return batch_sort_blocks_by_bbox([(blocks, page_w, page_h, footnote_blocks)])[0]
+
+
+def batch_sort_blocks_by_bbox(pages, batch_size=None):
+    """
+    多页一起排序，pages为(blocks, page_w, page_h, footnote_blocks)的列表，返回每页排序后的blocks。
+    各页的line收集完成后按batch拼接，layoutreader每个batch只做一次前向推理，再把顺序分发回各页。
+    batch大小通过环境变量MINERU_LAYOUTREADER_BATCH_SIZE设置，默认值为32。
+    MINERU_READING_ORDER_MODE=xycut时先对block做xycut，只有切分结果不可靠的页面才使用layoutreader。
+    """
+    if batch_size is None:
+        batch_size = int(os.environ.get('MINERU_LAYOUTREADER_BATCH_SIZE', 32))
+
+    """获取所有line"""
+    page_lines = []
+    for blocks, page_w, page_h, footnote_blocks in pages:
+        page_lines.append(prepare_sort_lines(blocks, page_w, page_h, get_line_height(blocks), footnote_blocks))
+
+    """版面规整的页面直接使用xycut的block顺序"""
+    xycut_block_bboxes = {}
+    xycut_start = time.time()
+    if get_reading_order_mode() == 'xycut':
+        for i, (blocks, _, _, _) in enumerate(pages):
+            sorted_block_bboxes = xycut_sort_block_bboxes(blocks)
+            if sorted_block_bboxes is not None:
+                xycut_block_bboxes[i] = sorted_block_bboxes
+    xycut_cost = time.time() - xycut_start
+
+    """对line排序"""
+    # line数量超过上限的页面使用xycut排序，不参与模型推理
+    model_page_indices = [
+        i for i, lines in enumerate(page_lines) if lines is not None and i not in xycut_block_bboxes
+    ]
+    # 按line数量排序后分batch，减少padding
+    model_page_indices.sort(key=lambda i: len(page_lines[i][1]))
+    page_orders = {}
+    model_start = time.time()
+    for start in range(0, len(model_page_indices), batch_size):
+        batch_indices = model_page_indices[start:start + batch_size]
+        orders_list = predict_orders([page_lines[i][1] for i in batch_indices])
+        page_orders.update(zip(batch_indices, orders_list))
+    model_cost = time.time() - model_start
+
+    if len(pages) > 0:
+        # xycut的耗时按尝试过的全部页面平均，layoutreader的耗时按实际推理的页面平均
+        logger.info(
+            f'reading order: {len(pages)} pages, '
+            f'xycut {len(xycut_block_bboxes)} pages {xycut_cost * 1000 / len(pages):.2f}ms/page, '
+            f'layoutreader {len(model_page_indices)} pages {model_cost * 1000 / max(len(model_page_indices), 1):.2f}ms/page'
+        )
 
-    """获取所有line并计算正文line的高度"""
-    line_height = get_line_height(blocks)
+    """根据line的中位数算block的序列关系"""
+    sorted_blocks_list = []
+    for i, (blocks, _, _, _) in enumerate(pages):
+        if i in xycut_block_bboxes or page_lines[i] is None:
+            sorted_bboxes = None
+        else:
+            page_line_list = page_lines[i][0]
+            sorted_bboxes = [page_line_list[j] for j in page_orders[i]]
+        sorted_blocks_list.append(sort_blocks_by_lines(blocks, sorted_bboxes, xycut_block_bboxes.get(i)))
+    return sorted_blocks_list
+
+
+def xycut_sort_block_bboxes(blocks):
+    """对block做xycut，返回排好序的block bbox，切分结果不可靠时返回None"""
+    block_bboxes = [[max(0, x) for x in block['bbox']] for block in blocks]
+    if len(block_bboxes) == 0:
+        return None
+    boxes = np.asarray(block_bboxes).astype(int)
+    res = []
+    leaves = []
+    recursive_xy_cut(boxes, np.arange(len(block_bboxes)), res, leaves)
+    if xy_cut_is_ambiguous(boxes, res, leaves):
+        return None
+    return [block_bboxes[i] for i in res]
 
-    """获取所有line并对line排序"""
-    sorted_bboxes = sort_lines_by_model(blocks, page_w, page_h, line_height, footnote_blocks)
+
+def sort_blocks_by_lines(blocks, sorted_bboxes, sorted_block_bboxes=None):
 
     """根据line的中位数算block的序列关系"""
-    blocks = cal_block_index(blocks, sorted_bboxes)
+    blocks = cal_block_index(blocks, sorted_bboxes, sorted_block_bboxes)
 
     """将image和table的block还原回group形式参与后续流程"""
     blocks = revert_group_blocks(blocks)
@@ -54,7 +128,11 @@ def get_line_height(blocks):
         return 10
 
 
-def sort_lines_by_model(fix_blocks, page_w, page_h, line_height, footnote_blocks):
+def prepare_sort_lines(fix_blocks, page_w, page_h, line_height, footnote_blocks):
+    """
+    收集页面所有line的bbox，返回(page_line_list, boxes)，boxes为缩放到0-1000的layoutreader输入。
+    line数量超过layoutreader上限时返回None，由xycut排序。
+    """
     page_line_list = []
 
     def add_lines_to_block(b):
@@ -125,15 +203,44 @@ def sort_lines_by_model(fix_blocks, page_w, page_h, line_height, footnote_blocks
             1000 >= right >= left >= 0 and 1000 >= bottom >= top >= 0
         ), f'Invalid box. right: {right}, left: {left}, bottom: {bottom}, top: {top}'  # noqa: E126, E121
         boxes.append([left, top, right, bottom])
-    model_manager = ModelSingleton()
-    model = model_manager.get_model('layoutreader')
-    with torch.no_grad():
-        orders = do_predict(boxes, model)
+    return page_line_list, boxes
+
+
+def sort_lines_by_model(fix_blocks, page_w, page_h, line_height, footnote_blocks):
+    page_lines = prepare_sort_lines(fix_blocks, page_w, page_h, line_height, footnote_blocks)
+    if page_lines is None:
+        return None
+    page_line_list, boxes = page_lines
+    orders = predict_orders([boxes])[0]
     sorted_bboxes = [page_line_list[i] for i in orders]
 
     return sorted_bboxes
 
 
+def predict_orders(boxes_list: List[List[List[int]]]) -> List[List[int]]:
+    """对多页的line boxes一起做layoutreader推理，返回每页的line顺序"""
+    # 没有line的页面无需推理
+    non_empty_indices = [i for i, boxes in enumerate(boxes_list) if len(boxes) > 0]
+    orders_list = [[] for _ in boxes_list]
+    if not non_empty_indices:
+        return orders_list
+    from mineru.backend.pipeline.model_server import get_model_server_client
+    model_client = get_model_server_client()
+    if model_client is not None:
+        return model_client.predict_orders(boxes_list)
+    import torch
+    from mineru.backend.pipeline.model_init import model_inference_lock
+    # 多个请求的后处理线程可能同时排序，layoutreader模型推理需要互斥
+    with model_inference_lock:
+        model_manager = ModelSingleton()
+        model = model_manager.get_model('layoutreader')
+        with torch.no_grad():
+            batch_orders = do_predict_batch([boxes_list[i] for i in non_empty_indices], model)
+    for i, orders in zip(non_empty_indices, batch_orders):
+        orders_list[i] = orders
+    return orders_list
+
+
 def insert_lines_into_block(block_bbox, line_height, page_w, page_h):
     # block_bbox是一个元组(x0, y0, x1, y1)，其中(x0, y0)是左下角坐标，(x1, y1)是右上角坐标
     x0, y0, x1, y1 = block_bbox
@@ -177,6 +284,7 @@ def insert_lines_into_block(block_bbox, line_height, page_w, page_h):
 
 
 def model_init(model_name: str):
+    import torch
     from transformers import LayoutLMv3ForTokenClassification
     device_name = get_device()
     bf_16_support = False
@@ -238,7 +346,20 @@ def do_predict(boxes: List[List[int]], model) -> List[int]:
     return parse_logits(logits, len(boxes))
 
 
-def cal_block_index(fix_blocks, sorted_bboxes):
+def do_predict_batch(boxes_list: List[List[List[int]]], model) -> List[List[int]]:
+    from mineru.model.reading_order.layout_reader import (
+        batch_boxes2inputs, parse_logits, prepare_inputs)
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=FutureWarning, module="transformers")
+
+        inputs = batch_boxes2inputs(boxes_list)
+        inputs = prepare_inputs(inputs, model)
+        logits = model(**inputs).logits.cpu()
+    return [parse_logits(logits[i], len(boxes)) for i, boxes in enumerate(boxes_list)]
+
+
+def cal_block_index(fix_blocks, sorted_bboxes, sorted_block_bboxes=None):
 
     if sorted_bboxes is not None:
         # 使用layoutreader排序
@@ -274,15 +395,16 @@ def cal_block_index(fix_blocks, sorted_bboxes):
                     block['lines'] = copy.deepcopy(block['real_lines'])
                     del block['real_lines']
 
-        import numpy as np
-        from mineru.model.reading_order.xycut import recursive_xy_cut
-
-        random_boxes = np.array(block_bboxes)
-        np.random.shuffle(random_boxes)
-        res = []
-        recursive_xy_cut(np.asarray(random_boxes).astype(int), np.arange(len(block_bboxes)), res)
-        assert len(res) == len(block_bboxes)
-        sorted_boxes = random_boxes[np.array(res)].tolist()
+        if sorted_block_bboxes is not None:
+            # 已经做过xycut的页面直接使用结果
+            sorted_boxes = sorted_block_bboxes
+        else:
+            random_boxes = np.array(block_bboxes)
+            np.random.shuffle(random_boxes)
+            res = []
+            recursive_xy_cut(np.asarray(random_boxes).astype(int), np.arange(len(block_bboxes)), res)
+            assert len(res) == len(block_bboxes)
+            sorted_boxes = random_boxes[np.array(res)].tolist()
 
         for i, block in enumerate(fix_blocks):
             block['index'] = sorted_boxes.index(block['bbox'])
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 
 def is_in(box1, box2) -> bool:
     """box1是否完全在box2里面."""
@@ -200,4 +202,140 @@ def calculate_vertical_projection_overlap_ratio(block1, block2):
 
     # Proportion of the x-axis covered by the intersection
     # logger.info(f"intersection_length: {intersection_length}, block1_length: {block1_length}")
-    return intersection_length / block1_length
\ No newline at end of file
+    return intersection_length / block1_length
+
+
+"""
+以下为批量版本，与对应的单个bbox版本结果完全一致。
+*_matrix输入(N,4)和(M,4)的bbox，返回(N,M)的两两计算结果；
+*_pairs输入两组(K,4)的bbox，返回(K,)的逐对计算结果，用于只计算空间索引给出的候选对。
+"""
+def _to_bbox_array(bboxes):
+    return np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+
+
+def _pairwise(bboxes1, bboxes2):
+    return _to_bbox_array(bboxes1)[:, None, :], _to_bbox_array(bboxes2)[None, :, :]
+
+
+def _aligned(bboxes1, bboxes2):
+    return _to_bbox_array(bboxes1), _to_bbox_array(bboxes2)
+
+
+def _area(b):
+    return (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+
+
+def _intersection(b1, b2):
+    """b1和b2为可广播的(..., 4)数组，返回重叠面积，以及是否存在重叠(包括边重合)的掩码."""
+    x_left = np.maximum(b1[..., 0], b2[..., 0])
+    y_top = np.maximum(b1[..., 1], b2[..., 1])
+    x_right = np.minimum(b1[..., 2], b2[..., 2])
+    y_bottom = np.minimum(b1[..., 3], b2[..., 3])
+    overlap_mask = (x_right >= x_left) & (y_bottom >= y_top)
+    intersection_area = (x_right - x_left) * (y_bottom - y_top)
+    return intersection_area, overlap_mask
+
+
+def _is_in(b1, b2):
+    return (
+        (b1[..., 0] >= b2[..., 0])
+        & (b1[..., 1] >= b2[..., 1])
+        & (b1[..., 2] <= b2[..., 2])
+        & (b1[..., 3] <= b2[..., 3])
+    )
+
+
+def _bbox_distance(b1, b2):
+    x1, y1, x1b, y1b = b1[..., 0], b1[..., 1], b1[..., 2], b1[..., 3]
+    x2, y2, x2b, y2b = b2[..., 0], b2[..., 1], b2[..., 2], b2[..., 3]
+
+    left = x2b < x1
+    right = x1b < x2
+    bottom = y2b < y1
+    top = y1b < y2
+
+    def dist(px1, py1, px2, py2):
+        # float_power与python的**一样调用libm的pow，ndarray的**2会优化成乘法，结果可能有1ulp的差异
+        return np.sqrt(np.float_power(px1 - px2, 2) + np.float_power(py1 - py2, 2))
+
+    # 条件顺序与bbox_distance的分支顺序一致
+    return np.select(
+        [top & left, left & bottom, bottom & right, right & top, left, right, bottom, top],
+        [
+            dist(x1, y1b, x2b, y2),
+            dist(x1, y1, x2b, y2b),
+            dist(x1b, y1, x2, y2b),
+            dist(x1b, y1b, x2, y2),
+            x1 - x2b,
+            x2 - x1b,
+            y1 - y2b,
+            y2 - y1b,
+        ],
+        default=0.0,
+    )
+
+
+def _overlap_area_2_minbox_area_ratio(b1, b2):
+    intersection_area, overlap_mask = _intersection(b1, b2)
+    min_box_area = np.minimum(_area(b1), _area(b2))
+    valid = overlap_mask & (min_box_area != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, intersection_area / min_box_area, 0.0)
+
+
+def _iou(b1, b2):
+    intersection_area, overlap_mask = _intersection(b1, b2)
+    bbox1_area = _area(b1)
+    bbox2_area = _area(b2)
+    valid = overlap_mask & (bbox1_area != 0) & (bbox2_area != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, intersection_area / (bbox1_area + bbox2_area - intersection_area), 0.0)
+
+
+def _overlap_area_in_bbox1_area_ratio(b1, b2):
+    intersection_area, overlap_mask = _intersection(b1, b2)
+    bbox1_area = _area(b1)
+    valid = overlap_mask & (bbox1_area != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, intersection_area / bbox1_area, 0.0)
+
+
+def is_in_matrix(bboxes1, bboxes2):
+    """is_in的批量版本，result[i, j]表示bboxes1[i]是否完全在bboxes2[j]里面."""
+    return _is_in(*_pairwise(bboxes1, bboxes2))
+
+
+def bbox_distance_matrix(bboxes1, bboxes2):
+    """bbox_distance的批量版本，result[i, j]为bboxes1[i]和bboxes2[j]的距离."""
+    return _bbox_distance(*_pairwise(bboxes1, bboxes2))
+
+
+def calculate_overlap_area_2_minbox_area_ratio_matrix(bboxes1, bboxes2):
+    """calculate_overlap_area_2_minbox_area_ratio的批量版本."""
+    return _overlap_area_2_minbox_area_ratio(*_pairwise(bboxes1, bboxes2))
+
+
+def calculate_overlap_area_2_minbox_area_ratio_pairs(bboxes1, bboxes2):
+    """calculate_overlap_area_2_minbox_area_ratio的逐对版本."""
+    return _overlap_area_2_minbox_area_ratio(*_aligned(bboxes1, bboxes2))
+
+
+def calculate_iou_matrix(bboxes1, bboxes2):
+    """calculate_iou的批量版本."""
+    return _iou(*_pairwise(bboxes1, bboxes2))
+
+
+def calculate_iou_pairs(bboxes1, bboxes2):
+    """calculate_iou的逐对版本."""
+    return _iou(*_aligned(bboxes1, bboxes2))
+
+
+def calculate_overlap_area_in_bbox1_area_ratio_matrix(bboxes1, bboxes2):
+    """calculate_overlap_area_in_bbox1_area_ratio的批量版本."""
+    return _overlap_area_in_bbox1_area_ratio(*_pairwise(bboxes1, bboxes2))
+
+
+def calculate_overlap_area_in_bbox1_area_ratio_pairs(bboxes1, bboxes2):
+    """calculate_overlap_area_in_bbox1_area_ratio的逐对版本."""
+    return _overlap_area_in_bbox1_area_ratio(*_aligned(bboxes1, bboxes2))
@@ -1,40 +1,109 @@
 # Copyright (c) Opendatalab. All rights reserved.
 import json
 import os
-from loguru import logger
+import threading
+import time
+from typing import Optional
 
-try:
-    import torch
-    import torch_npu
-except ImportError:
-    pass
+from loguru import logger
 
 
 # 定义配置文件名常量
 CONFIG_FILE_NAME = os.getenv('MINERU_TOOLS_CONFIG_JSON', 'mineru.json')
 
 
+class ConfigReader:
+    """
+    带缓存的配置文件读取器，首次访问时读取并解析配置文件，之后只在文件mtime变化时重新读取。
+    两次mtime检查之间至少间隔check_interval秒，间隔内的访问直接返回缓存，不产生任何文件系统调用。
+    返回的配置对象在多次调用之间共享，调用方不应修改。
+    """
+
+    def __init__(self, config_file_name=CONFIG_FILE_NAME, check_interval=1.0):
+        if os.path.isabs(config_file_name):
+            self.config_file = config_file_name
+        else:
+            self.config_file = os.path.join(os.path.expanduser('~'), config_file_name)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._config = None
+        self._mtime = None
+        self._loaded = False
+        self._last_check = 0.0
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self, mtime):
+        if mtime is None:
+            # logger.warning(f'{self.config_file} not found, using default configuration')
+            self._config = None
+        else:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                self._config = json.load(f)
+        self._mtime = mtime
+        self._loaded = True
+
+    def get(self):
+        now = time.monotonic()
+        if self._loaded and now - self._last_check < self.check_interval:
+            return self._config
+        with self._lock:
+            if not self._loaded or now - self._last_check >= self.check_interval:
+                mtime = self._file_mtime()
+                if not self._loaded or mtime != self._mtime:
+                    self._load(mtime)
+                self._last_check = now
+            return self._config
+
+    def reload(self):
+        """强制重新读取配置文件，供服务在配置更新后立即生效"""
+        with self._lock:
+            self._load(self._file_mtime())
+            self._last_check = time.monotonic()
+        return self._config
+
+    def _get_section(self, key):
+        config = self.get()
+        if config is None:
+            return None
+        return config.get(key, None)
+
+    def bucket_info(self) -> Optional[dict]:
+        return self._get_section('bucket_info')
+
+    def latex_delimiter_config(self) -> Optional[dict]:
+        return self._get_section('latex-delimiter-config')
+
+    def llm_aided_config(self) -> Optional[dict]:
+        return self._get_section('llm-aided-config')
+
+    def local_models_dir(self) -> Optional[dict]:
+        return self._get_section('models-dir')
+
+
+_config_reader = ConfigReader()
+
+
+def get_config_reader() -> ConfigReader:
+    return _config_reader
+
+
 def read_config():
-    if os.path.isabs(CONFIG_FILE_NAME):
-        config_file = CONFIG_FILE_NAME
-    else:
-        home_dir = os.path.expanduser('~')
-        config_file = os.path.join(home_dir, CONFIG_FILE_NAME)
+    return _config_reader.get()
 
-    if not os.path.exists(config_file):
-        # logger.warning(f'{config_file} not found, using default configuration')
-        return None
-    else:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config
+
+def reload_config():
+    """重新读取配置文件，服务运行中修改了mineru.json后调用"""
+    return _config_reader.reload()
 
 
 def get_s3_config(bucket_name: str):
     """~/magic-pdf.json 读出来."""
-    config = read_config()
-
-    bucket_info = config.get('bucket_info')
+    bucket_info = _config_reader.bucket_info()
     if bucket_name not in bucket_info:
         access_key, secret_key, storage_endpoint = bucket_info['[default]']
     else:
@@ -77,12 +146,15 @@ def get_device():
     if device_mode is not None:
         return device_mode
     else:
+        # torch导入耗时较长，只在需要自动检测设备时导入
+        import torch
         if torch.cuda.is_available():
             return "cuda"
         elif torch.backends.mps.is_available():
             return "mps"
         else:
             try:
+                import torch_npu
                 if torch_npu.npu.is_available():
                     return "npu"
             except Exception as e:
@@ -102,35 +174,27 @@ def get_table_enable(table_enable):
     return table_enable
 
 
+def get_reading_order_mode():
+    """阅读顺序排序方式，layoutreader：全部页面使用模型排序；xycut：优先使用xycut，切分结果不可靠的页面再使用模型排序"""
+    reading_order_mode = os.getenv('MINERU_READING_ORDER_MODE', 'layoutreader').lower()
+    if reading_order_mode not in ['layoutreader', 'xycut']:
+        logger.warning(f"unknown MINERU_READING_ORDER_MODE: {reading_order_mode}, use 'layoutreader' as default")
+        reading_order_mode = 'layoutreader'
+    return reading_order_mode
+
+
 def get_latex_delimiter_config():
-    config = read_config()
-    if config is None:
-        return None
-    latex_delimiter_config = config.get('latex-delimiter-config', None)
-    if latex_delimiter_config is None:
-        # logger.warning(f"'latex-delimiter-config' not found in {CONFIG_FILE_NAME}, use 'None' as default")
-        return None
-    else:
-        return latex_delimiter_config
+    return _config_reader.latex_delimiter_config()
 
 
 def get_llm_aided_config():
-    config = read_config()
-    if config is None:
-        return None
-    llm_aided_config = config.get('llm-aided-config', None)
-    if llm_aided_config is None:
-        # logger.warning(f"'llm-aided-config' not found in {CONFIG_FILE_NAME}, use 'None' as default")
-        return None
-    else:
-        return llm_aided_config
+    return _config_reader.llm_aided_config()
 
 
 def get_local_models_dir():
-    config = read_config()
-    if config is None:
+    if _config_reader.get() is None:
         return None
-    models_dir = config.get('models-dir')
+    models_dir = _config_reader.local_models_dir()
     if models_dir is None:
         logger.warning(f"'models-dir' not found in {CONFIG_FILE_NAME}, use None as default")
-    return models_dir
\ No newline at end of file
+    return models_dir
@@ -5,9 +5,21 @@ from loguru import logger
 from pypdf import PdfReader, PdfWriter, PageObject
 from reportlab.pdfgen import canvas
 
+from mineru.data.data_reader_writer import DataWriter
 from .enum_class import BlockType, ContentType, SplitFlag
 
 
+def save_pdf(output_pdf: PdfWriter, out_path, filename):
+    """out_path可以是输出目录，也可以是DataWriter（如内存输出）"""
+    if isinstance(out_path, DataWriter):
+        output_buffer = BytesIO()
+        output_pdf.write(output_buffer)
+        out_path.write(filename, output_buffer.getvalue())
+    else:
+        with open(f"{out_path}/{filename}", "wb") as f:
+            output_pdf.write(f)
+
+
 def cal_canvas_rect(page, bbox):
     """
     Calculate the rectangle coordinates on the canvas based on the original PDF page and bounding box.
@@ -262,9 +274,7 @@ def draw_layout_bbox(pdf_info, pdf_bytes, out_path, filename):
 
         output_pdf.add_page(page)
 
-    # 保存结果
-    with open(f"{out_path}/{filename}", "wb") as f:
-        output_pdf.write(f)
+    save_pdf(output_pdf, out_path, filename)
 
 
 def draw_span_bbox(pdf_info, pdf_bytes, out_path, filename):
@@ -365,9 +375,7 @@ def draw_span_bbox(pdf_info, pdf_bytes, out_path, filename):
 
         output_pdf.add_page(page)
 
-    # Save the PDF
-    with open(f"{out_path}/{filename}", "wb") as f:
-        output_pdf.write(f)
+    save_pdf(output_pdf, out_path, filename)
 
 
 def draw_line_sort_bbox(pdf_info, pdf_bytes, out_path, filename):
@@ -446,9 +454,7 @@ def draw_line_sort_bbox(pdf_info, pdf_bytes, out_path, filename):
 
         output_pdf.add_page(page)
 
-    # Save the PDF
-    with open(f"{out_path}/{filename}", "wb") as f:
-        output_pdf.write(f)
+    save_pdf(output_pdf, out_path, filename)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,13 @@
 # Copyright (c) Opendatalab. All rights reserved.
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
+from itertools import repeat
 
 import numpy as np
 import pypdfium2 as pdfium
@@ -35,14 +43,111 @@ def pdf_page_to_image(page: pdfium.PdfPage, dpi=200, image_type=ImageType.PIL) -
     return image_dict
 
 
+# 每个渲染进程至少分配的页数，页数太少时多进程的启动和传输开销大于收益
+MIN_PAGES_PER_RENDER_WORKER = 8
+
+_render_executors = {}
+_render_executors_lock = threading.Lock()
+
+# pdfium不是线程安全的，即使是不同的文档也不能在多个线程中同时调用，多线程场景下对pdfium的调用需要持有该锁
+pdfium_lock = threading.RLock()
+
+
+def get_pdf_render_workers():
+    """
+    渲染进程数，可通过环境变量MINERU_PDF_RENDER_WORKERS设置，默认为1，即在当前进程中渲染。
+    多进程渲染需要把整页图像传回主进程，并承担spawn进程的启动开销，端到端不一定更快，需要时再显式开启
+    """
+    workers = os.getenv('MINERU_PDF_RENDER_WORKERS')
+    if workers is not None:
+        return max(1, int(workers))
+    return 1
+
+
+def _get_render_executor(workers):
+    # pdfium句柄不是线程安全的，使用spawn方式的进程池，每个进程独立打开pdf
+    with _render_executors_lock:
+        if workers not in _render_executors:
+            _render_executors[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _render_executors[workers]
+
+
+def _drop_render_executor(workers, executor):
+    with _render_executors_lock:
+        if _render_executors.get(workers) is executor:
+            del _render_executors[workers]
+    executor.shutdown(wait=False)
+
+
+@atexit.register
+def _shutdown_render_executors():
+    with _render_executors_lock:
+        executors = list(_render_executors.values())
+        _render_executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_pages(pdf_bytes, page_indices, dpi, image_type):
+    # 逐页持锁，让其他线程的pdfium调用可以穿插执行
+    with pdfium_lock:
+        pdf_doc = pdfium.PdfDocument(pdf_bytes)
+    try:
+        images_list = []
+        for index in page_indices:
+            with pdfium_lock:
+                images_list.append(pdf_page_to_image(pdf_doc[index], dpi=dpi, image_type=image_type))
+        return images_list
+    finally:
+        with pdfium_lock:
+            pdf_doc.close()
+
+
+def render_pdf_pages(
+    pdf_bytes: bytes,
+    page_indices,
+    dpi=200,
+    image_type=ImageType.PIL,  # PIL or BASE64
+    workers=None,
+):
+    """按页码顺序渲染指定页面，页数足够多时分块交给多进程并行渲染，返回的列表与page_indices一一对应。"""
+    page_indices = list(page_indices)
+    if workers is None:
+        workers = get_pdf_render_workers()
+
+    task_workers = min(workers, len(page_indices) // MIN_PAGES_PER_RENDER_WORKER)
+    if task_workers <= 1:
+        return _render_pages(pdf_bytes, page_indices, dpi, image_type)
+
+    # 切成连续的页码块，块数多于进程数以平衡不同页面的渲染耗时
+    chunk_size = math.ceil(len(page_indices) / (task_workers * 2))
+    chunk_size = max(chunk_size, MIN_PAGES_PER_RENDER_WORKER // 2)
+    chunks = [page_indices[i:i + chunk_size] for i in range(0, len(page_indices), chunk_size)]
+
+    images_list = []
+    executor = _get_render_executor(workers)
+    try:
+        for chunk_images in executor.map(_render_pages, repeat(pdf_bytes), chunks, repeat(dpi), repeat(image_type)):
+            images_list.extend(chunk_images)
+    except BrokenProcessPool as e:
+        # 渲染进程崩溃通常是pdfium处理该文档时出错，不在当前进程中重试，避免拖垮整个服务；
+        # 丢弃损坏的进程池，后续文档使用新的进程池
+        _drop_render_executor(workers, executor)
+        raise RuntimeError(f"pdf render process crashed while rendering this document: {e}") from e
+    return images_list
+
+
 def load_images_from_pdf(
     pdf_bytes: bytes,
     dpi=200,
     start_page_id=0,
     end_page_id=None,
     image_type=ImageType.PIL,  # PIL or BASE64
+    workers=None,
 ):
-    images_list = []
     pdf_doc = pdfium.PdfDocument(pdf_bytes)
     pdf_page_num = len(pdf_doc)
     end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else pdf_page_num - 1
@@ -50,11 +155,9 @@ def load_images_from_pdf(
         logger.warning("end_page_id is out of range, use images length")
         end_page_id = pdf_page_num - 1
 
-    for index in range(0, pdf_page_num):
-        if start_page_id <= index <= end_page_id:
-            page = pdf_doc[index]
-            image_dict = pdf_page_to_image(page, dpi=dpi, image_type=image_type)
-            images_list.append(image_dict)
+    images_list = render_pdf_pages(
+        pdf_bytes, range(start_page_id, end_page_id + 1), dpi=dpi, image_type=image_type, workers=workers
+    )
 
     return images_list, pdf_doc
 
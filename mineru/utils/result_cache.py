@@ -0,0 +1,371 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from loguru import logger
+
+from mineru.utils.config_reader import (
+    get_formula_enable,
+    get_table_enable,
+    get_local_models_dir,
+    get_llm_aided_config,
+    get_reading_order_mode,
+)
+from mineru.utils.hash_utils import bytes_md5, dict_md5
+from mineru.version import __version__
+
+
+class ResultCache(ABC):
+    """解析结果缓存接口，自定义实现可通过 set_result_cache 注册。
+
+    缓存值为 {'middle_json': dict, 'model_output': list, 'images': {文件名: bytes}}
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> dict | None:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, middle_json, model_output, images: dict) -> None:
+        pass
+
+    @abstractmethod
+    def stats(self) -> dict:
+        pass
+
+
+class _DiskLRUCache:
+    """本地目录缓存的公共部分：按总大小做LRU淘汰，并统计命中率。
+
+    缓存项写入时先写到以'.'开头的临时路径再原子重命名，
+    因此多个进程共享同一个缓存目录也是安全的。
+    """
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 缓存项名称 -> size，按最近访问时间从旧到新排列
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_entries()
+
+    def _load_entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_path = os.path.join(self.cache_dir, name)
+            if name.startswith('.'):
+                # 上次异常退出残留的临时文件
+                _remove_path(entry_path)
+                continue
+            entries.append((os.path.getmtime(entry_path), name, _path_size(entry_path)))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._size += size
+        self._evict()
+
+    def _tmp_path(self, name):
+        return os.path.join(self.cache_dir, f'.{name}-{uuid.uuid4().hex}')
+
+    def _record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _record_hit(self, name):
+        with self._lock:
+            self.hits += 1
+            if name in self._entries:
+                self._entries.move_to_end(name)
+        try:
+            os.utime(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+    def _commit(self, tmp_path, name):
+        """将写好的临时路径重命名为正式缓存项，失败时返回False"""
+        try:
+            size = _path_size(tmp_path)
+            os.rename(tmp_path, os.path.join(self.cache_dir, name))
+        except OSError as e:
+            # 其他进程已经写入了同一个key，或者磁盘写入失败，放弃本次缓存
+            logger.debug(f'skip cache entry {name}: {e}')
+            _remove_path(tmp_path)
+            return False
+
+        with self._lock:
+            # 同一个key重复写入时文件被覆盖，先减去旧缓存项的大小
+            self._size -= self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._size += size
+            self._evict()
+        return True
+
+    def _evict(self):
+        while self._size > self.max_size and self._entries:
+            name, size = self._entries.popitem(last=False)
+            _remove_path(os.path.join(self.cache_dir, name))
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size': self._size,
+                'max_size': self.max_size,
+            }
+
+
+class DiskResultCache(_DiskLRUCache, ResultCache):
+    """基于本地目录的结果缓存，每个缓存项是 cache_dir 下以key命名的目录。"""
+
+    _MIDDLE_JSON_FILE = 'middle.json'
+    _MODEL_OUTPUT_FILE = 'model.json'
+    _IMAGES_DIR = 'images'
+
+    def get(self, key):
+        entry_dir = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry_dir, self._MIDDLE_JSON_FILE), 'r', encoding='utf-8') as f:
+                middle_json = json.load(f)
+            with open(os.path.join(entry_dir, self._MODEL_OUTPUT_FILE), 'r', encoding='utf-8') as f:
+                model_output = json.load(f)
+            images = {}
+            images_dir = os.path.join(entry_dir, self._IMAGES_DIR)
+            for image_name in os.listdir(images_dir):
+                with open(os.path.join(images_dir, image_name), 'rb') as f:
+                    images[image_name] = f.read()
+        except (OSError, ValueError):
+            self._record_miss()
+            return None
+
+        self._record_hit(key)
+        return {'middle_json': middle_json, 'model_output': model_output, 'images': images}
+
+    def put(self, key, middle_json, model_output, images):
+        tmp_dir = self._tmp_path(key)
+        images_dir = os.path.join(tmp_dir, self._IMAGES_DIR)
+        try:
+            os.makedirs(images_dir)
+            with open(os.path.join(tmp_dir, self._MIDDLE_JSON_FILE), 'w', encoding='utf-8') as f:
+                json.dump(middle_json, f, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, self._MODEL_OUTPUT_FILE), 'w', encoding='utf-8') as f:
+                json.dump(model_output, f, ensure_ascii=False)
+            for image_name, image_bytes in images.items():
+                with open(os.path.join(images_dir, image_name), 'wb') as f:
+                    f.write(image_bytes)
+        except OSError as e:
+            logger.debug(f'skip result cache {key}: {e}')
+            _remove_path(tmp_dir)
+            return
+        self._commit(tmp_dir, key)
+
+
+class PageCache(ABC):
+    """页面级推理结果缓存接口，缓存值为单页的 layout_dets 列表，自定义实现可通过 set_page_cache 注册。"""
+
+    @abstractmethod
+    def get(self, key: str) -> list | None:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, layout_dets: list) -> None:
+        pass
+
+    @abstractmethod
+    def stats(self) -> dict:
+        pass
+
+
+class DiskPageCache(_DiskLRUCache, PageCache):
+    """基于本地目录的页面缓存，每个缓存项是 cache_dir 下以key命名的json文件。"""
+
+    def get(self, key):
+        name = f'{key}.json'
+        try:
+            with open(os.path.join(self.cache_dir, name), 'r', encoding='utf-8') as f:
+                layout_dets = json.load(f)
+        except (OSError, ValueError):
+            self._record_miss()
+            return None
+
+        self._record_hit(name)
+        return layout_dets
+
+    def put(self, key, layout_dets):
+        name = f'{key}.json'
+        tmp_path = self._tmp_path(name)
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(layout_dets, f, ensure_ascii=False)
+        except (OSError, TypeError, ValueError) as e:
+            logger.debug(f'skip page cache {key}: {e}')
+            _remove_path(tmp_path)
+            return
+        self._commit(tmp_path, name)
+
+
+def _path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return _dir_size(path)
+
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _dir_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            size += os.path.getsize(os.path.join(root, file_name))
+    return size
+
+
+_result_cache = None
+_result_cache_initialized = False
+
+
+def get_result_cache() -> ResultCache | None:
+    """
+    获取全局结果缓存，未注册自定义实现时根据环境变量创建磁盘缓存：
+    MINERU_RESULT_CACHE_DIR 缓存目录，不设置则不启用缓存；
+    MINERU_RESULT_CACHE_MAX_SIZE 缓存总大小上限，单位MB，默认值为10240。
+    """
+    global _result_cache, _result_cache_initialized
+    if not _result_cache_initialized:
+        cache_dir = os.getenv('MINERU_RESULT_CACHE_DIR')
+        if cache_dir:
+            max_size = int(os.getenv('MINERU_RESULT_CACHE_MAX_SIZE', 10240)) * 1024 * 1024
+            _result_cache = DiskResultCache(cache_dir, max_size)
+            logger.info(f'result cache enabled: {cache_dir}, max size: {max_size // 1024 // 1024}MB')
+        _result_cache_initialized = True
+    return _result_cache
+
+
+def set_result_cache(result_cache: ResultCache | None):
+    """注册自定义的结果缓存实现，传入None关闭缓存"""
+    global _result_cache, _result_cache_initialized
+    _result_cache = result_cache
+    _result_cache_initialized = True
+
+
+def make_result_cache_key(
+        pdf_bytes,
+        backend,
+        parse_method,
+        lang,
+        formula_enable,
+        table_enable,
+        start_page_id=0,
+        end_page_id=None,
+        server_url=None,
+        **kwargs,
+):
+    """缓存key由文档内容hash和所有影响解析结果的参数、模型及配置共同决定"""
+    if end_page_id is not None and end_page_id < 0:
+        end_page_id = None
+    reading_order_mode = None
+    if backend == 'pipeline':
+        reading_order_mode = get_reading_order_mode()
+    else:
+        # vlm后端不使用parse_method和lang
+        parse_method, lang = 'vlm', None
+    if not backend.endswith('client'):
+        # 只有client模式的结果取决于服务地址
+        server_url = None
+    key_dict = {
+        'pdf_md5': bytes_md5(pdf_bytes),
+        'backend': backend,
+        'parse_method': parse_method,
+        'lang': lang,
+        'start_page_id': start_page_id,
+        'end_page_id': end_page_id,
+        'model_path': kwargs.get('model_path'),
+        'server_url': server_url,
+        'model': get_page_model_fingerprint(formula_enable, table_enable),
+        'llm_aided_config': get_llm_aided_config(),
+        'reading_order_mode': reading_order_mode,
+    }
+    return dict_md5(key_dict)
+
+
+def log_result_cache_stats(result_cache: ResultCache, start_time: float, hit_count: int, total: int):
+    stats = result_cache.stats()
+    logger.info(
+        f'result cache: {hit_count}/{total} docs hit in {round(time.time() - start_time, 3)}s, '
+        f"hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {stats['hit_rate']}"
+    )
+
+
+_page_cache = None
+_page_cache_initialized = False
+
+
+def get_page_cache() -> PageCache | None:
+    """
+    获取全局页面缓存，未注册自定义实现时根据环境变量创建磁盘缓存：
+    MINERU_PAGE_CACHE_DIR 缓存目录，不设置则不启用缓存；
+    MINERU_PAGE_CACHE_MAX_SIZE 缓存总大小上限，单位MB，默认值为2048。
+    """
+    global _page_cache, _page_cache_initialized
+    if not _page_cache_initialized:
+        cache_dir = os.getenv('MINERU_PAGE_CACHE_DIR')
+        if cache_dir:
+            max_size = int(os.getenv('MINERU_PAGE_CACHE_MAX_SIZE', 2048)) * 1024 * 1024
+            _page_cache = DiskPageCache(cache_dir, max_size)
+            logger.info(f'page cache enabled: {cache_dir}, max size: {max_size // 1024 // 1024}MB')
+        _page_cache_initialized = True
+    return _page_cache
+
+
+def set_page_cache(page_cache: PageCache | None):
+    """注册自定义的页面缓存实现，传入None关闭缓存"""
+    global _page_cache, _page_cache_initialized
+    _page_cache = page_cache
+    _page_cache_initialized = True
+
+
+def get_page_model_fingerprint(formula_enable, table_enable):
+    """模型和配置指纹，任何一项变化都会使已有的页面缓存失效"""
+    model_source = os.getenv('MINERU_MODEL_SOURCE', 'huggingface')
+    return dict_md5({
+        'formula_enable': get_formula_enable(formula_enable),
+        'table_enable': get_table_enable(table_enable),
+        'model_source': model_source,
+        'models_dir': get_local_models_dir() if model_source == 'local' else None,
+        'version': __version__,
+    })
+
+
+def make_page_cache_key(img_pil, ocr_enable, lang, model_fingerprint):
+    """页面缓存key由渲染后的页面位图hash、ocr设置、语言和模型指纹共同决定"""
+    return dict_md5({
+        'img_md5': bytes_md5(img_pil.tobytes()),
+        'img_size': list(img_pil.size),
+        'img_mode': img_pil.mode,
+        'ocr_enable': ocr_enable,
+        'lang': lang,
+        'model': model_fingerprint,
+    })
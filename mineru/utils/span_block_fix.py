@@ -1,7 +1,7 @@
 # Copyright (c) Opendatalab. All rights reserved.
-from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio
 from mineru.utils.enum_class import BlockType, ContentType
 from mineru.utils.ocr_utils import _is_overlaps_y_exceeds_threshold, _is_overlaps_x_exceeds_threshold
+from mineru.utils.spatial_index import BBoxGridIndex
 
 VERTICAL_SPAN_HEIGHT_TO_WIDTH_RATIO_THRESHOLD = 2
 VERTICAL_SPAN_IN_BLOCK_THRESHOLD = 0.8
@@ -9,7 +9,14 @@ VERTICAL_SPAN_IN_BLOCK_THRESHOLD = 0.8
 def fill_spans_in_blocks(blocks, spans, radio):
     """将allspans中的span按位置关系，放入blocks中."""
     block_with_spans = []
-    for block in blocks:
+    # 在span上建空间索引，每个block只和附近的span计算重叠比例，已放入block的span不再参与后续block的匹配
+    span_index = BBoxGridIndex([span['bbox'] for span in spans])
+    block_indices, span_indices = span_index.query_overlap_in_bbox1_area_ratio([block[0:4] for block in blocks], radio)
+    block_span_indices = [[] for _ in blocks]
+    for block_idx, span_idx in zip(block_indices.tolist(), span_indices.tolist()):
+        block_span_indices[block_idx].append(span_idx)
+    span_assigned = [False] * len(spans)
+    for block, candidate_span_indices in zip(blocks, block_span_indices):
         block_type = block[7]
         block_bbox = block[0:4]
         block_dict = {
@@ -22,19 +29,17 @@ def fill_spans_in_blocks(blocks, spans, radio):
         ]:
             block_dict['group_id'] = block[-1]
         block_spans = []
-        for span in spans:
-            span_bbox = span['bbox']
-            if calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > radio and span_block_type_compatible(
-                    span['type'], block_type):
+        for span_idx in candidate_span_indices:
+            span = spans[span_idx]
+            if not span_assigned[span_idx] and span_block_type_compatible(span['type'], block_type):
                 block_spans.append(span)
+                span_assigned[span_idx] = True
 
         block_dict['spans'] = block_spans
         block_with_spans.append(block_dict)
 
-        # 从spans删除已经放入block_spans中的span
-        if len(block_spans) > 0:
-            for span in block_spans:
-                spans.remove(span)
+    # 从spans删除已经放入block_spans中的span
+    spans[:] = [span for span, assigned in zip(spans, span_assigned) if not assigned]
 
     return block_with_spans, spans
 
@@ -7,11 +7,12 @@ import cv2
 import numpy as np
 from loguru import logger
 
-from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio, calculate_iou, \
-    get_minbox_if_overlap_by_ratio
+from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio_matrix, calculate_iou_pairs, \
+    calculate_overlap_area_2_minbox_area_ratio_pairs
 from mineru.utils.enum_class import BlockType, ContentType
 from mineru.utils.pdf_image_tools import get_crop_img
 from mineru.utils.pdf_text_tool import get_page
+from mineru.utils.spatial_index import BBoxGridIndex, any_overlap_in_bbox1_area_ratio
 
 
 def remove_outside_spans(spans, all_bboxes, all_discarded_blocks):
@@ -29,79 +30,125 @@ def remove_outside_spans(spans, all_bboxes, all_discarded_blocks):
     other_block_bboxes = get_block_bboxes(all_bboxes, other_block_type)
     discarded_block_bboxes = get_block_bboxes(all_discarded_blocks, [BlockType.DISCARDED])
 
+    # 每个span与各类block中任意一个的重叠比例是否超过阈值
+    span_index = BBoxGridIndex([span['bbox'] for span in spans])
+    in_discarded = any_overlap_in_bbox1_area_ratio(span_index, discarded_block_bboxes, 0.4)
+    in_image = any_overlap_in_bbox1_area_ratio(span_index, image_bboxes, 0.5)
+    in_table = any_overlap_in_bbox1_area_ratio(span_index, table_bboxes, 0.5)
+    in_other = any_overlap_in_bbox1_area_ratio(span_index, other_block_bboxes, 0.5)
+
     new_spans = []
 
-    for span in spans:
-        span_bbox = span['bbox']
+    for span_idx, span in enumerate(spans):
         span_type = span['type']
 
-        if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > 0.4 for block_bbox in
-               discarded_block_bboxes):
+        if in_discarded[span_idx]:
             new_spans.append(span)
             continue
 
         if span_type == ContentType.IMAGE:
-            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > 0.5 for block_bbox in
-                   image_bboxes):
+            if in_image[span_idx]:
                 new_spans.append(span)
         elif span_type == ContentType.TABLE:
-            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > 0.5 for block_bbox in
-                   table_bboxes):
+            if in_table[span_idx]:
                 new_spans.append(span)
         else:
-            if any(calculate_overlap_area_in_bbox1_area_ratio(span_bbox, block_bbox) > 0.5 for block_bbox in
-                   other_block_bboxes):
+            if in_other[span_idx]:
                 new_spans.append(span)
 
     return new_spans
 
 
+def _overlap_span_pairs(spans, pair_ratio_func, ratio):
+    """
+    用网格索引生成可能重叠的span对，返回比例超过ratio的(i, j)对。
+    顺序与对spans做双重循环的遍历顺序一致，比例不超过ratio的span对在原来的双重循环中不会产生任何删除。
+    """
+    span_index = BBoxGridIndex([span['bbox'] for span in spans])
+    pair_i, pair_j = span_index.query_pairs(span_index.bboxes)
+    pair_ratios = pair_ratio_func(span_index.bboxes[pair_i], span_index.bboxes[pair_j])
+    matched = pair_ratios > ratio
+    return zip(pair_i[matched].tolist(), pair_j[matched].tolist())
+
+
+def _bbox_key(bbox):
+    return type(bbox), tuple(bbox)
+
+
+def _span_equal_groups(spans):
+    """
+    list的==判断和remove都按值比较，值相等的span视为同一个。
+    返回每个span第一个与其值相等的span的序号，以及每个bbox第一次出现的span序号，用集合代替list的成员判断。
+    """
+    first_span_by_bbox = {}
+    same_bbox_spans = {}
+    span_groups = []
+    for idx, span in enumerate(spans):
+        key = _bbox_key(span['bbox'])
+        first_span_by_bbox.setdefault(key, idx)
+        candidates = same_bbox_spans.setdefault(key, [])
+        group = next((other for other in candidates if spans[other] == span), None)
+        if group is None:
+            candidates.append(idx)
+            group = idx
+        span_groups.append(group)
+    return span_groups, first_span_by_bbox
+
+
+def _remove_dropped_groups(spans, dropped_groups):
+    """与按dropped_spans逐个spans.remove一致：每组值相等的span只删除第一个"""
+    if len(dropped_groups) > 0:
+        spans[:] = [span for idx, span in enumerate(spans) if idx not in dropped_groups]
+    return spans
+
+
 def remove_overlaps_low_confidence_spans(spans):
     dropped_spans = []
+    dropped_groups = set()
+    span_groups, _ = _span_equal_groups(spans)
     #  删除重叠spans中置信度低的的那些
-    for span1 in spans:
-        for span2 in spans:
-            if span1 != span2:
-                # span1 或 span2 任何一个都不应该在 dropped_spans 中
-                if span1 in dropped_spans or span2 in dropped_spans:
-                    continue
+    for i, j in _overlap_span_pairs(spans, calculate_iou_pairs, 0.9):
+        if span_groups[i] != span_groups[j]:
+            # span1 或 span2 任何一个都不应该在 dropped_spans 中
+            if span_groups[i] in dropped_groups or span_groups[j] in dropped_groups:
+                continue
+            else:
+                if spans[i]['score'] < spans[j]['score']:
+                    remove_idx = i
                 else:
-                    if calculate_iou(span1['bbox'], span2['bbox']) > 0.9:
-                        if span1['score'] < span2['score']:
-                            span_need_remove = span1
-                        else:
-                            span_need_remove = span2
-                        if (
-                            span_need_remove is not None
-                            and span_need_remove not in dropped_spans
-                        ):
-                            dropped_spans.append(span_need_remove)
-
-    if len(dropped_spans) > 0:
-        for span_need_remove in dropped_spans:
-            spans.remove(span_need_remove)
+                    remove_idx = j
+                if span_groups[remove_idx] not in dropped_groups:
+                    dropped_groups.add(span_groups[remove_idx])
+                    dropped_spans.append(spans[remove_idx])
+
+    spans = _remove_dropped_groups(spans, dropped_groups)
 
     return spans, dropped_spans
 
 
 def remove_overlaps_min_spans(spans):
     dropped_spans = []
+    dropped_groups = set()
+    span_groups, first_span_by_bbox = _span_equal_groups(spans)
     #  删除重叠spans中较小的那些
-    for span1 in spans:
-        for span2 in spans:
-            if span1 != span2:
-                # span1 或 span2 任何一个都不应该在 dropped_spans 中
-                if span1 in dropped_spans or span2 in dropped_spans:
-                    continue
-                else:
-                    overlap_box = get_minbox_if_overlap_by_ratio(span1['bbox'], span2['bbox'], 0.65)
-                    if overlap_box is not None:
-                        span_need_remove = next((span for span in spans if span['bbox'] == overlap_box), None)
-                        if span_need_remove is not None and span_need_remove not in dropped_spans:
-                            dropped_spans.append(span_need_remove)
-    if len(dropped_spans) > 0:
-        for span_need_remove in dropped_spans:
-            spans.remove(span_need_remove)
+    for i, j in _overlap_span_pairs(spans, calculate_overlap_area_2_minbox_area_ratio_pairs, 0.65):
+        if span_groups[i] != span_groups[j]:
+            # span1 或 span2 任何一个都不应该在 dropped_spans 中
+            if span_groups[i] in dropped_groups or span_groups[j] in dropped_groups:
+                continue
+            else:
+                # 与get_minbox_if_overlap_by_ratio一致，面积相等时取span1的bbox
+                bbox1, bbox2 = spans[i]['bbox'], spans[j]['bbox']
+                area1 = (bbox1[2] - bbox1[0]) * (bbox1[3] - bbox1[1])
+                area2 = (bbox2[2] - bbox2[0]) * (bbox2[3] - bbox2[1])
+                overlap_box = bbox1 if area1 <= area2 else bbox2
+                # 第一个bbox与overlap_box相同的span
+                remove_idx = first_span_by_bbox[_bbox_key(overlap_box)]
+                if span_groups[remove_idx] not in dropped_groups:
+                    dropped_groups.add(span_groups[remove_idx])
+                    dropped_spans.append(spans[remove_idx])
+
+    spans = _remove_dropped_groups(spans, dropped_groups)
 
     return spans, dropped_spans
 
@@ -153,28 +200,41 @@ def txt_spans_extract(pdf_page, spans, pil_img, scale, all_bboxes, all_discarded
     unuseful_spans = []
     # 纵向span的两个特征：1. 高度超过多个line 2. 高宽比超过某个值
     vertical_spans = []
-    for span in spans:
-        if span['type'] in [ContentType.TEXT]:
-            for block in all_bboxes + all_discarded_blocks:
-                if block[7] in [BlockType.IMAGE_BODY, BlockType.TABLE_BODY, BlockType.INTERLINE_EQUATION]:
-                    continue
-                if calculate_overlap_area_in_bbox1_area_ratio(span['bbox'], block[0:4]) > 0.5:
-                    if span['height'] > median_span_height * 3 and span['height'] > span['width'] * 3:
-                        vertical_spans.append(span)
-                    elif block in all_bboxes:
-                        useful_spans.append(span)
-                    else:
-                        unuseful_spans.append(span)
-                    break
+    text_spans = [span for span in spans if span['type'] in [ContentType.TEXT]]
+    candidate_blocks = [
+        block for block in all_bboxes + all_discarded_blocks
+        if block[7] not in [BlockType.IMAGE_BODY, BlockType.TABLE_BODY, BlockType.INTERLINE_EQUATION]
+    ]
+    # 按block顺序查询，每个span取第一个满足条件的block
+    span_block_idx = [None] * len(text_spans)
+    text_span_index = BBoxGridIndex([span['bbox'] for span in text_spans])
+    block_indices, span_indices = text_span_index.query_overlap_in_bbox1_area_ratio(
+        [block[0:4] for block in candidate_blocks], 0.5
+    )
+    for block_idx, span_idx in zip(block_indices.tolist(), span_indices.tolist()):
+        if span_block_idx[span_idx] is None:
+            span_block_idx[span_idx] = block_idx
+    for span, block_idx in zip(text_spans, span_block_idx):
+        if block_idx is None:
+            continue
+        block = candidate_blocks[block_idx]
+        if span['height'] > median_span_height * 3 and span['height'] > span['width'] * 3:
+            vertical_spans.append(span)
+        elif block in all_bboxes:
+            useful_spans.append(span)
+        else:
+            unuseful_spans.append(span)
 
     """垂直的span框直接用line进行填充"""
     if len(vertical_spans) > 0:
-        for pdfium_line in page_all_lines:
-            for span in vertical_spans:
-                if calculate_overlap_area_in_bbox1_area_ratio(pdfium_line['bbox'].bbox, span['bbox']) > 0.5:
-                    for pdfium_span in pdfium_line['spans']:
-                        span['content'] += pdfium_span['text']
-                    break
+        line_in_span = calculate_overlap_area_in_bbox1_area_ratio_matrix(
+            [pdfium_line['bbox'].bbox for pdfium_line in page_all_lines], [span['bbox'] for span in vertical_spans]
+        ) > 0.5
+        for pdfium_line, span_mask in zip(page_all_lines, line_in_span):
+            if span_mask.any():
+                span = vertical_spans[span_mask.argmax()]
+                for pdfium_span in pdfium_line['spans']:
+                    span['content'] += pdfium_span['text']
 
         for span in vertical_spans:
             if len(span['content']) == 0:
@@ -0,0 +1,127 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import numpy as np
+
+from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio_pairs
+
+
+class BBoxGridIndex:
+    """
+    页面级的均匀网格空间索引，每个bbox登记到它覆盖的所有网格中，查询时只返回与查询框落在相同网格的bbox。
+    网格边长默认取bbox宽高中位数的较大值，单个bbox覆盖的网格数近似为常数，建索引和查询的开销与bbox数量近似线性。
+    查询一次处理一组查询框，网格的登记和匹配全部用numpy完成，没有逐个bbox的python循环。
+    """
+
+    # 覆盖网格数超过该值的bbox不登记到网格中，与所有查询框都组成候选对
+    MAX_CELLS_PER_BBOX = 1024
+
+    def __init__(self, bboxes, cell_size=None):
+        self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        self.cell_size = cell_size if cell_size is not None else self._default_cell_size(self.bboxes)
+
+        col0, row0, col1, row1 = self._cell_ranges(self.bboxes)
+        cell_counts = (col1 - col0 + 1) * (row1 - row0 + 1)
+        # 坐标颠倒的bbox与任何bbox的重叠面积都为0，不需要登记
+        valid = (col1 >= col0) & (row1 >= row0)
+        large = valid & (cell_counts > self.MAX_CELLS_PER_BBOX)
+        self._large_indices = np.nonzero(large)[0]
+
+        grid_indices = np.nonzero(valid & ~large)[0]
+        if len(grid_indices) > 0:
+            self._col_min, self._col_max = col0[grid_indices].min(), col1[grid_indices].max()
+            self._row_min, self._row_max = row0[grid_indices].min(), row1[grid_indices].max()
+        else:
+            self._col_min, self._col_max, self._row_min, self._row_max = 0, -1, 0, -1
+        cell_keys, owners = self._expand_cells(
+            col0[grid_indices], row0[grid_indices], col1[grid_indices], row1[grid_indices]
+        )
+        order = np.argsort(cell_keys, kind='stable')
+        self._cell_keys = cell_keys[order]
+        self._cell_owners = grid_indices[owners[order]]
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    @staticmethod
+    def _default_cell_size(bboxes):
+        if len(bboxes) == 0:
+            return 1.0
+        widths = bboxes[:, 2] - bboxes[:, 0]
+        heights = bboxes[:, 3] - bboxes[:, 1]
+        # 正方形网格，避免扁长的文本span把网格切得过细导致查询时要匹配大量网格
+        return max(float(np.median(widths)), float(np.median(heights)), 1.0)
+
+    def _cell_ranges(self, bboxes):
+        cells = np.floor(bboxes / self.cell_size).astype(np.int64)
+        return cells[:, 0], cells[:, 1], cells[:, 2], cells[:, 3]
+
+    def _expand_cells(self, col0, row0, col1, row1):
+        """展开每个bbox覆盖的网格，返回网格编号和对应的bbox序号"""
+        rows = row1 - row0 + 1
+        counts = (col1 - col0 + 1) * rows
+        owners = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cols = col0[owners] + offsets // rows[owners]
+        cell_rows = row0[owners] + offsets % rows[owners]
+        cell_keys = (cols - self._col_min) * (self._row_max - self._row_min + 1) + (cell_rows - self._row_min)
+        return cell_keys, owners
+
+    def query_pairs(self, query_bboxes):
+        """
+        返回可能相交的(查询框序号, 索引中bbox序号)候选对，按查询框序号、bbox序号升序排列且不重复。
+        候选对包含所有与查询框相交(包括边重合)的bbox，调用方再用boxbase中的函数精确计算。
+        """
+        query_bboxes = np.asarray(query_bboxes, dtype=np.float64).reshape(-1, 4)
+        col0, row0, col1, row1 = self._cell_ranges(query_bboxes)
+        # 查询范围裁剪到已登记的网格范围内，超出部分没有任何bbox
+        col0, col1 = np.maximum(col0, self._col_min), np.minimum(col1, self._col_max)
+        row0, row1 = np.maximum(row0, self._row_min), np.minimum(row1, self._row_max)
+        query_indices = np.nonzero((col1 >= col0) & (row1 >= row0))[0]
+
+        cell_keys, owners = self._expand_cells(
+            col0[query_indices], row0[query_indices], col1[query_indices], row1[query_indices]
+        )
+        # 每个查询网格在已登记网格中的区间[lo, hi)
+        lo = np.searchsorted(self._cell_keys, cell_keys, side='left')
+        hi = np.searchsorted(self._cell_keys, cell_keys, side='right')
+        counts = hi - lo
+        pair_queries = np.repeat(query_indices[owners], counts)
+        pair_positions = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_items = self._cell_owners[pair_positions]
+
+        if len(self._large_indices) > 0:
+            pair_queries = np.concatenate([
+                pair_queries, np.repeat(np.arange(len(query_bboxes)), len(self._large_indices))
+            ])
+            pair_items = np.concatenate([pair_items, np.tile(self._large_indices, len(query_bboxes))])
+
+        item_count = max(len(self.bboxes), 1)
+        pair_keys = np.unique(pair_queries * item_count + pair_items)
+        return pair_keys // item_count, pair_keys % item_count
+
+    def query_overlap_in_bbox1_area_ratio(self, query_bboxes, ratio):
+        """
+        返回满足条件的(查询框序号, 索引中bbox序号)对，按查询框序号、bbox序号升序排列。
+        条件为bbox与查询框的重叠面积占bbox自身面积的比例超过ratio，
+        与逐对调用calculate_overlap_area_in_bbox1_area_ratio(indexed_bbox, query_bbox)的结果一致。
+        """
+        query_bboxes = np.asarray(query_bboxes, dtype=np.float64).reshape(-1, 4)
+        pair_queries, pair_items = self.query_pairs(query_bboxes)
+        overlap_ratios = calculate_overlap_area_in_bbox1_area_ratio_pairs(
+            self.bboxes[pair_items], query_bboxes[pair_queries]
+        )
+        matched = overlap_ratios > ratio
+        return pair_queries[matched], pair_items[matched]
+
+
+def any_overlap_in_bbox1_area_ratio(bboxes1, bboxes2, ratio):
+    """
+    对bboxes1中的每个bbox，判断bboxes2中是否存在一个bbox，使两者重叠面积占bboxes1中bbox面积的比例超过ratio。
+    bboxes1可以直接传入已经建好的BBoxGridIndex，避免计算完整的(N,M)矩阵。
+    """
+    index = bboxes1 if isinstance(bboxes1, BBoxGridIndex) else BBoxGridIndex(bboxes1)
+    result = np.zeros(len(index), dtype=bool)
+    if len(index) == 0 or len(bboxes2) == 0:
+        return result
+    _, matched_items = index.query_overlap_in_bbox1_area_ratio(bboxes2, ratio)
+    result[matched_items] = True
+    return result
@@ -6,15 +6,17 @@ import litserve as ls
 from fastapi import HTTPException
 from loguru import logger
 
+from mineru.backend.pipeline.model_warmup import get_preload_langs, warmup_models
 from mineru.cli.common import do_parse, read_fn
 from mineru.utils.config_reader import get_device
 from mineru.utils.model_utils import get_vram
 from _config_endpoint import config_endpoint
 
 class MinerUAPI(ls.LitAPI):
-    def __init__(self, output_dir='/tmp'):
+    def __init__(self, output_dir='/tmp', preload_langs=None):
         super().__init__()
         self.output_dir = output_dir
+        self.preload_langs = preload_langs
 
     def setup(self, device):
         """Setup environment variables exactly like MinerU CLI does"""
@@ -36,6 +38,11 @@ class MinerUAPI(ls.LitAPI):
             config_endpoint()
         logger.info(f"MINERU_MODEL_SOURCE: {os.environ['MINERU_MODEL_SOURCE']}")
 
+        # setup结束后worker才会被标记为就绪，在这里完成模型预热
+        preload_langs = get_preload_langs(self.preload_langs)
+        if preload_langs:
+            warmup_models(preload_langs)
+
 
     def decode_request(self, request):
         """Decode file and options from request"""
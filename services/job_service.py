@@ -0,0 +1,298 @@
+from pathlib import Path
+from fastapi import UploadFile
+import asyncio
+import os
+import json
+import shutil
+import threading
+import time
+import uuid
+from itertools import groupby
+from typing import Optional
+
+import pypdfium2 as pdfium
+
+from configs.base_config import MAGIC_PDF_IMG_URL, VLLM_CONFIG, JOB_CONFIG
+
+from domain.dto.base_dto import BaseResultModel
+from domain.dto.output.magic_pdf_parse_main_output import ImageData
+from domain.dto.output.job_output import JobSubmitOutput, JobStatusOutput, JobPageOutput
+
+from mineru.cli.common import aio_do_parse, do_parse, file_bytes_to_pdf_bytes, pdf_suffixes, image_suffixes
+from mineru.utils.pdf_image_tools import pdfium_lock
+
+from services.job_store import JobStatus, create_job_store, new_job
+from services.pdf_service import read_md_dump, get_infer_result, render_debug_pdf, DEBUG_PDF_DRAWERS
+
+from loguru import logger
+
+JOB_OUTPUT_PATH = os.path.join("temp_files", "jobs")
+
+_job_store = None
+_job_queue = None
+_job_workers = []
+_last_job_cleanup = 0.0
+
+
+def get_job_store():
+    global _job_store
+    if _job_store is None:
+        _job_store = create_job_store(JOB_CONFIG)
+    return _job_store
+
+
+def prune_jobs(force: bool=False):
+    """删除超过保留时间的已结束任务及其输出目录，非force时两次清理的间隔不小于cleanup_interval"""
+    global _last_job_cleanup
+    now = time.time()
+    if not force and now - _last_job_cleanup < JOB_CONFIG.get("cleanup_interval", 600):
+        return
+    _last_job_cleanup = now
+    store = get_job_store()
+    for job in store.list_finished_before(now - JOB_CONFIG.get("retention_seconds", 24 * 3600)):
+        store.delete(job["job_id"])
+        shutil.rmtree(job["output_dir"], ignore_errors=True)
+        logger.info(f"job {job['job_id']} expired and removed")
+
+
+def _ensure_workers():
+    """首次提交任务时在当前事件循环中启动固定数量的worker"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = asyncio.Queue(maxsize=JOB_CONFIG.get("max_queue_size", 100))
+        for index in range(JOB_CONFIG.get("max_workers", 1)):
+            _job_workers.append(asyncio.create_task(_job_worker(index)))
+    return _job_queue
+
+
+def _get_parse_dir(job: dict) -> str:
+    pdf_name = Path(job["file_name"]).stem
+    parse_method = job["parse_method"] if job["backend"].startswith("pipeline") else "vlm"
+    return os.path.join(job["output_dir"], pdf_name, parse_method)
+
+
+def _count_pages(pdf_bytes: bytes, start_page_id: int, end_page_id) -> int:
+    with pdfium_lock:
+        pdf_doc = pdfium.PdfDocument(pdf_bytes)
+        page_count = len(pdf_doc)
+        pdf_doc.close()
+    end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else page_count - 1
+    end_page_id = min(end_page_id, page_count - 1)
+    return max(end_page_id - start_page_id + 1, 0)
+
+
+async def submit_job(
+    file:UploadFile,
+    parse_method: str="auto",
+    lang_list: list[str] = ["ch"],
+    backend="vlm-sglang-engine",
+    formula_enable=True,
+    table_enable=True,
+    server_url=None,
+    start_page_id=0,
+    end_page_id=None,
+    ) ->BaseResultModel:
+
+    """
+    提交异步解析任务，立即返回任务id，任务由后台worker按提交顺序执行
+    :param file: 上传的 pdf 或图片文件
+    :param parse_method: 解析方法， 共 auto、ocr、txt 三种，默认 auto，如果效果不好，可以尝试 ocr
+    :param lang_list: 语言列表
+    :param backend: 解析后端，"pipeline", "vlm-transformers", "vlm-sglang-engine", "vlm-sglang-client"
+    :param formula_enable: Enable formula parsing
+    :param table_enable: Enable table parsing
+    :param server_url: Server URL for vlm-sglang-client backend
+    :param start_page_id: Start page ID for parsing, default is 0
+    :param end_page_id: End page ID for parsing, default is None (parse all pages until the end of the document)
+    """
+
+    result=BaseResultModel()
+    prune_jobs()
+
+    file_path = Path(file.filename)
+    if file_path.suffix.lower() not in pdf_suffixes + image_suffixes:
+        logger.error(f"Unsupported file type: {file_path.suffix}")
+        result.code=400
+        result.msg="不支持的文件类型"
+        return result
+
+    job_queue = _ensure_workers()
+    if job_queue.full():
+        result.code=503
+        result.msg="任务队列已满，请稍后重试"
+        return result
+
+    try:
+        # 上传内容直接在内存中转换，不写临时文件
+        content = await file.read()
+        pdf_bytes = file_bytes_to_pdf_bytes(content, file_path.suffix.lower())
+    except Exception as e:
+        logger.exception(f"Failed to load file: {str(e)}")
+        result.code=500
+        result.msg="处理异常"
+        return result
+
+    job_id = str(uuid.uuid4())
+    output_dir = os.path.join(JOB_OUTPUT_PATH, job_id)
+    os.makedirs(output_dir, exist_ok=True)
+
+    store = get_job_store()
+    store.create(new_job(job_id, file_path.name, backend, parse_method, output_dir))
+    job_queue.put_nowait((job_id, pdf_bytes, {
+        "p_lang_list": [lang_list[0] if lang_list else "ch"],
+        "backend": backend,
+        "parse_method": parse_method,
+        "formula_enable": formula_enable,
+        "table_enable": table_enable,
+        "server_url": server_url,
+        "start_page_id": start_page_id,
+        "end_page_id": end_page_id,
+    }))
+
+    result.data = JobSubmitOutput(job_id=job_id)
+    return result
+
+
+async def _job_worker(index: int):
+    while True:
+        job_id, pdf_bytes, parse_args = await _job_queue.get()
+        try:
+            await _run_job(job_id, pdf_bytes, parse_args)
+        except Exception as e:
+            logger.exception(e)
+            get_job_store().update(job_id, status=JobStatus.FAILED, error=str(e))
+        finally:
+            _job_queue.task_done()
+
+
+async def _run_job(job_id: str, pdf_bytes: bytes, parse_args: dict):
+    store = get_job_store()
+    job = store.get(job_id)
+    pdf_name = Path(job["file_name"]).stem
+
+    total_pages = _count_pages(pdf_bytes, parse_args["start_page_id"], parse_args["end_page_id"])
+    store.update(job_id, status=JobStatus.RUNNING, total_pages=total_pages)
+
+    # 进度回调可能在解析线程中执行
+    pages_done = set()
+    pages_done_lock = threading.Lock()
+
+    def progress_callback(pdf_file_name, page_idx):
+        with pages_done_lock:
+            pages_done.add(page_idx)
+            done_count = len(pages_done)
+        store.update(job_id, pages_done=done_count)
+
+    parse_kwargs = dict(
+        output_dir=job["output_dir"],
+        pdf_file_names=[pdf_name],
+        pdf_bytes_list=[pdf_bytes],
+        f_draw_layout_bbox=False,
+        f_draw_span_bbox=False,
+        f_dump_md=False,
+        # middle_json和原始pdf用于按需渲染调试pdf
+        f_dump_middle_json=True,
+        f_dump_model_output=False,
+        f_dump_orig_pdf=True,
+        f_dump_content_list=True,
+        progress_callback=progress_callback,
+        **parse_args,
+        **(VLLM_CONFIG or {}),
+    )
+    if parse_args["backend"].startswith("pipeline"):
+        # pipeline后端是同步实现，放到线程中执行避免阻塞事件循环
+        await asyncio.to_thread(do_parse, **parse_kwargs)
+    else:
+        await aio_do_parse(**parse_kwargs)
+
+    # 段落合并和跨页表格合并需要整篇文档，文档完成后再按页拆分结果
+    content_list = json.loads(get_infer_result("_content_list.json", pdf_name, _get_parse_dir(job)) or "[]")
+    for page_idx, page_content_list in groupby(content_list, key=lambda item: item["page_idx"]):
+        store.put_page(job_id, page_idx, list(page_content_list))
+
+    store.update(job_id, status=JobStatus.SUCCEEDED, pages_done=total_pages)
+    logger.info(f"job {job_id} finished, {total_pages} pages")
+
+
+def get_job_status(job_id: str) ->BaseResultModel:
+    result=BaseResultModel()
+    prune_jobs()
+    store = get_job_store()
+    job = store.get(job_id)
+    if job is None:
+        result.code=404
+        result.msg="任务不存在"
+        return result
+
+    result.data = JobStatusOutput(
+        job_id=job["job_id"],
+        status=job["status"],
+        file_name=job["file_name"],
+        total_pages=job["total_pages"],
+        pages_done=job["pages_done"],
+        pages_ready=store.list_pages(job_id),
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+    return result
+
+
+def get_job_page(job_id: str, page_idx: int) ->BaseResultModel:
+    result=BaseResultModel()
+    store = get_job_store()
+    job = store.get(job_id)
+    if job is None:
+        result.code=404
+        result.msg="任务不存在"
+        return result
+
+    page_content_list = store.get_page(job_id, page_idx)
+    if page_content_list is None:
+        if job["status"] == JobStatus.SUCCEEDED:
+            # 没有可提取内容的空白页
+            page_content_list = []
+        else:
+            result.code=202
+            result.msg="该页尚未完成"
+            return result
+
+    output_image_path_url = os.path.join(_get_parse_dir(job), "images").replace("\\", "/")
+    images = [
+        ImageData(name=os.path.basename(item["img_path"]), url=f"{MAGIC_PDF_IMG_URL}/{output_image_path_url}/{os.path.basename(item['img_path'])}")
+        for item in page_content_list if item.get("img_path")
+    ]
+    result.data = JobPageOutput(page_idx=page_idx, content_list=page_content_list, images=images)
+    return result
+
+
+async def get_job_result(job_id: str) ->BaseResultModel:
+    result=BaseResultModel()
+    store = get_job_store()
+    job = store.get(job_id)
+    if job is None:
+        result.code=404
+        result.msg="任务不存在"
+        return result
+    if job["status"] == JobStatus.FAILED:
+        result.code=500
+        result.msg=f"处理异常: {job['error']}"
+        return result
+    if job["status"] != JobStatus.SUCCEEDED:
+        result.code=202
+        result.msg="任务尚未完成"
+        return result
+
+    content_list = [
+        item for page_idx in store.list_pages(job_id) for item in store.get_page(job_id, page_idx)
+    ]
+    result.data = await read_md_dump(os.path.join(_get_parse_dir(job), "images"), json.dumps(content_list))
+    return result
+
+
+def get_job_debug_pdf(job_id: str, kind: str="layout") -> Optional[str]:
+    """按需渲染已完成任务的版面/span调试pdf，返回文件路径"""
+    job = get_job_store().get(job_id)
+    if job is None or job["status"] != JobStatus.SUCCEEDED or kind not in DEBUG_PDF_DRAWERS:
+        return None
+    return render_debug_pdf(_get_parse_dir(job), Path(job["file_name"]).stem, kind)
@@ -0,0 +1,181 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+
+class JobStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+# 已结束的任务状态，超过保留时间后可以被清理
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+JOB_FIELDS = [
+    "job_id", "status", "file_name", "backend", "parse_method", "output_dir",
+    "total_pages", "pages_done", "error", "created_at", "updated_at",
+]
+
+
+def new_job(job_id: str, file_name: str, backend: str, parse_method: str, output_dir: str) -> dict:
+    now = time.time()
+    return {
+        "job_id": job_id,
+        "status": JobStatus.PENDING,
+        "file_name": file_name,
+        "backend": backend,
+        "parse_method": parse_method,
+        "output_dir": output_dir,
+        "total_pages": 0,
+        "pages_done": 0,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class MemoryJobStore:
+    """内存任务存储，服务重启后任务记录丢失"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._pages = {}
+
+    def create(self, job: dict):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+            self._pages[job["job_id"]] = {}
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def put_page(self, job_id: str, page_idx: int, content_list: List[dict]):
+        with self._lock:
+            if job_id in self._pages:
+                self._pages[job_id][page_idx] = content_list
+
+    def get_page(self, job_id: str, page_idx: int) -> Optional[List[dict]]:
+        with self._lock:
+            return self._pages.get(job_id, {}).get(page_idx)
+
+    def list_pages(self, job_id: str) -> List[int]:
+        with self._lock:
+            return sorted(self._pages.get(job_id, {}))
+
+    def list_finished_before(self, before: float) -> List[dict]:
+        with self._lock:
+            return [
+                dict(job) for job in self._jobs.values()
+                if job["status"] in FINISHED_STATUSES and job["updated_at"] < before
+            ]
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._pages.pop(job_id, None)
+
+
+class SqliteJobStore:
+    """SQLite任务存储，任务记录和每页结果持久化到本地文件"""
+
+    def __init__(self, db_path: str):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # 进度回调在解析线程中执行，连接需要跨线程使用，由_lock保证串行访问
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT, file_name TEXT, backend TEXT, parse_method TEXT, "
+                "output_dir TEXT, total_pages INTEGER, pages_done INTEGER, error TEXT, "
+                "created_at REAL, updated_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_pages ("
+                "job_id TEXT, page_idx INTEGER, content_list TEXT, PRIMARY KEY (job_id, page_idx))"
+            )
+            # 服务重启时未完成的任务不会再被执行
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ? WHERE status IN (?, ?)",
+                (JobStatus.FAILED, "server restarted", JobStatus.PENDING, JobStatus.RUNNING),
+            )
+
+    def create(self, job: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' * len(JOB_FIELDS))})",
+                [job[field] for field in JOB_FIELDS],
+            )
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        for field in fields:
+            if field not in JOB_FIELDS:
+                raise ValueError(f"unknown job field: {field}")
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{field} = ?' for field in fields)} WHERE job_id = ?",
+                [*fields.values(), job_id],
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def put_page(self, job_id: str, page_idx: int, content_list: List[dict]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_pages (job_id, page_idx, content_list) VALUES (?, ?, ?)",
+                (job_id, page_idx, json.dumps(content_list, ensure_ascii=False)),
+            )
+
+    def get_page(self, job_id: str, page_idx: int) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_list FROM job_pages WHERE job_id = ? AND page_idx = ?", (job_id, page_idx)
+            ).fetchone()
+        return json.loads(row["content_list"]) if row is not None else None
+
+    def list_pages(self, job_id: str) -> List[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page_idx FROM job_pages WHERE job_id = ? ORDER BY page_idx", (job_id,)
+            ).fetchall()
+        return [row["page_idx"] for row in rows]
+
+    def list_finished_before(self, before: float) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) AND updated_at < ?",
+                (*FINISHED_STATUSES, before),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, job_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM job_pages WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+
+def create_job_store(config: dict):
+    if config.get("store", "memory") == "sqlite":
+        return SqliteJobStore(config.get("sqlite_path", "temp_files/jobs.db"))
+    return MemoryJobStore()
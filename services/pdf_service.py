@@ -6,18 +6,21 @@ from fastapi.responses import JSONResponse
 import os
 import json
 import io
+import time
 import uuid
 from typing import List, Optional
 from glob import glob
 from base64 import b64encode
 
-from configs.base_config import MAGIC_PDF_IMG_URL, VLLM_CONFIG
+from configs.base_config import MAGIC_PDF_IMG_URL, VLLM_CONFIG, DEBUG_PDF_CONFIG
 
 from domain.dto.base_dto import BaseResultModel
 from domain.dto.output.magic_pdf_parse_main_output import ImageData, MagicPdfParseMainOutput
 
 from mineru.utils.enum_class import MakeMode
-from mineru.cli.common import aio_do_parse, read_fn, pdf_suffixes, image_suffixes
+from mineru.cli.common import aio_do_parse, file_bytes_to_pdf_bytes, pdf_suffixes, image_suffixes
+from mineru.data.data_reader_writer import FileBasedDataWriter
+from mineru.utils.draw_bbox import draw_layout_bbox, draw_span_bbox
 
 from loguru import logger
 
@@ -39,6 +42,116 @@ async def read_md_dump(output_image_path, content_list)-> MagicPdfParseMainOutpu
 
     return MagicPdfParseMainOutput(content_list=de_content_list, images=images)         
 
+def make_parse_main_output(output_image_path, parse_result)-> MagicPdfParseMainOutput:
+    """由内存中的解析结果构建返回值，不读取磁盘"""
+    output_image_path_url=output_image_path.replace("\\", "/")
+    images = [
+        ImageData(name=filename, url=f"{MAGIC_PDF_IMG_URL}/{output_image_path_url}/{filename}")
+        for filename in parse_result["images"]
+    ]
+    return MagicPdfParseMainOutput(content_list=parse_result["content_list"], images=images)
+
+def write_debug_source(md_writer: FileBasedDataWriter, pdf_name: str, parse_result: dict, saved_files: dict):
+    """保存渲染调试pdf所需的middle_json和原始pdf，已经保存过的文件不重复写入"""
+    if f"{pdf_name}_middle.json" not in saved_files:
+        md_writer.write_string(f"{pdf_name}_middle.json", json.dumps(parse_result["middle_json"], ensure_ascii=False))
+    if f"{pdf_name}_origin.pdf" not in saved_files:
+        md_writer.write(f"{pdf_name}_origin.pdf", parse_result["pdf_bytes"])
+
+DEBUG_PDF_DRAWERS = {
+    "layout": draw_layout_bbox,
+    "span": draw_span_bbox,
+}
+
+# 未保存到本地的解析结果，其调试文件单独存放在该目录下，按 DEBUG_PDF_CONFIG 的保留时间清理
+DEBUG_OUTPUT_PATH = os.path.join("temp_files", "debug")
+
+# 保存到本地的解析结果可能位于自定义的local_output_path下，按result_id记录其输出目录，供 get_debug_pdf 查找
+RESULT_INDEX_PATH = os.path.join("temp_files", "result_index")
+
+_last_debug_cleanup = 0.0
+
+def cleanup_debug_output(force: bool=False):
+    """删除超过保留时间的调试文件目录，非force时两次清理的间隔不小于cleanup_interval"""
+    global _last_debug_cleanup
+    now = time.time()
+    if not force and now - _last_debug_cleanup < DEBUG_PDF_CONFIG.get("cleanup_interval", 600):
+        return
+    _last_debug_cleanup = now
+    if not os.path.isdir(DEBUG_OUTPUT_PATH):
+        return
+    expire_time = now - DEBUG_PDF_CONFIG.get("retention_seconds", 24 * 3600)
+    for result_id in os.listdir(DEBUG_OUTPUT_PATH):
+        result_dir = os.path.join(DEBUG_OUTPUT_PATH, result_id)
+        try:
+            if os.path.getmtime(result_dir) < expire_time:
+                shutil.rmtree(result_dir, ignore_errors=True)
+        except OSError:
+            continue
+
+def record_result_dir(result_id: str, result_dir: str):
+    """记录某次解析结果保存到本地的目录"""
+    os.makedirs(RESULT_INDEX_PATH, exist_ok=True)
+    with open(os.path.join(RESULT_INDEX_PATH, result_id), "w", encoding="utf-8") as f:
+        f.write(os.path.abspath(result_dir))
+
+def get_result_dir(result_id: str, local_output_path: str="temp_files") -> str:
+    """获取某次解析结果保存到本地的目录，没有记录时按默认的local_output_path查找"""
+    index_path = os.path.join(RESULT_INDEX_PATH, result_id)
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            return f.read()
+    return os.path.join(local_output_path, result_id)
+
+def render_debug_pdf(parse_dir: str, pdf_name: str, kind: str="layout") -> Optional[str]:
+    """
+    根据保存的middle_json按需渲染版面/span调试pdf，渲染结果保存在parse_dir中，重复请求直接复用
+    :return: 调试pdf路径，缺少middle_json或该后端不支持时返回None
+    """
+    debug_pdf_name = f"{pdf_name}_{kind}.pdf"
+    debug_pdf_path = os.path.join(parse_dir, debug_pdf_name)
+    if os.path.exists(debug_pdf_path):
+        return debug_pdf_path
+
+    middle_json_path = os.path.join(parse_dir, f"{pdf_name}_middle.json")
+    origin_pdf_path = os.path.join(parse_dir, f"{pdf_name}_origin.pdf")
+    if not os.path.exists(middle_json_path) or not os.path.exists(origin_pdf_path):
+        return None
+
+    with open(middle_json_path, "r", encoding="utf-8") as f:
+        middle_json = json.load(f)
+    if kind == "span" and middle_json.get("_backend") != "pipeline":
+        # vlm后端没有span信息
+        return None
+    with open(origin_pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    DEBUG_PDF_DRAWERS[kind](middle_json["pdf_info"], pdf_bytes, FileBasedDataWriter(parse_dir), debug_pdf_name)
+    return debug_pdf_path
+
+def get_debug_pdf(result_id: str, pdf_name: str, kind: str="layout", local_output_path: str="temp_files") -> Optional[str]:
+    """
+    获取magic_pdf_parse_main某次解析结果的调试pdf
+    :param result_id: 解析结果id，即返回值中的result_id
+    :param pdf_name: 不含后缀的文件名
+    :param kind: layout 或 span
+    """
+    if kind not in DEBUG_PDF_DRAWERS:
+        return None
+    try:
+        uuid.UUID(result_id)
+    except ValueError:
+        return None
+    if Path(pdf_name).name != pdf_name:
+        return None
+
+    debug_dir = os.path.join(DEBUG_OUTPUT_PATH, result_id, pdf_name)
+    if os.path.isdir(debug_dir):
+        return render_debug_pdf(debug_dir, pdf_name, kind)
+    for middle_json_path in glob(os.path.join(get_result_dir(result_id, local_output_path), pdf_name, "*", f"{pdf_name}_middle.json")):
+        return render_debug_pdf(os.path.dirname(middle_json_path), pdf_name, kind)
+    return None
+
 def encode_image(image_path: str) -> str:
     """Encode image using base64"""
     with open(image_path, "rb") as f:
@@ -69,6 +182,7 @@ async def magic_pdf_parse_main(
     return_images=False,
     start_page_id=0,
     end_page_id=None,
+    draw_debug=False,
     config={}
     ) ->BaseResultModel:
 
@@ -90,6 +204,8 @@ async def magic_pdf_parse_main(
     :param return_images: 是否返回base64图片
     :param start_page_id: Start page ID for parsing, default is 0
     :param end_page_id: End page ID for parsing, default is None (parse all pages until the end of the document)
+    :param draw_debug: 是否在解析时直接绘制版面/span调试pdf，默认不绘制。
+        保存到本地或开启该参数时才保留调试pdf所需的文件，之后可通过 get_debug_pdf 获取
     :param config: 启动配置
     """
 
@@ -98,6 +214,8 @@ async def magic_pdf_parse_main(
     result=BaseResultModel()
 
     try:
+        cleanup_debug_output()
+
         # 创建唯一的输出目录
         if not os.path.exists("temp_files"):
             os.makedirs("temp_files")
@@ -105,27 +223,19 @@ async def magic_pdf_parse_main(
             local_output_path="temp_files"
 
         unique_dir = os.path.join(local_output_path, str(uuid.uuid4()))
-        os.makedirs(unique_dir, exist_ok=True)
 
-        # 处理上传的PDF文件
+        # 处理上传的PDF文件，直接在内存中转换，不再写临时文件
         pdf_file_names = []
         pdf_bytes_list = []
 
         content = await file.read()
         file_path = Path(file.filename)
 
-        # 如果是图像文件或PDF，使用read_fn处理
         if file_path.suffix.lower() in pdf_suffixes + image_suffixes:
-            # 创建临时文件以便使用read_fn
-            temp_path = Path(unique_dir) / file_path.name
-            with open(temp_path, "wb") as f:
-                f.write(content)
-
             try:
-                pdf_bytes = read_fn(temp_path)
+                pdf_bytes = file_bytes_to_pdf_bytes(content, file_path.suffix.lower())
                 pdf_bytes_list.append(pdf_bytes)
                 pdf_file_names.append(file_path.stem)
-                os.remove(temp_path)  # 删除临时文件
             except Exception as e:
                 logger.exception(f"Failed to load file: {str(e)}")
         
@@ -145,9 +255,9 @@ async def magic_pdf_parse_main(
             # 如果语言列表长度不匹配，使用第一个语言或默认"ch"
             actual_lang_list = [actual_lang_list[0] if actual_lang_list else "ch"] * len(pdf_file_names)
 
-        # 调用异步处理函数
-        await aio_do_parse(
-            output_dir=unique_dir,
+        # 调用异步处理函数，output_dir为None时所有输出保留在内存中返回
+        parse_results = await aio_do_parse(
+            output_dir=None,
             pdf_file_names=pdf_file_names,
             pdf_bytes_list=pdf_bytes_list,
             p_lang_list=actual_lang_list,
@@ -156,89 +266,55 @@ async def magic_pdf_parse_main(
             formula_enable=formula_enable,
             table_enable=table_enable,
             server_url=server_url,
-            f_draw_layout_bbox=True,
-            f_draw_span_bbox=True,
+            f_draw_layout_bbox=draw_debug,
+            f_draw_span_bbox=draw_debug,
             f_dump_md=return_md,
             f_dump_middle_json=return_middle_json,
             f_dump_model_output=return_model_output,
-            f_dump_orig_pdf=True,
-            f_dump_content_list=return_content_list,
+            f_dump_orig_pdf=draw_debug,
+            f_dump_content_list=True,
             start_page_id=start_page_id,
             end_page_id=end_page_id,
             **config
         )
 
-        # 构建结果路径
-        result_dict = {}
+        # 构建结果
         for pdf_name in pdf_file_names:
-            result_dict[pdf_name] = {}
-            data = result_dict[pdf_name]
+            parse_result = parse_results[pdf_name]
 
             if backend.startswith("pipeline"):
                 parse_dir = os.path.join(unique_dir, pdf_name, parse_method)
             else:
                 parse_dir = os.path.join(unique_dir, pdf_name, "vlm")
 
-            if os.path.exists(parse_dir):
-                if return_md:
-                    data["md_content"] = get_infer_result(".md", pdf_name, parse_dir)
-                if return_middle_json:
-                    data["middle_json"] = get_infer_result("_middle.json", pdf_name, parse_dir)
-                if return_model_output:
-                    if backend.startswith("pipeline"):
-                        data["model_output"] = get_infer_result("_model.json", pdf_name, parse_dir)
-                    else:
-                        data["model_output"] = get_infer_result("_model_output.txt", pdf_name, parse_dir)
-                if return_content_list:
-                    data["content_list"] = get_infer_result("_content_list.json", pdf_name, parse_dir)
-                if return_images:
-                    image_paths = glob(f"{parse_dir}/images/*.jpg")
-                    data["images"] = {
-                        os.path.basename(
-                            image_path
-                        ): f"data:image/jpeg;base64,{encode_image(image_path)}"
-                        for image_path in image_paths
-                    }
-
-                # 是否要删除处理文件
-                if is_save_local==False:
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}.md")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
-
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}_middle.json")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
-
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}_model.json")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
-
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}.pdf")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
-
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}_model_output.txt")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
-
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}_content_list.json")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
-
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}_layout.pdf")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
+            # 图片以url的形式返回，需要写到静态文件目录；其余文件只在需要保存到本地时写入
+            output_image_path = os.path.join(parse_dir, "images")
+            image_writer = FileBasedDataWriter(output_image_path)
+            for image_name, image_bytes in parse_result["images"].items():
+                image_writer.write(image_name, image_bytes)
+
+            if is_save_local:
+                md_writer = FileBasedDataWriter(parse_dir)
+                saved_files = parse_result["files"]
+                record_result_dir(os.path.basename(unique_dir), unique_dir)
+            elif draw_debug:
+                # 不保存到本地时调试文件写入单独的目录，超过保留时间后由cleanup_debug_output清理
+                md_writer = FileBasedDataWriter(os.path.join(DEBUG_OUTPUT_PATH, os.path.basename(unique_dir), pdf_name))
+                # 解析时已经绘制的调试pdf也要保留，供 get_debug_pdf 直接返回
+                saved_files = {
+                    file_name: file_bytes for file_name, file_bytes in parse_result["files"].items()
+                    if file_name in (f"{pdf_name}_layout.pdf", f"{pdf_name}_span.pdf")
+                }
+            else:
+                continue
+            for file_name, file_bytes in saved_files.items():
+                md_writer.write(file_name, file_bytes)
 
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}_origin.pdf")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
-    
-                    result_file_path = os.path.join(parse_dir, f"{pdf_name}_span.pdf")
-                    if os.path.exists(result_file_path):
-                        os.remove(result_file_path)
+            # 保存middle_json和原始pdf，调试pdf在被请求时才根据它们渲染
+            write_debug_source(md_writer, pdf_name, parse_result, saved_files)
 
-        result.data=await read_md_dump(f"{parse_dir}/images", data["content_list"])
+        result.data=make_parse_main_output(output_image_path, parse_result)
+        result.data.result_id=os.path.basename(unique_dir)
 
         return result
     
@@ -347,12 +423,13 @@ async def magic_pdf_parse_main2(file:UploadFile,
             formula_enable=formula_enable,
             table_enable=table_enable,
             server_url=server_url,
-            f_draw_layout_bbox=True,
-            f_draw_span_bbox=True,
+            # 不保存到本地时调试pdf会被立即删除，span pdf始终会被删除，无需绘制
+            f_draw_layout_bbox=is_save_local,
+            f_draw_span_bbox=False,
             f_dump_md=return_md,
             f_dump_middle_json=return_middle_json,
             f_dump_model_output=return_model_output,
-            f_dump_orig_pdf=True,
+            f_dump_orig_pdf=is_save_local,
             f_dump_content_list=return_content_list,
             start_page_id=start_page_id,
             end_page_id=end_page_id,
@@ -0,0 +1,142 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+boxbase批量计算基准测试，对比逐对调用单个bbox函数和一次计算(N,M)矩阵的耗时，并校验两者结果完全一致。
+
+模拟密集页面：随机生成上千个span和上百个block。
+
+用法:
+    python tests/benchmark/bench_boxbase.py -s 1500 -b 150 -r 3
+"""
+import argparse
+import copy
+import random
+import time
+
+from mineru.utils import boxbase
+from mineru.utils.enum_class import BlockType, ContentType
+from mineru.utils.span_block_fix import fill_spans_in_blocks, span_block_type_compatible
+from mineru.utils.span_pre_proc import remove_overlaps_low_confidence_spans, remove_overlaps_min_spans
+
+KERNELS = [
+    ('calculate_overlap_area_in_bbox1_area_ratio', boxbase.calculate_overlap_area_in_bbox1_area_ratio_matrix),
+    ('calculate_iou', boxbase.calculate_iou_matrix),
+    ('calculate_overlap_area_2_minbox_area_ratio', boxbase.calculate_overlap_area_2_minbox_area_ratio_matrix),
+    ('is_in', boxbase.is_in_matrix),
+    ('bbox_distance', boxbase.bbox_distance_matrix),
+]
+
+
+def random_bbox(max_w, max_h, page_w=1200, page_h=1700):
+    x0 = random.randint(0, page_w - max_w)
+    y0 = random.randint(0, page_h - max_h)
+    return [x0, y0, x0 + random.randint(0, max_w), y0 + random.randint(0, max_h)]
+
+
+def make_page(span_count, block_count):
+    spans = []
+    for _ in range(span_count):
+        bbox = random_bbox(200, 30)
+        spans.append({'bbox': bbox, 'type': ContentType.TEXT, 'score': round(random.random(), 2)})
+    # 制造一部分完全重合和高度重叠的span
+    for span in random.sample(spans, span_count // 10):
+        x0, y0, x1, y1 = span['bbox']
+        spans.append({'bbox': [x0, y0, x1 + random.randint(0, 2), y1], 'type': ContentType.TEXT,
+                      'score': round(random.random(), 2)})
+    blocks = []
+    for _ in range(block_count):
+        bbox = random_bbox(600, 200)
+        blocks.append(bbox + [None, None, None, BlockType.TEXT, None, None, None])
+    return spans, blocks
+
+
+def timed(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return result, (time.perf_counter() - start) / rounds
+
+
+def fill_spans_in_blocks_scalar(blocks, spans, radio):
+    block_with_spans = []
+    for block in blocks:
+        block_spans = []
+        for span in spans:
+            if boxbase.calculate_overlap_area_in_bbox1_area_ratio(span['bbox'], block[0:4]) > radio and \
+                    span_block_type_compatible(span['type'], block[7]):
+                block_spans.append(span)
+        block_with_spans.append({'type': block[7], 'bbox': block[0:4], 'spans': block_spans})
+        for span in block_spans:
+            spans.remove(span)
+    return block_with_spans, spans
+
+
+def remove_overlaps_low_confidence_spans_scalar(spans):
+    dropped_spans = []
+    for span1 in spans:
+        for span2 in spans:
+            if span1 != span2 and span1 not in dropped_spans and span2 not in dropped_spans:
+                if boxbase.calculate_iou(span1['bbox'], span2['bbox']) > 0.9:
+                    span_need_remove = span1 if span1['score'] < span2['score'] else span2
+                    if span_need_remove not in dropped_spans:
+                        dropped_spans.append(span_need_remove)
+    for span in dropped_spans:
+        spans.remove(span)
+    return spans, dropped_spans
+
+
+def remove_overlaps_min_spans_scalar(spans):
+    dropped_spans = []
+    for span1 in spans:
+        for span2 in spans:
+            if span1 != span2 and span1 not in dropped_spans and span2 not in dropped_spans:
+                overlap_box = boxbase.get_minbox_if_overlap_by_ratio(span1['bbox'], span2['bbox'], 0.65)
+                if overlap_box is not None:
+                    span_need_remove = next((span for span in spans if span['bbox'] == overlap_box), None)
+                    if span_need_remove is not None and span_need_remove not in dropped_spans:
+                        dropped_spans.append(span_need_remove)
+    for span in dropped_spans:
+        spans.remove(span)
+    return spans, dropped_spans
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--spans', type=int, default=1500, help='number of spans per page')
+    parser.add_argument('-b', '--blocks', type=int, default=150, help='number of blocks per page')
+    parser.add_argument('-r', '--rounds', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    spans, blocks = make_page(args.spans, args.blocks)
+    span_bboxes = [span['bbox'] for span in spans]
+    block_bboxes = [block[0:4] for block in blocks]
+    print(f'{len(span_bboxes)} spans x {len(block_bboxes)} blocks')
+
+    for name, matrix_func in KERNELS:
+        scalar_func = getattr(boxbase, name)
+        expected, scalar_cost = timed(
+            lambda: [[scalar_func(b1, b2) for b2 in block_bboxes] for b1 in span_bboxes], args.rounds
+        )
+        actual, matrix_cost = timed(lambda: matrix_func(span_bboxes, block_bboxes), args.rounds)
+        assert actual.tolist() == expected, f'{name} mismatch'
+        print(f'{name:45s} scalar {scalar_cost * 1000:8.1f}ms  matrix {matrix_cost * 1000:6.1f}ms  '
+              f'x{scalar_cost / matrix_cost:.1f}')
+
+    callers = [
+        ('fill_spans_in_blocks', lambda s: fill_spans_in_blocks(blocks, s, 0.5),
+         lambda s: fill_spans_in_blocks_scalar(blocks, s, 0.5)),
+        ('remove_overlaps_low_confidence_spans', remove_overlaps_low_confidence_spans,
+         remove_overlaps_low_confidence_spans_scalar),
+        ('remove_overlaps_min_spans', remove_overlaps_min_spans, remove_overlaps_min_spans_scalar),
+    ]
+    for name, func, scalar_func in callers:
+        expected, scalar_cost = timed(lambda: scalar_func(copy.deepcopy(spans)), 1)
+        actual, matrix_cost = timed(lambda: func(copy.deepcopy(spans)), 1)
+        assert actual == expected, f'{name} mismatch'
+        print(f'{name:45s} scalar {scalar_cost * 1000:8.1f}ms  matrix {matrix_cost * 1000:6.1f}ms  '
+              f'x{scalar_cost / matrix_cost:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+调试pdf渲染耗时基准测试，统计服务每次请求绘制layout/span调试pdf的额外开销。
+
+middle.json和origin.pdf可以取自一次 mineru 解析的输出目录。
+
+用法:
+    python tests/benchmark/bench_debug_render.py -p output/demo1/auto/demo1_origin.pdf -m output/demo1/auto/demo1_middle.json -r 3
+"""
+import argparse
+import json
+import time
+
+from mineru.data.data_reader_writer import MemoryDataWriter
+from mineru.utils.draw_bbox import draw_layout_bbox, draw_span_bbox
+
+
+def bench(draw_func, pdf_info, pdf_bytes, rounds):
+    cost = 0.0
+    for _ in range(rounds):
+        writer = MemoryDataWriter()
+        start = time.perf_counter()
+        draw_func(pdf_info, pdf_bytes, writer, 'debug.pdf')
+        cost += time.perf_counter() - start
+    return cost / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--pdf', required=True, help='origin pdf file path')
+    parser.add_argument('-m', '--middle-json', required=True, help='middle json file path')
+    parser.add_argument('-r', '--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.pdf, 'rb') as f:
+        pdf_bytes = f.read()
+    with open(args.middle_json, 'r', encoding='utf-8') as f:
+        middle_json = json.load(f)
+    pdf_info = middle_json['pdf_info']
+
+    layout_cost = bench(draw_layout_bbox, pdf_info, pdf_bytes, args.rounds)
+    print(f'{len(pdf_info)} pages')
+    print(f'layout pdf: {layout_cost:.3f}s per request')
+    total = layout_cost
+    if middle_json.get('_backend') == 'pipeline':
+        span_cost = bench(draw_span_bbox, pdf_info, pdf_bytes, args.rounds)
+        print(f'span pdf:   {span_cost:.3f}s per request')
+        total += span_cost
+    print(f'saved per request when rendered lazily: {total:.3f}s ({total / len(pdf_info) * 1000:.1f}ms/page)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+ocr文本识别(rec)组batch方式基准测试，对比固定rec_batch_num组batch和按像素预算(MINERU_OCR_REC_BATCH_PIXELS)
+动态组batch在大量宽窄混合crop上的吞吐，并统计两种方式识别文本一致的crop数。
+
+合成crop的宽高比在窄(单字、数字)到宽(整行文本)之间混合分布，模拟整页ocr和表格ocr的输入。
+加上 --preprocess-only 时只统计两种方式的预处理耗时，不执行模型推理。
+
+用法:
+    python tests/benchmark/bench_ocr_rec.py -n 5000 -b 8 -p 491520 983040 1966080 -r 3
+    python tests/benchmark/bench_ocr_rec.py -n 5000 --preprocess-only
+"""
+import argparse
+import random
+import time
+
+import cv2
+import numpy as np
+
+from mineru.model.ocr.paddleocr2pytorch.pytorch_paddle import PytorchPaddleOCR
+
+
+def make_crops(count):
+    crops = []
+    for _ in range(count):
+        height = random.randint(16, 64)
+        # 一半是短词和数字，一半是较长的文本行
+        wh_ratio = random.uniform(0.5, 4) if random.random() < 0.5 else random.uniform(4, 40)
+        width = max(int(height * wh_ratio), 4)
+        crop = np.full((height, width, 3), 255, dtype=np.uint8)
+        for x in range(2, width - 8, max(height // 2, 6)):
+            cv2.putText(crop, str(random.randint(0, 9)), (x, height - 4), cv2.FONT_HERSHEY_SIMPLEX,
+                        height / 40, (0, 0, 0), 1)
+        crops.append(crop)
+    return crops
+
+
+def bench_rec(recognizer, crops, batch_pixels, rounds):
+    recognizer.rec_batch_pixels = batch_pixels
+    rec_res = None
+    cost = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        rec_res, _ = recognizer(crops)
+        cost += time.perf_counter() - start
+    return cost / rounds, rec_res
+
+
+def bench_preprocess(recognizer, crops, batch_pixels, rounds):
+    """只执行两种方式的预处理，固定batch逐张resize_norm_img后拼接，像素预算方式写入预分配buffer"""
+    imgC, imgH, imgW = recognizer.rec_image_shape
+    wh_ratios = [crop.shape[1] / crop.shape[0] for crop in crops]
+    indices = np.argsort(wh_ratios)
+    sorted_crops = [crops[i] for i in indices]
+    cost = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        if batch_pixels > 0:
+            for beg, end, padded_w in recognizer._form_budget_batches([wh_ratios[i] for i in indices]):
+                out = np.empty((end - beg, imgC, imgH, padded_w), dtype=np.float32)
+                recognizer.norm_img_batch_into(sorted_crops[beg:end], padded_w, out)
+        else:
+            for beg in range(0, len(sorted_crops), recognizer.rec_batch_num):
+                batch = sorted_crops[beg:beg + recognizer.rec_batch_num]
+                max_wh_ratio = max(crop.shape[1] / crop.shape[0] for crop in batch)
+                np.concatenate([recognizer.resize_norm_img(crop, max_wh_ratio)[np.newaxis, :] for crop in batch])
+        cost += time.perf_counter() - start
+    return cost / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--num-crops', type=int, default=5000)
+    parser.add_argument('-b', '--batch-num', type=int, default=8, help='rec_batch_num of the fixed batch baseline')
+    parser.add_argument('-p', '--batch-pixels', type=int, nargs='+', default=[491520, 983040, 1966080])
+    parser.add_argument('-l', '--lang', default='ch')
+    parser.add_argument('-r', '--rounds', type=int, default=3)
+    parser.add_argument('--preprocess-only', action='store_true')
+    args = parser.parse_args()
+
+    random.seed(0)
+    crops = make_crops(args.num_crops)
+    recognizer = PytorchPaddleOCR(lang=args.lang).text_recognizer
+    recognizer.rec_batch_num = args.batch_num
+    print(f'{len(crops)} crops, device: {recognizer.device}')
+
+    if args.preprocess_only:
+        base_cost = bench_preprocess(recognizer, crops, 0, args.rounds)
+        print(f'fixed batch {args.batch_num}: preprocess {base_cost:.3f}s')
+        for batch_pixels in args.batch_pixels:
+            cost = bench_preprocess(recognizer, crops, batch_pixels, args.rounds)
+            print(f'batch pixels {batch_pixels}: preprocess {cost:.3f}s ({base_cost / cost:.2f}x)')
+        return
+
+    base_cost, base_res = bench_rec(recognizer, crops, 0, args.rounds)
+    print(f'fixed batch {args.batch_num}: {base_cost:.3f}s, {len(crops) / base_cost:.1f} crops/s')
+    for batch_pixels in args.batch_pixels:
+        cost, rec_res = bench_rec(recognizer, crops, batch_pixels, args.rounds)
+        # 补齐宽度不同会带来极小的分数差异，只比较文本
+        same_text = sum(a[0] == b[0] for a, b in zip(base_res, rec_res))
+        print(f'batch pixels {batch_pixels}: {cost:.3f}s, {len(crops) / cost:.1f} crops/s '
+              f'({base_cost / cost:.2f}x), same text {same_text}/{len(crops)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+pdf页面渲染吞吐量基准测试，对比不同渲染进程数下的 pages/sec。
+
+用法:
+    python tests/benchmark/bench_pdf_render.py -p demo/pdfs/demo1.pdf -w 1 2 4 8 -r 4
+"""
+import argparse
+import os
+import time
+
+import pypdfium2 as pdfium
+
+from mineru.utils.enum_class import ImageType
+from mineru.utils.pdf_image_tools import render_pdf_pages
+
+
+def bench(pdf_bytes, page_count, workers, rounds):
+    page_indices = list(range(page_count)) * rounds
+    # 首次调用包含进程池的启动开销，与服务中首个请求的端到端耗时一致
+    start = time.perf_counter()
+    render_pdf_pages(pdf_bytes, page_indices[:page_count], image_type=ImageType.PIL, workers=workers)
+    cold_speed = page_count / (time.perf_counter() - start)
+    start = time.perf_counter()
+    images = render_pdf_pages(pdf_bytes, page_indices, image_type=ImageType.PIL, workers=workers)
+    cost = time.perf_counter() - start
+    assert len(images) == len(page_indices)
+    return cold_speed, len(page_indices) / cost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--path', required=True, help='pdf file path')
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('-r', '--rounds', type=int, default=1, help='render every page this many times')
+    args = parser.parse_args()
+
+    with open(args.path, 'rb') as f:
+        pdf_bytes = f.read()
+    pdf_doc = pdfium.PdfDocument(pdf_bytes)
+    page_count = len(pdf_doc)
+    pdf_doc.close()
+
+    print(f'{args.path}: {page_count} pages x {args.rounds} rounds')
+    baseline = None
+    for workers in args.workers:
+        cold_speed, speed = bench(pdf_bytes, page_count, workers, args.rounds)
+        baseline = baseline or speed
+        print(f'workers={workers:<3d} {speed:8.2f} pages/s  x{speed / baseline:.2f}  (first call {cold_speed:.2f} pages/s)')
+
+
+if __name__ == '__main__':
+    main()
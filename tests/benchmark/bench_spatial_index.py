@@ -0,0 +1,98 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+span与block匹配的空间索引基准测试，对比计算完整(N,M)重叠矩阵和网格索引查询的耗时随span数量的变化，并校验结果完全一致。
+
+合成页面上block数量随span数量同比例增长(平均每个block约10个span)，模拟密集文本和表格页面。
+
+用法:
+    python tests/benchmark/bench_spatial_index.py -s 1000 2000 5000 -r 3
+"""
+import argparse
+import copy
+import random
+import time
+
+import numpy as np
+
+from mineru.utils.boxbase import calculate_overlap_area_in_bbox1_area_ratio_matrix
+from mineru.utils.enum_class import BlockType, ContentType
+from mineru.utils.span_block_fix import fill_spans_in_blocks, span_block_type_compatible
+from mineru.utils.spatial_index import any_overlap_in_bbox1_area_ratio
+
+
+def make_page(span_count, page_w=1200, page_h=1700):
+    # 页面按span数量放大，保持span密度不变
+    scale = (span_count / 1000) ** 0.5
+    page_w, page_h = int(page_w * scale), int(page_h * scale)
+    blocks = []
+    spans = []
+    while len(spans) < span_count:
+        x0, y0 = random.randint(0, page_w - 400), random.randint(0, page_h - 300)
+        block_bbox = [x0, y0, x0 + random.randint(100, 400), y0 + random.randint(30, 300)]
+        blocks.append(block_bbox + [None, None, None, BlockType.TEXT, None, None, None])
+        for _ in range(10):
+            sx0 = random.randint(block_bbox[0] - 10, block_bbox[2] - 10)
+            sy0 = random.randint(block_bbox[1] - 10, block_bbox[3] - 10)
+            spans.append({'bbox': [sx0, sy0, sx0 + random.randint(5, 200), sy0 + random.randint(8, 25)],
+                          'type': ContentType.TEXT, 'score': 0.9})
+    return spans, blocks
+
+
+def fill_spans_in_blocks_dense(blocks, spans, radio):
+    overlap_ratios = calculate_overlap_area_in_bbox1_area_ratio_matrix(
+        [span['bbox'] for span in spans], [block[0:4] for block in blocks]
+    )
+    span_assigned = [False] * len(spans)
+    block_with_spans = []
+    for block_idx, block in enumerate(blocks):
+        block_spans = []
+        for span_idx in (overlap_ratios[:, block_idx] > radio).nonzero()[0]:
+            span = spans[span_idx]
+            if not span_assigned[span_idx] and span_block_type_compatible(span['type'], block[7]):
+                block_spans.append(span)
+                span_assigned[span_idx] = True
+        block_with_spans.append({'type': block[7], 'bbox': block[0:4], 'spans': block_spans})
+    spans[:] = [span for span, assigned in zip(spans, span_assigned) if not assigned]
+    return block_with_spans, spans
+
+
+def any_overlap_dense(span_bboxes, block_bboxes, ratio):
+    return (calculate_overlap_area_in_bbox1_area_ratio_matrix(span_bboxes, block_bboxes) > ratio).any(axis=1)
+
+
+def timed(func, rounds):
+    cost = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        cost += time.perf_counter() - start
+    return result, cost / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--spans', type=int, nargs='+', default=[1000, 2000, 5000], help='span counts per page')
+    parser.add_argument('-r', '--rounds', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    for span_count in args.spans:
+        spans, blocks = make_page(span_count)
+        span_bboxes = [span['bbox'] for span in spans]
+        block_bboxes = [block[0:4] for block in blocks]
+
+        expected, dense_cost = timed(lambda: fill_spans_in_blocks_dense(blocks, copy.copy(spans), 0.5), args.rounds)
+        actual, index_cost = timed(lambda: fill_spans_in_blocks(blocks, copy.copy(spans), 0.5), args.rounds)
+        assert actual[1] == expected[1] and [b['spans'] for b in actual[0]] == [b['spans'] for b in expected[0]]
+        print(f'{len(spans)} spans x {len(blocks)} blocks')
+        print(f'  fill_spans_in_blocks  dense {dense_cost * 1000:8.1f}ms  index {index_cost * 1000:7.1f}ms')
+
+        expected, dense_cost = timed(lambda: any_overlap_dense(span_bboxes, block_bboxes, 0.5), args.rounds)
+        actual, index_cost = timed(lambda: any_overlap_in_bbox1_area_ratio(span_bboxes, block_bboxes, 0.5), args.rounds)
+        assert np.array_equal(actual, expected)
+        print(f'  any_overlap           dense {dense_cost * 1000:8.1f}ms  index {index_cost * 1000:7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+import os
+
+from mineru.utils import config_reader
+from mineru.utils.config_reader import ConfigReader
+
+
+def _write_config(path, config, mtime=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class _CallCounter:
+    def __init__(self, func):
+        self.func = func
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+        return self.func(*args, **kwargs)
+
+
+def test_config_reader_no_file_io_after_first_load(tmp_path, monkeypatch):
+    config_file = tmp_path / 'mineru.json'
+    _write_config(config_file, {
+        'llm-aided-config': {'title_aided': {'enable': False}},
+        'latex-delimiter-config': {'display': {'left': '$$', 'right': '$$'}},
+        'models-dir': {'pipeline': '/models/pipeline'},
+    })
+    reader = ConfigReader(str(config_file), check_interval=60)
+    monkeypatch.setattr(config_reader, '_config_reader', reader)
+    assert config_reader.get_llm_aided_config() == {'title_aided': {'enable': False}}
+
+    open_counter = _CallCounter(open)
+    stat_counter = _CallCounter(os.stat)
+    monkeypatch.setattr(config_reader, 'open', open_counter, raising=False)
+    monkeypatch.setattr(os, 'stat', stat_counter)
+    for _ in range(1000):
+        assert config_reader.get_llm_aided_config() == {'title_aided': {'enable': False}}
+        assert config_reader.get_latex_delimiter_config()['display']['left'] == '$$'
+        assert config_reader.get_local_models_dir() == {'pipeline': '/models/pipeline'}
+    monkeypatch.undo()
+
+    assert open_counter.count == 0
+    assert stat_counter.count == 0
+
+
+def test_config_reader_reloads_only_when_mtime_changes(tmp_path, monkeypatch):
+    config_file = tmp_path / 'mineru.json'
+    _write_config(config_file, {'models-dir': {'pipeline': 'a'}}, mtime=1_000_000)
+    reader = ConfigReader(str(config_file), check_interval=0)
+    assert reader.local_models_dir() == {'pipeline': 'a'}
+
+    # mtime不变时只检查mtime，不重新读取文件
+    open_counter = _CallCounter(open)
+    monkeypatch.setattr(config_reader, 'open', open_counter, raising=False)
+    for _ in range(10):
+        assert reader.local_models_dir() == {'pipeline': 'a'}
+    assert open_counter.count == 0
+
+    _write_config(config_file, {'models-dir': {'pipeline': 'b'}}, mtime=1_000_100)
+    assert reader.local_models_dir() == {'pipeline': 'b'}
+    assert open_counter.count == 1
+
+
+def test_config_reader_reload_hook_and_missing_file(tmp_path):
+    config_file = tmp_path / 'mineru.json'
+    reader = ConfigReader(str(config_file), check_interval=60)
+    assert reader.get() is None
+    assert reader.llm_aided_config() is None
+
+    # 检查间隔内文件出现不会被发现，显式reload立即生效
+    _write_config(config_file, {'llm-aided-config': {'title_aided': {'enable': True}}})
+    assert reader.get() is None
+    assert reader.reload() == {'llm-aided-config': {'title_aided': {'enable': True}}}
+    assert reader.llm_aided_config() == {'title_aided': {'enable': True}}
@@ -0,0 +1,57 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import subprocess
+import sys
+
+import pytest
+
+# 入口模块导入耗时上限(ms)，可通过环境变量MINERU_IMPORT_TIME_BUDGET_MS按机器性能调整
+IMPORT_TIME_BUDGET_MS = float(os.getenv('MINERU_IMPORT_TIME_BUDGET_MS', 3000))
+
+# 入口模块导入时不应加载的重量级依赖，只有实际使用对应后端或模型时才导入
+HEAVY_MODULES = [
+    'torch',
+    'transformers',
+    'sglang',
+    'ultralytics',
+    'doclayout_yolo',
+    'modelscope',
+    'boto3',
+    'openai',
+    'mineru.backend.vlm.vlm_analyze',
+    'mineru.model.layout.doclayoutyolo',
+    'mineru.model.ocr.paddleocr2pytorch.pytorch_paddle',
+]
+
+
+def _import_time(module_name):
+    """在子进程中用 python -X importtime 导入模块，返回 {模块名: 累计导入耗时(us)}"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        pytest.skip(f'{module_name} can not be imported in this environment: {proc.stderr.strip().splitlines()[-1]}')
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+@pytest.mark.parametrize('module_name', [
+    'mineru.cli.client',
+    'mineru.cli.fast_api',
+    'mineru.backend.pipeline.pipeline_analyze',
+])
+def test_entry_import_is_lazy(module_name):
+    cumulative = _import_time(module_name)
+    loaded_heavy_modules = [name for name in HEAVY_MODULES if name in cumulative]
+    assert not loaded_heavy_modules, f'{module_name} imports {loaded_heavy_modules} at module load'
+
+    cost_ms = cumulative[module_name] / 1000
+    assert cost_ms < IMPORT_TIME_BUDGET_MS, f'{module_name} import time: {cost_ms:.1f}ms'
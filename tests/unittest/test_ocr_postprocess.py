@@ -0,0 +1,68 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')
+
+from mineru.model.ocr.paddleocr2pytorch.pytorchocr.postprocess.db_postprocess import DBPostProcess
+from mineru.model.ocr.paddleocr2pytorch.pytorchocr.postprocess.rec_postprocess import CTCLabelDecode
+
+DICT_DIR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'mineru', 'model', 'ocr', 'paddleocr2pytorch',
+    'pytorchocr', 'utils', 'resources', 'dict'
+)
+
+
+# 全blank行在decode中走np.mean([])，会产生Mean of empty slice警告
+@pytest.mark.filterwarnings('ignore:Mean of empty slice')
+@pytest.mark.filterwarnings('ignore:invalid value encountered')
+@pytest.mark.parametrize('character_dict_path', [None, os.path.join(DICT_DIR, 'ppocrv5_dict.txt')])
+def test_greedy_decode_matches_decode(character_dict_path):
+    decoder = CTCLabelDecode(character_dict_path=character_dict_path, use_space_char=True)
+    rng = np.random.default_rng(0)
+    batch_size, seq_len = 64, 40
+    # 只取少量字符并放大blank的比例，保证出现连续重复和被blank隔开的重复字符
+    vocab = rng.integers(1, len(decoder.character), size=4)
+    preds_idx = np.where(rng.random((batch_size, seq_len)) < 0.4, 0, rng.choice(vocab, size=(batch_size, seq_len)))
+    preds_idx[:4] = 0
+    preds_idx[4, :] = vocab[0]
+    preds_prob = rng.random((batch_size, seq_len), dtype=np.float32)
+
+    expected = decoder.decode(preds_idx, preds_prob, is_remove_duplicate=True)
+    actual = decoder.greedy_decode(preds_idx, preds_prob)
+
+    assert len(actual) == len(expected)
+    for (text, score), (expected_text, expected_score) in zip(actual, expected):
+        assert text == expected_text
+        if expected_text:
+            assert score == expected_score
+        else:
+            assert np.isnan(score) and np.isnan(expected_score)
+    assert all(text == '' for text, _ in actual[:4])
+    assert actual[4][0] == decoder.character[vocab[0]]
+
+
+@pytest.mark.parametrize('kernel', [
+    np.array([[1, 1], [1, 1]]),
+    np.ones((3, 3), dtype=np.uint8),
+    np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]]),
+    np.ones((2, 5), dtype=np.uint8),
+])
+def test_dilate_batch_matches_cv2_dilate(kernel):
+    post_process = DBPostProcess(use_dilation=True)
+    post_process.dilation_kernel = kernel
+    rng = np.random.default_rng(0)
+    segmentation = rng.random((4, 33, 48)) < 0.05
+    # 前景贴着图像边界，检查边界外按0处理
+    segmentation[0, 0, :] = True
+    segmentation[1, :, -1] = True
+
+    dilated = post_process.dilate_batch(segmentation)
+
+    assert dilated.dtype == segmentation.dtype
+    for i in range(segmentation.shape[0]):
+        expected = cv2.dilate(segmentation[i].astype(np.uint8), kernel.astype(np.uint8))
+        np.testing.assert_array_equal(dilated[i].astype(np.uint8), expected)
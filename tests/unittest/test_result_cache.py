@@ -0,0 +1,80 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import pytest
+
+from mineru.utils import result_cache
+from mineru.utils.result_cache import DiskPageCache, DiskResultCache, PageCache, make_result_cache_key
+
+
+def test_page_cache_put_same_key_twice(tmp_path):
+    cache = DiskPageCache(str(tmp_path), max_size=1024 * 1024)
+    layout_dets = [{'category_id': 1, 'poly': [0, 0, 10, 0, 10, 10, 0, 10], 'score': 0.9}]
+    for _ in range(5):
+        cache.put('page', layout_dets)
+
+    stats = cache.stats()
+    assert stats['entries'] == 1
+    assert stats['size'] == (tmp_path / 'page.json').stat().st_size
+    assert stats['evictions'] == 0
+    assert cache.get('page') == layout_dets
+
+
+def test_page_cache_overwrite_does_not_evict(tmp_path):
+    cache = DiskPageCache(str(tmp_path), max_size=1024 * 1024)
+    cache.put('a', [{'score': 0.1}])
+    entry_size = cache.stats()['size']
+    # 上限刚好容纳两个缓存项，重复写入同一个key不应该淘汰另一个缓存项
+    cache.max_size = entry_size * 2
+    cache.put('b', [{'score': 0.2}])
+    for _ in range(3):
+        cache.put('b', [{'score': 0.2}])
+
+    assert cache.stats()['evictions'] == 0
+    assert cache.get('a') == [{'score': 0.1}]
+
+
+def test_result_cache_put_same_key_twice(tmp_path):
+    cache = DiskResultCache(str(tmp_path), max_size=1024 * 1024)
+    for _ in range(2):
+        cache.put('doc', {'pdf_info': []}, [], {'a.jpg': b'0123456789'})
+
+    stats = cache.stats()
+    assert stats['entries'] == 1
+    assert stats['size'] == sum(p.stat().st_size for p in (tmp_path / 'doc').rglob('*') if p.is_file())
+    assert cache.get('doc')['images'] == {'a.jpg': b'0123456789'}
+
+
+def test_cache_interface_requires_all_methods():
+    class IncompleteCache(PageCache):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteCache()
+
+
+def test_result_cache_key_tracks_models_and_config(monkeypatch):
+    monkeypatch.setattr(result_cache, 'get_llm_aided_config', lambda: None)
+    args = (b'%PDF-1.7', 'pipeline', 'auto', 'ch', True, True)
+    key = make_result_cache_key(*args)
+    assert make_result_cache_key(*args) == key
+
+    monkeypatch.setenv('MINERU_READING_ORDER_MODE', 'xycut')
+    assert make_result_cache_key(*args) != key
+    monkeypatch.delenv('MINERU_READING_ORDER_MODE')
+
+    monkeypatch.setenv('MINERU_MODEL_SOURCE', 'modelscope')
+    assert make_result_cache_key(*args) != key
+    monkeypatch.delenv('MINERU_MODEL_SOURCE')
+
+    monkeypatch.setattr(result_cache, 'get_llm_aided_config', lambda: {'title_aided': {'enable': True}})
+    assert make_result_cache_key(*args) != key
+
+
+def test_result_cache_key_server_url_only_for_client(monkeypatch):
+    monkeypatch.setattr(result_cache, 'get_llm_aided_config', lambda: None)
+    client_args = (b'%PDF-1.7', 'vlm-sglang-client', 'auto', 'ch', True, True)
+    assert (make_result_cache_key(*client_args, server_url='http://a:30000')
+            != make_result_cache_key(*client_args, server_url='http://b:30000'))
+    engine_args = (b'%PDF-1.7', 'vlm-sglang-engine', 'auto', 'ch', True, True)
+    assert (make_result_cache_key(*engine_args, server_url='http://a:30000')
+            == make_result_cache_key(*engine_args, server_url='http://b:30000'))
@@ -0,0 +1,110 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import copy
+import random
+
+from mineru.utils import span_pre_proc
+from mineru.utils.boxbase import calculate_iou, get_minbox_if_overlap_by_ratio
+from mineru.utils.enum_class import ContentType
+from mineru.utils.span_pre_proc import remove_overlaps_low_confidence_spans, remove_overlaps_min_spans
+
+
+def _remove_overlaps_low_confidence_spans_reference(spans):
+    """重构前的双重循环实现，作为结果一致性的基准"""
+    dropped_spans = []
+    for span1 in spans:
+        for span2 in spans:
+            if span1 != span2:
+                if span1 in dropped_spans or span2 in dropped_spans:
+                    continue
+                else:
+                    if calculate_iou(span1['bbox'], span2['bbox']) > 0.9:
+                        if span1['score'] < span2['score']:
+                            span_need_remove = span1
+                        else:
+                            span_need_remove = span2
+                        if span_need_remove is not None and span_need_remove not in dropped_spans:
+                            dropped_spans.append(span_need_remove)
+    if len(dropped_spans) > 0:
+        for span_need_remove in dropped_spans:
+            spans.remove(span_need_remove)
+    return spans, dropped_spans
+
+
+def _remove_overlaps_min_spans_reference(spans):
+    """重构前的双重循环实现，作为结果一致性的基准"""
+    dropped_spans = []
+    for span1 in spans:
+        for span2 in spans:
+            if span1 != span2:
+                if span1 in dropped_spans or span2 in dropped_spans:
+                    continue
+                else:
+                    overlap_box = get_minbox_if_overlap_by_ratio(span1['bbox'], span2['bbox'], 0.65)
+                    if overlap_box is not None:
+                        span_need_remove = next((span for span in spans if span['bbox'] == overlap_box), None)
+                        if span_need_remove is not None and span_need_remove not in dropped_spans:
+                            dropped_spans.append(span_need_remove)
+    if len(dropped_spans) > 0:
+        for span_need_remove in dropped_spans:
+            spans.remove(span_need_remove)
+    return spans, dropped_spans
+
+
+def _make_spans(span_count, seed):
+    random.seed(seed)
+    spans = []
+    for _ in range(span_count):
+        x0, y0 = random.randint(0, 1100), random.randint(0, 1600)
+        spans.append({
+            'bbox': [x0, y0, x0 + random.randint(0, 150), y0 + random.randint(0, 30)],
+            'type': ContentType.TEXT,
+            'score': random.choice([0.5, 0.8, 0.9, round(random.random(), 2)]),
+        })
+    # 近似重合、完全相同、bbox相同但内容不同、置信度相同等情况
+    for span in random.sample(spans, span_count // 5):
+        x0, y0, x1, y1 = span['bbox']
+        case = random.randint(0, 3)
+        if case == 0:
+            spans.append({**span, 'bbox': [x0, y0, x1 + random.randint(0, 3), y1 + random.randint(0, 2)]})
+        elif case == 1:
+            spans.append(copy.deepcopy(span))
+        elif case == 2:
+            spans.append({**span, 'bbox': list(span['bbox']), 'type': ContentType.INLINE_EQUATION, 'content': 'x'})
+        else:
+            spans.append({**span, 'bbox': [x0 + 1, y0, x1 - 1, y1], 'score': span['score']})
+    random.shuffle(spans)
+    return spans
+
+
+def test_remove_overlaps_spans_same_as_reference():
+    for seed in range(20):
+        spans = _make_spans(150, seed)
+        for func, reference in [
+            (remove_overlaps_low_confidence_spans, _remove_overlaps_low_confidence_spans_reference),
+            (remove_overlaps_min_spans, _remove_overlaps_min_spans_reference),
+        ]:
+            expected_spans, expected_dropped = reference(copy.deepcopy(spans))
+            actual_spans, actual_dropped = func(copy.deepcopy(spans))
+            assert actual_spans == expected_spans
+            assert actual_dropped == expected_dropped
+
+
+def test_remove_overlaps_spans_dense_page_candidate_pairs(monkeypatch):
+    # 原双重循环实现需要比较全部span对，网格索引只对可能重叠的span对计算重叠比例
+    candidate_counts = []
+    for func_name in ['calculate_iou_pairs', 'calculate_overlap_area_2_minbox_area_ratio_pairs']:
+        pair_ratio_func = getattr(span_pre_proc, func_name)
+
+        def counting_pair_ratio_func(bboxes1, bboxes2, pair_ratio_func=pair_ratio_func):
+            candidate_counts.append(len(bboxes1))
+            return pair_ratio_func(bboxes1, bboxes2)
+
+        monkeypatch.setattr(span_pre_proc, func_name, counting_pair_ratio_func)
+
+    spans = _make_spans(2500, 0)
+    span_count = len(spans)
+    spans, _ = remove_overlaps_low_confidence_spans(spans)
+    spans, _ = remove_overlaps_min_spans(spans)
+    assert len(candidate_counts) == 2
+    for candidate_count in candidate_counts:
+        assert candidate_count < span_count * 50, f'{candidate_count} candidate pairs for {span_count} spans'